@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+from load_driver import DEFAULT_MIX, OpenLoopDriver
+
+DEFAULT_SLO_P99_MS = 500
+DEFAULT_MAX_ERROR_RATE = 0.01
+# a step passes only if the achieved rate is at least this fraction of the offered rate
+MIN_ACHIEVED_FRACTION = 0.9
+
+
+class CapacitySearch:
+    '''
+    Finds the highest request rate each endpoint sustains within the SLO (p99 latency and
+    error rate). The offered open-loop rate is ramped geometrically until a step breaks the
+    SLO, then the knee is bisected between the last passing and the first failing rate.
+    '''
+
+    def __init__(self, slo_p99_ms=DEFAULT_SLO_P99_MS, max_error_rate=DEFAULT_MAX_ERROR_RATE, start_rps=10,
+                 max_rps=5000, ramp_factor=2, step_duration=5, search_steps=4, workers=256, endpoints=None, make_sender=None,
+                 listeners=None):
+        self.slo_p99_ms = slo_p99_ms
+        self.max_error_rate = max_error_rate
+        self.start_rps = start_rps
+        self.max_rps = max_rps
+        self.ramp_factor = ramp_factor
+        self.step_duration = step_duration
+        self.search_steps = search_steps
+        self.workers = workers
+        self.mix = [entry for entry in DEFAULT_MIX if endpoints is None or entry[0] in endpoints]
+        self.make_sender = make_sender
+        self.listeners = listeners
+
+    def step(self, entry, rate, context, sender=None):
+        endpoint, weight, builder = entry
+        report = OpenLoopDriver(rate, self.step_duration, "constant", [(endpoint, 1, builder)], self.workers,
+                                sender=sender, listeners=self.listeners).run(context)
+        stats = report["endpoints"][endpoint]
+        requests = stats["requests"]
+        error_rate = stats["errors"] / requests if requests else 1.0
+        p99 = stats["latency"].get("p99_ms")
+        achieved = stats["achieved_rps"] or 0
+        passed = (
+            requests > 0
+            and error_rate <= self.max_error_rate
+            and p99 is not None and p99 <= self.slo_p99_ms
+            and achieved >= rate * MIN_ACHIEVED_FRACTION
+        )
+        return {
+            "offered_rps": round(rate, 2),
+            "achieved_rps": achieved,
+            "error_rate": round(error_rate, 4),
+            "p99_ms": p99,
+            "passed": passed,
+        }
+
+    def search(self, entry, context):
+        steps = []
+        passing, failing = None, None
+        rate = self.start_rps
+        # one sender (and transport) for all steps of the endpoint, closed when the search ends
+        sender = self.make_sender() if self.make_sender is not None else None
+        try:
+            while rate <= self.max_rps:
+                result = self.step(entry, rate, context, sender)
+                steps.append(result)
+                if not result["passed"]:
+                    failing = rate
+                    break
+                passing = rate
+                rate *= self.ramp_factor
+            if failing is not None and passing is not None:
+                for _ in range(self.search_steps):
+                    rate = (passing + failing) / 2
+                    result = self.step(entry, rate, context, sender)
+                    steps.append(result)
+                    if result["passed"]:
+                        passing = rate
+                    else:
+                        failing = rate
+        finally:
+            if sender is not None:
+                sender.close()
+        return {
+            "max_sustainable_rps": round(passing, 2) if passing is not None else 0,
+            "limit": "slo" if failing is not None else "max_rps",
+            "first_failing_rps": round(failing, 2) if failing is not None else None,
+            "steps": steps,
+        }
+
+    def run(self, test_object, context):
+        '''context as for the load driver: service URLs and an existing product_id/customer_id'''
+        test_object.update_performance("capacity", "slo", {
+            "p99_ms": self.slo_p99_ms,
+            "max_error_rate": self.max_error_rate,
+            "step_duration_s": self.step_duration,
+        })
+        summary = {}
+        for entry in self.mix:
+            result = self.search(entry, context)
+            summary[entry[0]] = result["max_sustainable_rps"]
+            test_object.update_performance("capacity", entry[0], result)
+        test_object.update_performance("capacity", "max_sustainable_rps", summary)
@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+import argparse
+import itertools
+import json
+import os
+import shlex
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import psycopg2
+from psycopg2 import Error
+from inventory_billing_system_validate import (
+    TESTCASE_INFO, Activity, parse_options, planned_testcases, run_graded_testcases, testcase_order
+)
+from http_transport import make_transport
+from result_output import ResultOutput
+
+DEFAULT_SOCKET = "/tmp/clv/evaluator.sock"
+DEFAULT_MAX_JOBS = 4
+POOL_SIZE = 4
+# job options the daemon honours; anything else belongs to a one-off CLI run. Nothing that
+# names an output path: a client must not make the daemon write files as its user
+JOB_OPTIONS = {"select", "shard", "shard_durations", "deadline", "transport", "targets"}
+
+
+class ConnectionPool:
+    '''
+    Open psycopg2 connections to one database, reused across jobs. A connection coming
+    back is rolled back so no transaction leaks into the next job, and dropped if it was
+    closed or broken (e.g. by a deadline cancel).
+    '''
+
+    def __init__(self, host, name, user, password, size=POOL_SIZE):
+        self.settings = {"host": host, "database": name, "user": user, "password": password,
+                         "application_name": Activity.application_name}
+        self.size = size
+        self.idle = []
+        self.lock = threading.Lock()
+        # every job truncates the tables, so jobs against the same database run one at a time
+        self.job_lock = threading.Lock()
+        self.stats = {"opened": 0, "reused": 0}
+
+    def get(self, connect_timeout=None):
+        with self.lock:
+            while self.idle:
+                connection = self.idle.pop()
+                if not connection.closed:
+                    self.stats["reused"] += 1
+                    return connection
+            self.stats["opened"] += 1
+        return psycopg2.connect(connect_timeout=connect_timeout, **self.settings)
+
+    def put(self, connection):
+        try:
+            if connection.closed:
+                return
+            connection.rollback()
+        except (Exception, Error) as error:
+            try:
+                connection.close()
+            except (Exception, Error):
+                pass
+            return
+        with self.lock:
+            if len(self.idle) < self.size:
+                self.idle.append(connection)
+                return
+        connection.close()
+
+    def close(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for connection in idle:
+            try:
+                connection.close()
+            except (Exception, Error) as error:
+                pass
+
+
+class PooledActivity(Activity):
+    '''Activity whose connect/disconnect borrow from and return to a warm connection pool'''
+
+    def __init__(self, pool):
+        super().__init__()
+        self.pool = pool
+        self.db_url = pool.settings["host"]
+        self.db_name = pool.settings["database"]
+        self.db_username = pool.settings["user"]
+        self.db_password = pool.settings["password"]
+
+    def connect_to_db(self):
+        if self.connection is not None:
+            self.disconnect_from_db()
+        try:
+            connect_timeout = None
+            if self.deadline is not None:
+                connect_timeout = max(int(self.deadline.limit(None)), 1)
+            self.connection = self.pool.get(connect_timeout)
+            self.cursor = self.connection.cursor()
+        except (Exception, Error) as error:
+            pass
+
+    def disconnect_from_db(self):
+        connection, cursor = self.connection, self.cursor
+        self.connection, self.cursor = None, None
+        if cursor:
+            try:
+                cursor.close()
+            except (Exception, Error) as error:
+                pass
+        if connection:
+            self.pool.put(connection)
+
+
+class JobStream:
+    '''Listener that sends every test case result of a job as soon as its test case ends'''
+
+    def __init__(self, job_id, test_object, send):
+        self.job_id = job_id
+        self.test_object = test_object
+        self.send = send
+        self.sent = set()
+        self.names = {info["description"]: name for name, info in TESTCASE_INFO.items()}
+
+    def on_testcase_end(self, testcase_name, duration):
+        for result in self.test_object.results:
+            if result["description"] not in self.sent:
+                self.sent.add(result["description"])
+                # labelled by the result's own test case, not the one that just ended
+                self.send({"job": self.job_id, "event": "testcase",
+                           "testcase": self.names.get(result["description"], testcase_name), "result": result})
+
+
+class EvaluatorDaemon:
+    '''
+    Resident evaluator: the libraries are imported once, database connections stay open
+    in per-database pools and the HTTP transports keep their keep-alive sessions (one per
+    worker thread), so a job only pays for its own requests and queries. Jobs arrive as
+    JSON lines over a Unix socket and run concurrently up to max_jobs; jobs against the
+    same database are serialized because each one truncates its tables.
+    '''
+
+    def __init__(self, socket_path=DEFAULT_SOCKET, max_jobs=DEFAULT_MAX_JOBS):
+        self.socket_path = socket_path
+        self.max_jobs = max_jobs
+        self.executor = ThreadPoolExecutor(max_workers=max_jobs, thread_name_prefix="evaluator-job")
+        self.pools = {}
+        self.transports = {}
+        self.lock = threading.Lock()
+        self.job_ids = itertools.count(1)
+        self.server = None
+
+    def pool(self, database):
+        key = (database.get("host", "localhost"), database.get("name", "database_name"),
+               database.get("user", "postgres"), database.get("password", "password"))
+        with self.lock:
+            if key not in self.pools:
+                self.pools[key] = ConnectionPool(*key)
+            return self.pools[key]
+
+    def transport(self, name):
+        with self.lock:
+            if name not in self.transports:
+                self.transports[name] = make_transport(name)
+            return self.transports[name]
+
+    def job_options(self, job):
+        '''The job's CLI-style option list, checked against what the daemon supports'''
+        argv = job.get("options", [])
+        if isinstance(argv, str):
+            argv = shlex.split(argv)
+        if job.get("targets"):
+            targets = job["targets"]
+            argv = argv + ["--targets", targets if isinstance(targets, str) else ",".join(targets)]
+        try:
+            options = parse_options(argv)
+        except SystemExit:
+            raise ValueError(f"invalid options {argv}")
+        defaults = vars(parse_options([]))
+        unsupported = sorted(
+            "--" + name.replace("_", "-") for name, value in vars(options).items()
+            if name not in JOB_OPTIONS and value != defaults[name]
+        )
+        if unsupported:
+            raise ValueError(f"not supported in daemon mode: {', '.join(unsupported)}")
+        return options
+
+    def run_job(self, job_id, job, send, submitted):
+        started = time.perf_counter()
+        options = self.job_options(job)
+        testcases = planned_testcases(options)
+        pool = self.pool(job.get("database", {}))
+        args = json.dumps({"token": job.get("token", "default")})
+        test_object = ResultOutput(args, Activity, verbose=False, testcase_order=testcase_order())
+        try:
+            with pool.job_lock:
+                send({"job": job_id, "event": "started", "testcases": testcases,
+                      "queued_ms": round((time.perf_counter() - submitted) * 1000, 3)})
+                activity = PooledActivity(pool)
+                activity.transport = self.transport(options.transport)
+                if options.targets:
+                    activity.product_url, activity.billing_url = options.targets[0]
+                activity.listeners += [test_object, JobStream(job_id, test_object, send)]
+
+                activity.connect_to_db()
+                activity.clear_tables()
+                activity.disconnect_from_db()
+                run_graded_testcases(activity, test_object, testcases, options.deadline)
+                activity.connect_to_db()
+                activity.clear_tables()
+                activity.disconnect_from_db()
+
+            test_object.update_performance("daemon", "job", {
+                "job": job_id,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+                "pool": dict(pool.stats),
+            })
+        finally:
+            test_object.close()
+        result = json.loads(test_object.result_final())
+        send({"job": job_id, "event": "done", "result": result})
+
+    def submit(self, job, send):
+        '''Queue a job; returns a future that completes after its "done" or "error" event was sent'''
+        job_id = job.get("id") or next(self.job_ids)
+        submitted = time.perf_counter()
+        send({"job": job_id, "event": "queued"})
+
+        def work():
+            try:
+                self.run_job(job_id, job, send, submitted)
+            except Exception as e:
+                send({"job": job_id, "event": "error", "error": str(e)})
+
+        return self.executor.submit(work)
+
+    def serve(self):
+        if os.path.exists(self.socket_path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.socket_path)
+                raise RuntimeError(f"an evaluator is already listening on {self.socket_path}")
+            except (ConnectionRefusedError, FileNotFoundError):
+                os.unlink(self.socket_path)
+            finally:
+                probe.close()
+        if os.path.dirname(self.socket_path):
+            os.makedirs(os.path.dirname(self.socket_path), exist_ok=True)
+        daemon = self
+
+        class JobHandler(socketserver.StreamRequestHandler):
+            def handle(self):
+                write_lock = threading.Lock()
+
+                def send(message):
+                    data = (json.dumps(message) + "\n").encode()
+                    with write_lock:
+                        try:
+                            self.wfile.write(data)
+                            self.wfile.flush()
+                        except OSError:
+                            pass
+
+                futures = []
+                for line in self.rfile:
+                    if not line.strip():
+                        continue
+                    try:
+                        job = json.loads(line)
+                    except ValueError as e:
+                        send({"event": "error", "error": f"invalid job: {e}"})
+                        continue
+                    futures.append(daemon.submit(job, send))
+                for future in futures:
+                    future.result()
+
+        # only the daemon's user may submit jobs: create the socket 0600 from the start
+        umask = os.umask(0o177)
+        try:
+            self.server = socketserver.ThreadingUnixStreamServer(self.socket_path, JobHandler)
+        finally:
+            os.umask(umask)
+        os.chmod(self.socket_path, 0o600)
+        self.server.daemon_threads = True
+        self.server.serve_forever()
+
+    def shutdown(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+        self.executor.shutdown(wait=True)
+        for pool in self.pools.values():
+            pool.close()
+        for transport in self.transports.values():
+            transport.close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+def submit_jobs(socket_path, jobs, on_message):
+    '''Send jobs over one connection and call on_message for every streamed event until all are done'''
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.connect(socket_path)
+    try:
+        client.sendall(b"".join((json.dumps(job) + "\n").encode() for job in jobs))
+        client.shutdown(socket.SHUT_WR)
+        with client.makefile("rb") as stream:
+            for line in stream:
+                on_message(json.loads(line))
+    finally:
+        client.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="evaluator_daemon.py", description="Resident evaluator taking jobs over a Unix socket")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET)
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve_parser = commands.add_parser("serve", help="run the daemon")
+    serve_parser.add_argument("--max-jobs", type=int, default=DEFAULT_MAX_JOBS, help="jobs run concurrently")
+    submit_parser = commands.add_parser("submit", help="run one job and print its streamed events as JSON lines")
+    submit_parser.add_argument("token")
+    submit_parser.add_argument("--targets", default=None, help="product_url,billing_url of the services to evaluate")
+    submit_parser.add_argument("--db-host", default="localhost")
+    submit_parser.add_argument("--db-name", default="database_name")
+    submit_parser.add_argument("--db-user", default="postgres")
+    submit_parser.add_argument("--db-password", default="password")
+    submit_parser.add_argument("--options", default="",
+                               help="evaluation options as on the command line, e.g. '--select billing --deadline 60'")
+    options = parser.parse_args(argv)
+
+    if options.command == "serve":
+        daemon = EvaluatorDaemon(options.socket, options.max_jobs)
+        signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=daemon.shutdown).start())
+        print(f"evaluator listening on {options.socket} (max {options.max_jobs} jobs)", flush=True)
+        try:
+            daemon.serve()
+        except KeyboardInterrupt:
+            daemon.shutdown()
+        return 0
+
+    job = {
+        "token": options.token,
+        "database": {"host": options.db_host, "name": options.db_name, "user": options.db_user, "password": options.db_password},
+        "options": options.options,
+    }
+    if options.targets:
+        job["targets"] = options.targets
+    failed = []
+
+    def on_message(message):
+        print(json.dumps(message), flush=True)
+        if message.get("event") == "error":
+            failed.append(message)
+
+    submit_jobs(options.socket, [job], on_message)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+import argparse
+import queue
+import random
+import socket
+import struct
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+from perf_stats import summarize_latencies
+
+CHUNK = 65536
+
+# scenario: proxy settings applied in front of both services
+SCENARIOS = {
+    "baseline": {},
+    "latency_50ms": {"latency_ms": 50},
+    "jitter_20_80ms": {"latency_ms": 20, "jitter_ms": 60},
+    "slow_link_256kbps": {"bandwidth_kbps": 256},
+    "resets_5pct": {"reset_probability": 0.05},
+}
+
+
+def reset(sock):
+    '''Close with SO_LINGER 0 so the peer sees a TCP RST instead of a FIN'''
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+        sock.close()
+    except OSError:
+        pass
+
+
+class FaultProxy:
+    '''
+    Local TCP proxy in front of a service or database port. Every chunk is forwarded after
+    latency_ms plus a uniform 0..jitter_ms delay (per direction, without compounding),
+    writes are paced to bandwidth_kbps, and with reset_probability a chunk from the client
+    makes the proxy reset both connections instead of forwarding it.
+    '''
+
+    def __init__(self, upstream_host, upstream_port, listen_port=0, latency_ms=0, jitter_ms=0,
+                 bandwidth_kbps=None, reset_probability=0.0, seed=None):
+        self.upstream = (upstream_host, upstream_port)
+        self.listen_port = listen_port
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.bandwidth_kbps = bandwidth_kbps
+        self.reset_probability = reset_probability
+        self.random = random.Random(seed)
+        self.random_lock = threading.Lock()
+        self.server = None
+        self.port = None
+        self.stopped = threading.Event()
+        self.stats = {"connections": 0, "resets": 0, "bytes_up": 0, "bytes_down": 0}
+        # updated from every connection's reader and writer threads
+        self.stats_lock = threading.Lock()
+
+    def start(self):
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind(("127.0.0.1", self.listen_port))
+        self.server.listen(128)
+        self.port = self.server.getsockname()[1]
+        threading.Thread(target=self.accept_loop, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        try:
+            self.server.close()
+        except OSError:
+            pass
+
+    def delay(self):
+        with self.random_lock:
+            jitter = self.random.uniform(0, self.jitter_ms) if self.jitter_ms else 0
+        return (self.latency_ms + jitter) / 1000
+
+    def should_reset(self):
+        if not self.reset_probability:
+            return False
+        with self.random_lock:
+            return self.random.random() < self.reset_probability
+
+    def count(self, key, amount=1):
+        with self.stats_lock:
+            self.stats[key] += amount
+
+    def accept_loop(self):
+        while not self.stopped.is_set():
+            try:
+                client, address = self.server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self.handle, args=(client,), daemon=True).start()
+
+    def handle(self, client):
+        try:
+            upstream = socket.create_connection(self.upstream, timeout=10)
+        except OSError:
+            reset(client)
+            return
+        upstream.settimeout(None)
+        for sock in (client, upstream):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.count("connections")
+        connection = {"closed": False}
+        for source, destination, direction in ((client, upstream, "bytes_up"), (upstream, client, "bytes_down")):
+            pending = queue.Queue()
+            threading.Thread(target=self.read_side, args=(source, destination, pending, direction == "bytes_up", connection), daemon=True).start()
+            threading.Thread(target=self.write_side, args=(destination, pending, direction, connection), daemon=True).start()
+
+    def read_side(self, source, destination, pending, from_client, connection):
+        while True:
+            try:
+                data = source.recv(CHUNK)
+            except OSError:
+                data = b""
+            if not data:
+                pending.put(None)
+                return
+            if from_client and self.should_reset():
+                self.count("resets")
+                connection["closed"] = True
+                reset(source)
+                reset(destination)
+                pending.put(None)
+                return
+            pending.put((time.monotonic() + self.delay(), data))
+
+    def write_side(self, destination, pending, direction, connection):
+        while True:
+            item = pending.get()
+            if item is None or connection["closed"]:
+                try:
+                    destination.shutdown(socket.SHUT_WR)
+                except OSError:
+                    pass
+                return
+            due, data = item
+            wait = due - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                self.send(destination, data)
+            except OSError:
+                return
+            self.count(direction, len(data))
+
+    def send(self, destination, data):
+        if not self.bandwidth_kbps:
+            destination.sendall(data)
+            return
+        bytes_per_second = self.bandwidth_kbps * 1000 / 8
+        # pace in slices of about 10ms worth of bytes
+        step = max(int(bytes_per_second / 100), 1)
+        for offset in range(0, len(data), step):
+            started = time.monotonic()
+            destination.sendall(data[offset:offset + step])
+            wait = len(data[offset:offset + step]) / bytes_per_second - (time.monotonic() - started)
+            if wait > 0:
+                time.sleep(wait)
+
+
+def proxied_url(url, proxy):
+    parts = urlsplit(url)
+    return parts._replace(netloc=f"127.0.0.1:{proxy.port}").geturl()
+
+
+def url_address(url):
+    parts = urlsplit(url)
+    return parts.hostname, parts.port or (443 if parts.scheme == "https" else 80)
+
+
+class FaultScenarios:
+    '''
+    Runs the test cases through proxies in front of the product and billing services under
+    each scenario and reports how pass rate and tail latency degrade against the baseline.
+    Only the harness's own requests go through the proxies: calls between the services and
+    their database connections are not degraded. To degrade those, run fault_proxy.py on its
+    own in front of the database or the other service and point the service at its port.
+    '''
+
+    def __init__(self, target, scenarios=None, iterations=3, seed=None):
+        self.target = target
+        self.scenarios = scenarios or list(SCENARIOS)
+        self.iterations = iterations
+        self.seed = seed
+
+    def run_scenario(self, settings, run_pass):
+        proxies = [FaultProxy(*url_address(url), seed=self.seed, **settings).start() for url in self.target]
+        try:
+            target = tuple(proxied_url(url, proxy) for url, proxy in zip(self.target, proxies))
+            results, requests = [], []
+            for _ in range(self.iterations):
+                test_object = run_pass(target)
+                results += test_object.results
+                requests += test_object.performance.get("requests", [])
+        finally:
+            for proxy in proxies:
+                proxy.stop()
+        failed = sorted({result["description"] for result in results if result["status"] != 1})
+        return {
+            "settings": settings,
+            "pass_rate": round(sum(1 for result in results if result["status"] == 1) / len(results), 4) if results else None,
+            "failed": failed,
+            "requests": len(requests),
+            "errors": sum(1 for request in requests if request["status"] is None or request["status"] >= 400),
+            "latency": summarize_latencies([request["latency_ms"] for request in requests if request["status"] is not None]),
+            "resets": sum(proxy.stats["resets"] for proxy in proxies),
+        }
+
+    def run(self, test_object, run_pass):
+        '''run_pass(target) runs the test cases once against the target and returns its ResultOutput'''
+        reports = {name: self.run_scenario(SCENARIOS[name], run_pass) for name in ["baseline"] + [
+            name for name in self.scenarios if name != "baseline"]}
+        baseline = reports["baseline"]
+        baseline_failed = set(baseline["failed"])
+        for name, report in reports.items():
+            if name != "baseline":
+                for key in ("p50_ms", "p99_ms"):
+                    if baseline["latency"].get(key) and report["latency"].get(key) is not None:
+                        report[key.replace("_ms", "_vs_baseline")] = round(report["latency"][key] / baseline["latency"][key], 2)
+                newly_failed = sorted(set(report["failed"]) - baseline_failed)
+                report["newly_failed"] = newly_failed
+                if newly_failed and not report["settings"].get("reset_probability"):
+                    test_object.update_advisory(
+                        "fault_tolerance", "warning",
+                        f"{name}: test cases fail once the network is degraded: {', '.join(newly_failed)}",
+                        report["settings"]
+                    )
+            test_object.update_performance("faults", name, report)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="fault_proxy.py", description="Run a latency/fault-injecting TCP proxy, e.g. in front of Postgres")
+    parser.add_argument("upstream", help="host:port to forward to, e.g. localhost:5432")
+    parser.add_argument("--listen", type=int, required=True, help="local port to listen on")
+    parser.add_argument("--latency", type=float, default=0, help="added delay per chunk and direction in ms")
+    parser.add_argument("--jitter", type=float, default=0, help="extra uniform 0..N ms delay")
+    parser.add_argument("--bandwidth", type=float, default=None, help="cap per direction and connection in kbit/s")
+    parser.add_argument("--reset", type=float, default=0, help="probability that a client chunk resets the connection")
+    options = parser.parse_args(argv)
+    host, _, port = options.upstream.rpartition(":")
+    proxy = FaultProxy(host or "localhost", int(port), options.listen, options.latency, options.jitter,
+                       options.bandwidth, options.reset).start()
+    print(f"proxying 127.0.0.1:{proxy.port} -> {options.upstream}", flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        proxy.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+
+
+class FixtureCache:
+    '''
+    Products and customers the test cases need as preconditions, created up front in one
+    transaction instead of one connect/insert/commit per test case. A shared fixture is only
+    read, so every test case asking for that kind gets the same row and it is kept for later
+    passes of the suite. An exclusive fixture is changed or deleted by its test case and is
+    handed out once. kinds maps a fixture kind to its table, columns and row builder.
+    '''
+
+    def __init__(self, database, kinds):
+        self.database = database
+        self.kinds = kinds
+        self.shared = {}
+        self.exclusive = {}
+
+    def prepare(self, declarations):
+        '''declarations: testcase name -> {kind: "shared" | "exclusive"}; returns the number of rows created'''
+        wanted = []
+        for testcase_name, fixtures in declarations.items():
+            for kind, mode in fixtures.items():
+                key = (testcase_name, kind) if mode == "exclusive" else kind
+                cached = self.exclusive if mode == "exclusive" else self.shared
+                if key not in cached and key not in wanted:
+                    wanted.append(key)
+        if not wanted:
+            return 0
+
+        kinds = list(self.kinds)
+        keys_by_kind = {kind: [key for key in wanted if (key[1] if isinstance(key, tuple) else key) == kind] for kind in kinds}
+        batches = []
+        for kind in kinds:
+            table_name, columns, builder = self.kinds[kind]
+            batches.append((table_name, columns, [builder() for _ in keys_by_kind[kind]]))
+
+        self.database.connect_to_db()
+        ids = self.database.create_fixtures(batches)
+        self.database.disconnect_from_db()
+        if ids is None:
+            return 0
+        for kind, kind_ids in zip(kinds, ids):
+            for key, fixture_id in zip(keys_by_kind[kind], kind_ids):
+                if isinstance(key, tuple):
+                    self.exclusive[key] = fixture_id
+                else:
+                    self.shared[key] = fixture_id
+        return sum(len(kind_ids) for kind_ids in ids)
+
+    def take(self, testcase_name, kind):
+        '''Exclusive fixture of the test case (removed from the cache) or else the shared one'''
+        fixture_id = self.exclusive.pop((testcase_name, kind), None)
+        if fixture_id is None:
+            fixture_id = self.shared.get(kind)
+        return fixture_id
+
+    def clear(self):
+        '''Forget all fixtures, e.g. after the tables were truncated'''
+        self.shared.clear()
+        self.exclusive.clear()
@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+import json
+import socket
+import ssl
+import threading
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from urllib.parse import urlencode, urlsplit
+import requests
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    import h2
+except ImportError:
+    h2 = None
+
+TRANSPORTS = ["requests", "multiplex"]
+DEFAULT_TIMEOUT = 5
+# pipelined HTTP/1.1: connections per origin and requests in flight per connection
+PIPELINE_CONNECTIONS = 2
+PIPELINE_DEPTH = 32
+
+
+class TransportResponse:
+    '''The part of requests.Response the test cases and listeners use'''
+
+    def __init__(self, status_code, headers, content, url, http_version="HTTP/1.1"):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.url = url
+        self.http_version = http_version
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} error for url: {self.url}", response=self)
+
+
+def request_body(kwargs):
+    '''Encoded body and the headers of a requests-style call (json=, data=, headers=)'''
+    headers = dict(kwargs.get("headers") or {})
+    body = b""
+    if kwargs.get("json") is not None:
+        body = json.dumps(kwargs["json"]).encode()
+        headers.setdefault("Content-Type", "application/json")
+    elif kwargs.get("data") is not None:
+        body = kwargs["data"].encode() if isinstance(kwargs["data"], str) else kwargs["data"]
+    return body, headers
+
+
+class RequestsTransport:
+    '''HTTP/1.1 through requests, one keep-alive session per thread; a connection carries one request at a time'''
+
+    name = "requests"
+
+    def __init__(self):
+        self.local = threading.local()
+        self.sessions = []
+        self.lock = threading.Lock()
+
+    def request(self, method, url, **kwargs):
+        if not hasattr(self.local, "session"):
+            self.local.session = requests.Session()
+            with self.lock:
+                self.sessions.append(self.local.session)
+        return self.local.session.request(method, url, **kwargs)
+
+    def close(self):
+        '''Close the pooled connections of every thread's session'''
+        with self.lock:
+            sessions, self.sessions = self.sessions, []
+            self.local = threading.local()
+        for session in sessions:
+            session.close()
+
+
+class PipelinedConnection:
+    '''
+    One HTTP/1.1 connection on which requests are written back to back without waiting
+    for the responses; a reader thread matches the responses to the requests in order.
+    '''
+
+    def __init__(self, scheme, host, port, timeout):
+        sock = socket.create_connection((host, port), timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if scheme == "https":
+            sock = ssl.create_default_context().wrap_socket(sock, server_hostname=host)
+        sock.settimeout(None)
+        self.sock = sock
+        self.host_header = host if port in (80, 443) else f"{host}:{port}"
+        self.pending = deque()
+        self.send_lock = threading.Lock()
+        self.closed = False
+        self.reader = threading.Thread(target=self.read_loop, daemon=True)
+        self.reader.start()
+
+    def in_flight(self):
+        return len(self.pending)
+
+    def submit(self, method, target, headers, body, url):
+        lines = [f"{method} {target} HTTP/1.1", f"Host: {self.host_header}", f"Content-Length: {len(body)}"]
+        lines += [f"{key}: {value}" for key, value in headers.items() if key.lower() not in ("host", "content-length")]
+        data = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+        future = Future()
+        future.method = method
+        future.url = url
+        with self.send_lock:
+            if self.closed:
+                raise requests.ConnectionError(f"pipelined connection to {self.host_header} is closed")
+            self.pending.append(future)
+            try:
+                self.sock.sendall(data)
+            except OSError as e:
+                self.fail(e)
+        return future
+
+    def read_response(self, reader):
+        status_line = reader.readline()
+        if not status_line:
+            raise ConnectionError("connection closed by the server")
+        with self.send_lock:
+            future = self.pending[0]
+        version, status = status_line.decode("latin-1").split(None, 2)[:2]
+        headers = {}
+        while True:
+            line = reader.readline().decode("latin-1").rstrip("\r\n")
+            if not line:
+                break
+            key, _, value = line.partition(":")
+            headers[key.strip().lower()] = value.strip()
+        status = int(status)
+        if future.method == "HEAD" or status in (204, 304) or 100 <= status < 200:
+            content = b""
+        elif headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int(reader.readline().split(b";")[0], 16)
+                if size == 0:
+                    while reader.readline() not in (b"\r\n", b"\n", b""):
+                        pass
+                    break
+                chunks.append(reader.read(size))
+                reader.readline()
+            content = b"".join(chunks)
+        elif "content-length" in headers:
+            content = reader.read(int(headers["content-length"]))
+        else:
+            content = reader.read()
+            headers["connection"] = "close"
+        return future, status, headers, content
+
+    def read_loop(self):
+        reader = self.sock.makefile("rb")
+        try:
+            while True:
+                future, status, headers, content = self.read_response(reader)
+                with self.send_lock:
+                    self.pending.popleft()
+                future.set_result(TransportResponse(status, headers, content, future.url))
+                if headers.get("connection", "").lower() == "close":
+                    raise ConnectionError("server closed the pipelined connection")
+        except (OSError, ValueError, IndexError, ConnectionError) as e:
+            with self.send_lock:
+                self.fail(e)
+
+    def fail(self, error):
+        '''Mark the connection closed and fail the requests still waiting (send_lock held)'''
+        self.closed = True
+        while self.pending:
+            future = self.pending.popleft()
+            if not future.done():
+                future.set_exception(requests.ConnectionError(f"pipelined request failed: {error}"))
+        try:
+            # shutdown wakes the reader thread blocked in readline; close alone does not
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+    def close(self):
+        with self.send_lock:
+            self.fail("connection closed")
+
+
+class PipelinedTransport:
+    '''
+    HTTP/1.1 pipelining over a few connections per origin. Each request goes to the
+    connection with the fewest requests in flight, so concurrent callers share the
+    connections instead of each holding one. A request whose connection fails is not
+    retried: after a partial pipeline it is unknown whether the service applied it.
+    '''
+
+    name = "pipelined"
+
+    def __init__(self, connections=PIPELINE_CONNECTIONS, depth=PIPELINE_DEPTH):
+        self.connections = connections
+        self.depth = depth
+        self.pools = {}
+        self.lock = threading.Lock()
+
+    def connection(self, scheme, host, port, timeout):
+        with self.lock:
+            pool = [connection for connection in self.pools.get((scheme, host, port), []) if not connection.closed]
+            self.pools[(scheme, host, port)] = pool
+            idle = min(pool, key=PipelinedConnection.in_flight, default=None)
+            if idle is not None and (len(pool) >= self.connections or idle.in_flight() == 0) and idle.in_flight() < self.depth:
+                return idle
+            try:
+                connection = PipelinedConnection(scheme, host, port, timeout)
+            except socket.timeout as e:
+                raise requests.ConnectTimeout(str(e))
+            except OSError as e:
+                if idle is not None:
+                    return idle
+                raise requests.ConnectionError(str(e))
+            pool.append(connection)
+            return connection
+
+    def request(self, method, url, **kwargs):
+        parts = urlsplit(url)
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        target = parts.path or "/"
+        if parts.query:
+            target += "?" + parts.query
+        if kwargs.get("params"):
+            target += ("&" if parts.query else "?") + urlencode(kwargs["params"], doseq=True)
+        timeout = kwargs.get("timeout") or DEFAULT_TIMEOUT
+        if isinstance(timeout, tuple):
+            timeout = sum(part for part in timeout if part)
+        body, headers = request_body(kwargs)
+        connection = self.connection(parts.scheme, parts.hostname, port, timeout)
+        future = connection.submit(method, target, headers, body, url)
+        try:
+            return future.result(timeout)
+        except FutureTimeout:
+            raise requests.ReadTimeout(f"{method} {url} timed out after {timeout}s")
+
+    def close(self):
+        with self.lock:
+            for pool in self.pools.values():
+                for connection in pool:
+                    connection.close()
+            self.pools = {}
+
+
+class Http2Transport:
+    '''HTTP/2 through httpx: all requests to an origin are multiplexed as streams of one connection'''
+
+    name = "http2"
+
+    def __init__(self):
+        # cleartext origins are spoken to with prior knowledge (h2c), TLS ones negotiate h2 via ALPN
+        self.cleartext = httpx.Client(http1=False, http2=True)
+        self.tls = httpx.Client(http2=True)
+
+    def request(self, method, url, **kwargs):
+        body, headers = request_body(kwargs)
+        client = self.tls if url.startswith("https:") else self.cleartext
+        try:
+            response = client.request(method, url, content=body or None, headers=headers,
+                                      params=kwargs.get("params"), timeout=kwargs.get("timeout") or DEFAULT_TIMEOUT)
+        except httpx.TimeoutException as e:
+            raise requests.Timeout(str(e))
+        except httpx.HTTPError as e:
+            raise requests.ConnectionError(str(e))
+        return TransportResponse(response.status_code, dict(response.headers), response.content, url, response.http_version)
+
+    def close(self):
+        self.cleartext.close()
+        self.tls.close()
+
+
+class MultiplexTransport:
+    '''
+    Multiplexing backend: HTTP/2 for the origins that speak it (probed once per origin,
+    needs httpx with h2), pipelined HTTP/1.1 over a few connections for the others.
+    '''
+
+    name = "multiplex"
+
+    def __init__(self, connections=PIPELINE_CONNECTIONS, depth=PIPELINE_DEPTH):
+        self.pipelined = PipelinedTransport(connections, depth)
+        self.http2 = Http2Transport() if httpx is not None and h2 is not None else None
+        self.protocols = {}
+        self.lock = threading.Lock()
+
+    def protocol(self, url):
+        parts = urlsplit(url)
+        origin = f"{parts.scheme}://{parts.netloc}"
+        with self.lock:
+            if origin in self.protocols:
+                return self.protocols[origin]
+        protocol = "HTTP/1.1"
+        if self.http2 is not None:
+            try:
+                protocol = self.http2.request("HEAD", origin + "/", timeout=2).http_version
+            except requests.RequestException:
+                protocol = "HTTP/1.1"
+        with self.lock:
+            self.protocols[origin] = protocol
+        return protocol
+
+    def request(self, method, url, **kwargs):
+        if self.protocol(url) == "HTTP/2":
+            return self.http2.request(method, url, **kwargs)
+        return self.pipelined.request(method, url, **kwargs)
+
+    def close(self):
+        self.pipelined.close()
+        if self.http2 is not None:
+            self.http2.close()
+
+
+def make_transport(name):
+    if name == "requests":
+        return RequestsTransport()
+    if name == "multiplex":
+        return MultiplexTransport()
+    raise ValueError(f"unknown transport {name}, choose from {TRANSPORTS}")
+
+
+class TransportSender:
+    '''Load driver sender on top of a transport'''
+
+    def __init__(self, transport):
+        self.transport = transport
+
+    def __call__(self, method, url, payload, timeout):
+        return self.transport.request(method, url, json=payload, timeout=timeout).status_code
+
+    def close(self):
+        self.transport.close()
@@ -1,16 +1,44 @@
 #!/bin/python3
 import random
-import string
+import re
+import time
 import requests
 import json
 from datetime import datetime, timedelta
 from result_output import ResultOutput
+from write_confirmation import WriteConfirmation
+from testcase_profiler import TestcaseProfiler
+from metrics_exporter import MetricsExporter
+from trace_spans import Tracer
+from response_schemas import JSON_DECODERS, decode_response, describe_errors, set_json_decoder
+from scaling_analysis import DEFAULT_SIZES, ScalingAnalysis
+from query_plans import QueryPlanDiagnostics
+from statement_stats import StatementStats
+from n_plus_one import NPlusOneDetector
+from traffic_capture import DEFAULT_CAPTURE, TrafficRecorder
+from load_driver import BILLING_SERVICE_URL, PRODUCT_SERVICE_URL, OpenLoopDriver, generate_random_string, seed_context
+from soak_mode import SoakRun
+from run_deadline import DeadlineExceeded, RunBudget, TestcaseDeadline
+from fixture_cache import FixtureCache
+from table_snapshots import DIGEST_THRESHOLD, StateDiffRecorder, read_snapshot
+from results_warehouse import DEFAULT_WAREHOUSE, ResultsWarehouse
+from http_transport import TRANSPORTS, RequestsTransport, TransportSender, make_transport
+from warm_up import WarmUp
+from replica_fanout import ReplicaFanOut, parse_targets
+from fault_proxy import SCENARIOS, FaultScenarios
+from capacity_search import DEFAULT_MAX_ERROR_RATE, DEFAULT_SLO_P99_MS, CapacitySearch
+from testcase_selection import load_durations, parse_selectors, parse_shard, select_testcases, shard_testcases
+from urllib.parse import urlsplit
+import argparse
 import os
 import sys
 import psycopg2
 from psycopg2 import Error
 
 class PostgreSQL:
+    # pg_stat_activity name of every connection the harness opens, so they can be told apart from the services'
+    application_name = "clv-harness"
+
     def __init__(self, db_url, db_name, db_username, db_password):
         self.db_url = db_url
         self.db_name = db_name
@@ -18,15 +46,55 @@ class PostgreSQL:
         self.db_password = db_password
         self.connection = None
         self.cursor = None
+        self.listeners = []
+        self.current_testcase = None
+        self.deadline = None
+
+    def notify(self, hook, *args):
+        for listener in self.listeners:
+            callback = getattr(listener, hook, None)
+            if callback is not None:
+                callback(*args)
+
+    def execute_query(self, table_name, query, params=None):
+        event = {
+            "testcase": self.current_testcase,
+            "table": table_name,
+            "statement": query.split(None, 1)[0].upper(),
+            "rows": -1,
+            "start": time.time(),
+        }
+        if self.deadline is not None:
+            self.deadline.check()
+        started = time.perf_counter()
+        try:
+            self.cursor.execute(query, params)
+            event["rows"] = self.cursor.rowcount
+        except Exception as e:
+            if self.deadline is not None and self.deadline.expired():
+                raise DeadlineExceeded(f"statement on {table_name} cancelled: {e}")
+            raise
+        finally:
+            event["duration_ms"] = (time.perf_counter() - started) * 1000
+            self.notify("on_db", event)
+
+    def open_connection(self, **options):
+        '''A new psycopg2 connection with this database's settings; options go to psycopg2.connect'''
+        options.setdefault("application_name", self.application_name)
+        return psycopg2.connect(
+            host=self.db_url,
+            database=self.db_name,
+            user=self.db_username,
+            password=self.db_password,
+            **options
+        )
 
     def connect_to_db(self):
         try:
-            self.connection = psycopg2.connect(
-                host=self.db_url,
-                database=self.db_name,
-                user=self.db_username,
-                password=self.db_password
-            )
+            connect_timeout = None
+            if self.deadline is not None:
+                connect_timeout = max(int(self.deadline.limit(None)), 1)
+            self.connection = self.open_connection(connect_timeout=connect_timeout)
             if self.connection:
                 self.cursor = self.connection.cursor()
         except (Exception, Error) as error:
@@ -43,7 +111,7 @@ class PostgreSQL:
             return
         try:
             query = f"TRUNCATE TABLE {table_name} CASCADE"
-            self.cursor.execute(query)
+            self.execute_query(table_name, query)
             self.connection.commit()
         except (Exception, Error) as error:
             pass
@@ -53,7 +121,7 @@ class PostgreSQL:
             return None
         try:
             query = f"SELECT * FROM {table_name};"
-            self.cursor.execute(query)
+            self.execute_query(table_name, query)
             records = self.cursor.fetchall()
             return records
         except (Exception, Error) as error:
@@ -64,7 +132,7 @@ class PostgreSQL:
             return None
         try:
             query = f"SELECT * FROM {table_name} WHERE id={id};"
-            self.cursor.execute(query)
+            self.execute_query(table_name, query)
             records = self.cursor.fetchall()
             return records
         except (Exception, Error) as error:
@@ -75,7 +143,7 @@ class PostgreSQL:
             return None
         try:
             query = f"INSERT INTO products (name, price, quantity) VALUES (%s, %s, %s) RETURNING id;"
-            self.cursor.execute(query, (name, price, quantity))
+            self.execute_query("products", query, (name, price, quantity))
             self.connection.commit()
             product_id = self.cursor.fetchone()[0]
             return product_id
@@ -87,21 +155,138 @@ class PostgreSQL:
             return None
         try:
             query = f"INSERT INTO customers (name, email) VALUES (%s, %s) RETURNING id;"
-            self.cursor.execute(query, (name, email))
+            self.execute_query("customers", query, (name, email))
             self.connection.commit()
             customer_id = self.cursor.fetchone()[0]
             return customer_id
         except (Exception, Error) as error:
             return None
 
+    def insert_returning_ids(self, table_name, columns, rows):
+        placeholders = "(" + ", ".join(["%s"] * len(columns)) + ")"
+        query = (
+            f"INSERT INTO {table_name} ({', '.join(columns)}) "
+            f"VALUES {', '.join([placeholders] * len(rows))} RETURNING id;"
+        )
+        self.execute_query(table_name, query, [value for row in rows for value in row])
+        return [row[0] for row in self.cursor.fetchall()]
+
+    def create_fixtures(self, batches):
+        '''Insert (table, columns, rows) batches with one statement each in a single transaction'''
+        if not self.cursor:
+            return None
+        try:
+            ids = [
+                self.insert_returning_ids(table_name, columns, rows) if rows else []
+                for table_name, columns, rows in batches
+            ]
+            self.connection.commit()
+            return ids
+        except (Exception, Error) as error:
+            self.connection.rollback()
+            return None
+
+    def count_rows(self, table_name):
+        if not self.cursor:
+            return None
+        try:
+            query = f"SELECT count(*) FROM {table_name};"
+            self.execute_query(table_name, query)
+            return self.cursor.fetchone()[0]
+        except (Exception, Error) as error:
+            return None
+
+    def get_first_record(self, table_name):
+        if not self.cursor:
+            return None
+        try:
+            query = f"SELECT * FROM {table_name} LIMIT 1;"
+            self.execute_query(table_name, query)
+            return self.cursor.fetchone()
+        except (Exception, Error) as error:
+            return None
+
+    def explain_query(self, table_name, query, params=None, enable_seqscan=True):
+        '''EXPLAIN (ANALYZE, BUFFERS) a query inside a transaction that is rolled back afterwards'''
+        if not self.cursor:
+            return None
+        try:
+            if not enable_seqscan:
+                self.execute_query(table_name, "SET LOCAL enable_seqscan = off;")
+            self.execute_query(table_name, f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {query}", params)
+            plan = self.cursor.fetchone()[0]
+            self.connection.rollback()
+            return plan[0]
+        except (Exception, Error) as error:
+            self.connection.rollback()
+            return None
+
+    def snapshot_table(self, table_name, digest_threshold=DIGEST_THRESHOLD):
+        '''Whole-table snapshot streamed with binary COPY, diffed before/after a test case'''
+        if not self.cursor:
+            return None
+        try:
+            snapshot = read_snapshot(self.cursor, table_name, digest_threshold)
+            self.connection.rollback()
+            return snapshot
+        except (Exception, Error) as error:
+            self.connection.rollback()
+            return None
+
+    def seed_rows(self, table_name, query, params):
+        if not self.cursor:
+            return None
+        try:
+            self.execute_query(table_name, query, params)
+            inserted = self.cursor.rowcount
+            self.execute_query(table_name, f"ANALYZE {table_name};")
+            self.connection.commit()
+            return inserted
+        except (Exception, Error) as error:
+            self.connection.rollback()
+            return None
+
+    def seed_customers(self, first, last, prefix="scale"):
+        query = (
+            "INSERT INTO customers (name, email) "
+            "SELECT %s || g, %s || g || '@example.com' FROM generate_series(%s, %s) AS g;"
+        )
+        name = f"{prefix}_customer_"
+        return self.seed_rows("customers", query, (name, name, first, last))
+
+    def seed_products(self, first, last, prefix="scale"):
+        query = (
+            "INSERT INTO products (name, price, quantity) "
+            "SELECT %s || g, 100, 1000 FROM generate_series(%s, %s) AS g;"
+        )
+        return self.seed_rows("products", query, (f"{prefix}_product_", first, last))
+
+    def seed_billing(self, cust_id, count, prefix="scale"):
+        query = (
+            "INSERT INTO billing (cust_id, prod_id, quantity) "
+            "SELECT %s, p.id, 1 FROM products p "
+            "WHERE p.name LIKE %s "
+            "AND NOT EXISTS (SELECT 1 FROM billing b WHERE b.cust_id = %s AND b.prod_id = p.id) "
+            "ORDER BY p.id LIMIT %s;"
+        )
+        return self.seed_rows("billing", query, (cust_id, f"{prefix}_product_%", cust_id, count))
+
     def clear_tables(self):
         tables = ["products", "customers", "billing"]
         for table in tables:
             self.truncate_table(table)
 
-def generate_random_string(length):
-    letters = string.ascii_letters + string.digits
-    return "".join(random.choice(letters) for _ in range(length))
+def endpoint_name(method, api_url):
+    path = re.sub(r"/\d+(?=/|$)", "/{id}", urlsplit(api_url).path)
+    return f"{method} {path}"
+
+# fixture kind -> table, columns, builder of one row of column values
+FIXTURE_KINDS = {
+    "product": ("products", ("name", "price", "quantity"), lambda: (
+        generate_random_string(10), random.randint(100, 1000), random.randint(1, 100))),
+    "customer": ("customers", ("name", "email"), lambda: (
+        generate_random_string(10), generate_random_string(10) + "@gmail.com")),
+}
 
 class Activity(PostgreSQL):
     def __init__(self):
@@ -110,8 +295,73 @@ class Activity(PostgreSQL):
         self.billing_id = None
         self.isCreatedSuccessful = False
         self.isBillingCreatedSuccessful = False
+        self.write_confirmation = None
+        self.fixtures = None
+        self.transport = RequestsTransport()
+        self.product_url = PRODUCT_SERVICE_URL
+        self.billing_url = BILLING_SERVICE_URL
         super().__init__("localhost", "database_name", "postgres", "password")
 
+    def send_request(self, method, api_url, **kwargs):
+        event = {
+            "testcase": self.current_testcase,
+            "method": method,
+            "url": api_url,
+            "endpoint": endpoint_name(method, api_url),
+            "payload": kwargs.get("json"),
+            "status": None,
+            "bytes": 0,
+            "response": None,
+            "error": None,
+        }
+        if self.deadline is not None:
+            kwargs["timeout"] = self.deadline.limit(kwargs.get("timeout"))
+        self.notify("on_http_start", event, kwargs)
+        event["start"] = time.time()
+        started = time.perf_counter()
+        try:
+            response = self.transport.request(method, api_url, **kwargs)
+            event["status"] = response.status_code
+            event["bytes"] = len(response.content)
+            event["response"] = response
+            return response
+        except requests.RequestException as e:
+            event["error"] = str(e)
+            if self.deadline is not None and self.deadline.expired():
+                raise DeadlineExceeded(f"{method} {api_url} cancelled: {e}")
+            raise
+        finally:
+            event["duration_ms"] = (time.perf_counter() - started) * 1000
+            self.notify("on_http", event)
+
+    def fixture(self, kind):
+        '''Id of the current test case's product/customer fixture, created on its own if none was prepared'''
+        if self.fixtures is not None:
+            fixture_id = self.fixtures.take(self.current_testcase, kind)
+            if fixture_id is not None:
+                return fixture_id
+        table_name, columns, builder = FIXTURE_KINDS[kind]
+        self.connect_to_db()
+        if kind == "product":
+            fixture_id = self.create_document_product(*builder())
+        else:
+            fixture_id = self.create_document_customer(*builder())
+        self.disconnect_from_db()
+        return fixture_id
+
+    def expect_write(self):
+        if self.write_confirmation is not None:
+            self.write_confirmation.expect()
+
+    def confirm_write(self, test_object, testcase_description, table_name, id, op=None):
+        if self.write_confirmation is None:
+            return
+        timeout = self.write_confirmation.timeout
+        if self.deadline is not None:
+            timeout = self.deadline.limit(timeout)
+        confirmation = self.write_confirmation.wait_for(table_name, id, op, timeout)
+        test_object.update_performance("write_confirmation", testcase_description, confirmation)
+
     def testcase_check_for_successful_product_creation(self, test_object):
         testcase_description = "Check for successful product creation"
         expected_result = "product created successfully!"
@@ -122,7 +372,7 @@ class Activity(PostgreSQL):
         test_object.update_pre_result(testcase_description, expected_result)
 
         try:
-            api_url = "http://localhost:8080/api/products"
+            api_url = f"{self.product_url}/api/products"
             headers = {"Content-Type": "application/json"}
             payload = {
                 "name": generate_random_string(10),
@@ -131,7 +381,8 @@ class Activity(PostgreSQL):
             }
 
             try:
-                response = requests.post(api_url, json=payload, headers=headers, timeout=5)
+                self.expect_write()
+                response = self.send_request("POST", api_url, json=payload, headers=headers, timeout=5)
                 response.raise_for_status()
             except requests.RequestException as e:
                 test_object.update_result(
@@ -139,11 +390,13 @@ class Activity(PostgreSQL):
                 )
                 return
 
-            json_data = response.json()
-            product_id = json_data.get('id', None)
+            json_data, errors = decode_response(response, "product")
+            actual = describe_errors(actual, errors)
+            product_id = None if errors else json_data['id']
 
             if product_id is not None:
                 self.product_id = product_id
+                self.confirm_write(test_object, testcase_description, "products", product_id, "INSERT")
                 self.connect_to_db()
                 products = self.getItemById("products", product_id)
                 self.disconnect_from_db()
@@ -161,7 +414,7 @@ class Activity(PostgreSQL):
             test_object.update_result(
                 0, expected_result, actual, testcase_description, "N/A", marks, marks_obtained
             )
-            test_object.eval_message["testcase_name"] = str(e)
+            test_object.update_error(self.current_testcase or testcase_description, str(e))
 
     def testcase_check_for_successful_product_retrieval_by_id(self, test_object):
         testcase_description = "Check for successful product retrieval by id"
@@ -173,14 +426,7 @@ class Activity(PostgreSQL):
         test_object.update_pre_result(testcase_description, expected_result)
 
         try:
-            self.connect_to_db()
-            product = {
-                "name": generate_random_string(10),
-                "price": random.randint(100, 1000),
-                "quantity": random.randint(1, 100),
-            }
-            product_id = self.create_document_product(product["name"], product["price"], product["quantity"])
-            self.disconnect_from_db()
+            product_id = self.fixture("product")
 
             if product_id is None:
                 test_object.update_result(
@@ -189,13 +435,14 @@ class Activity(PostgreSQL):
                 )
                 return
 
-            api_url = "http://localhost:8080/api/products/" + str(product_id)
+            api_url = f"{self.product_url}/api/products/{product_id}"
             headers = {"Content-Type": "application/json"}
 
-            response = requests.get(api_url, headers=headers, timeout=5)
-            json_data = response.json()
+            response = self.send_request("GET", api_url, headers=headers, timeout=5)
+            json_data, errors = decode_response(response, "product")
+            actual = describe_errors(actual, errors)
 
-            if response.status_code == 200 and json_data['id'] == product_id:
+            if response.status_code == 200 and not errors and json_data['id'] == product_id:
                 marks_obtained = marks
                 return test_object.update_result(
                     1, expected_result, expected_result, testcase_description, "N/A", marks, marks_obtained
@@ -207,7 +454,7 @@ class Activity(PostgreSQL):
             test_object.update_result(
                 0, expected_result, actual, testcase_description, "N/A", marks, marks_obtained
             )
-            test_object.eval_message["testcase_name"] = str(e)
+            test_object.update_error(self.current_testcase or testcase_description, str(e))
 
     def testcase_check_for_update_product(self, test_object):
         testcase_description = "Check for updating a product"
@@ -219,14 +466,7 @@ class Activity(PostgreSQL):
         test_object.update_pre_result(testcase_description, expected_result)
 
         try:
-            self.connect_to_db()
-            product = {
-                "name": generate_random_string(10),
-                "price": random.randint(100, 1000),
-                "quantity": random.randint(1, 100),
-            }
-            product_id = self.create_document_product(product["name"], product["price"], product["quantity"])
-            self.disconnect_from_db()
+            product_id = self.fixture("product")
 
             if product_id is None:
                 test_object.update_result(
@@ -234,7 +474,7 @@ class Activity(PostgreSQL):
                 )
                 return
 
-            api_url = "http://localhost:8080/api/products/" + str(product_id)
+            api_url = f"{self.product_url}/api/products/{product_id}"
             headers = {"Content-Type": "application/json"}
             payload = {
                 "name": generate_random_string(10),
@@ -242,9 +482,11 @@ class Activity(PostgreSQL):
                 "quantity": random.randint(1, 100),
             }
 
-            response = requests.put(api_url, json=payload, headers=headers, timeout=5)
+            self.expect_write()
+            response = self.send_request("PUT", api_url, json=payload, headers=headers, timeout=5)
 
             if response.status_code == 200:
+                self.confirm_write(test_object, testcase_description, "products", product_id, "UPDATE")
                 self.connect_to_db()
                 products = self.getItemById("products", product_id)
                 self.disconnect_from_db()
@@ -261,7 +503,7 @@ class Activity(PostgreSQL):
             test_object.update_result(
                 0, expected_result, actual, testcase_description, "N/A", marks, marks_obtained
             )
-            test_object.eval_message["testcase_name"] = str(e)
+            test_object.update_error(self.current_testcase or testcase_description, str(e))
 
     def testcase_check_for_delete_product(self, test_object):
         testcase_description = "Check for deleting a product"
@@ -273,14 +515,7 @@ class Activity(PostgreSQL):
         test_object.update_pre_result(testcase_description, expected_result)
 
         try:
-            self.connect_to_db()
-            product = {
-                "name": generate_random_string(10),
-                "price": random.randint(100, 1000),
-                "quantity": random.randint(1, 100),
-            }
-            product_id = self.create_document_product(product["name"], product["price"], product["quantity"])
-            self.disconnect_from_db()
+            product_id = self.fixture("product")
 
             if product_id is None:
                 test_object.update_result(
@@ -288,12 +523,14 @@ class Activity(PostgreSQL):
                 )
                 return
 
-            api_url = "http://localhost:8080/api/products/" + str(product_id)
+            api_url = f"{self.product_url}/api/products/{product_id}"
             headers = {"Content-Type": "application/json"}
 
-            response = requests.delete(api_url, headers=headers, timeout=5)
+            self.expect_write()
+            response = self.send_request("DELETE", api_url, headers=headers, timeout=5)
 
             if response.status_code == 200:
+                self.confirm_write(test_object, testcase_description, "products", product_id, "DELETE")
                 self.connect_to_db()
                 products = self.getItemById("products", product_id)
                 self.disconnect_from_db()
@@ -310,7 +547,7 @@ class Activity(PostgreSQL):
             test_object.update_result(
                 0, expected_result, actual, testcase_description, "N/A", marks, marks_obtained
             )
-            test_object.eval_message["testcase_name"] = str(e)
+            test_object.update_error(self.current_testcase or testcase_description, str(e))
 
     def testcase_check_for_successful_customer_creation(self, test_object):
         testcase_description = "Check for successful customer creation"
@@ -322,7 +559,7 @@ class Activity(PostgreSQL):
         test_object.update_pre_result(testcase_description, expected_result)
 
         try:
-            api_url = "http://localhost:8080/api/customers"
+            api_url = f"{self.product_url}/api/customers"
             headers = {"Content-Type": "application/json"}
             payload = {
                 "name": generate_random_string(10),
@@ -330,7 +567,8 @@ class Activity(PostgreSQL):
             }
 
             try:
-                response = requests.post(api_url, json=payload, headers=headers, timeout=5)
+                self.expect_write()
+                response = self.send_request("POST", api_url, json=payload, headers=headers, timeout=5)
                 response.raise_for_status()
             except requests.RequestException as e:
                 test_object.update_result(
@@ -338,11 +576,13 @@ class Activity(PostgreSQL):
                 )
                 return
 
-            json_data = response.json()
-            customer_id = json_data.get('id', None)
+            json_data, errors = decode_response(response, "customer")
+            actual = describe_errors(actual, errors)
+            customer_id = None if errors else json_data['id']
 
             if customer_id is not None:
                 self.customer_id = customer_id
+                self.confirm_write(test_object, testcase_description, "customers", customer_id, "INSERT")
                 self.connect_to_db()
                 customers = self.getItemById("customers", customer_id)
                 self.disconnect_from_db()
@@ -359,7 +599,7 @@ class Activity(PostgreSQL):
             test_object.update_result(
                 0, expected_result, actual, testcase_description, "N/A", marks, marks_obtained
             )
-            test_object.eval_message["testcase_name"] = str(e)
+            test_object.update_error(self.current_testcase or testcase_description, str(e))
 
     def testcase_check_get_all_customers(self, test_object):
         testcase_description = "Check for retrieving all customers"
@@ -371,13 +611,7 @@ class Activity(PostgreSQL):
         test_object.update_pre_result(testcase_description, expected_result)
 
         try:
-            self.connect_to_db()
-            customer = {
-                "name": generate_random_string(10),
-                "email": generate_random_string(10) + "@gmail.com",
-            }
-            customer_id = self.create_document_customer(customer["name"], customer["email"])
-            self.disconnect_from_db()
+            customer_id = self.fixture("customer")
 
             if customer_id is None:
                 test_object.update_result(
@@ -385,14 +619,14 @@ class Activity(PostgreSQL):
                 )
                 return
 
-            api_url = "http://localhost:8080/api/customers"
+            api_url = f"{self.product_url}/api/customers"
             headers = {"Content-Type": "application/json"}
 
-            response = requests.get(api_url, headers=headers, timeout=5)
-            json_data = response.json()
-            customer_ids = [c['id'] for c in json_data]
+            response = self.send_request("GET", api_url, headers=headers, timeout=5)
+            json_data, errors = decode_response(response, "customer_list")
+            actual = describe_errors(actual, errors)
 
-            if response.status_code == 200 and len(json_data) > 0 and customer_id in customer_ids:
+            if response.status_code == 200 and not errors and len(json_data) > 0 and customer_id in [c['id'] for c in json_data]:
                 marks_obtained = marks
                 return test_object.update_result(
                     1, expected_result, expected_result, testcase_description, "N/A", marks, marks_obtained
@@ -404,7 +638,7 @@ class Activity(PostgreSQL):
             test_object.update_result(
                 0, expected_result, actual, testcase_description, "N/A", marks, marks_obtained
             )
-            test_object.eval_message["testcase_name"] = str(e)
+            test_object.update_error(self.current_testcase or testcase_description, str(e))
 
     def testcase_check_for_create_billing(self, test_object):
         testcase_description = "Check for successful billing creation"
@@ -429,7 +663,7 @@ class Activity(PostgreSQL):
             return
 
         try:
-            api_url = "http://localhost:8081/api/billing"
+            api_url = f"{self.billing_url}/api/billing"
             headers = {"Content-Type": "application/json"}
             payload = {
                 "cust_id": self.customer_id,
@@ -438,7 +672,8 @@ class Activity(PostgreSQL):
             }
 
             try:
-                response = requests.post(api_url, json=payload, headers=headers, timeout=5)
+                self.expect_write()
+                response = self.send_request("POST", api_url, json=payload, headers=headers, timeout=5)
                 response.raise_for_status()
             except requests.RequestException as e:
                 test_object.update_result(
@@ -446,11 +681,13 @@ class Activity(PostgreSQL):
                 )
                 return
 
-            json_data = response.json()
-            billing_id = json_data.get('id', None)
+            json_data, errors = decode_response(response, "billing")
+            actual = describe_errors(actual, errors)
+            billing_id = None if errors else json_data['id']
 
             if billing_id is not None:
                 self.billing_id = billing_id
+                self.confirm_write(test_object, testcase_description, "billing", billing_id, "INSERT")
                 self.connect_to_db()
                 billings = self.getItemById("billing", billing_id)
                 self.disconnect_from_db()
@@ -468,7 +705,7 @@ class Activity(PostgreSQL):
             test_object.update_result(
                 0, expected_result, actual, testcase_description, "N/A", marks, marks_obtained
             )
-            test_object.eval_message["testcase_name"] = str(e)
+            test_object.update_error(self.current_testcase or testcase_description, str(e))
 
     def testcase_check_for_quantity_update_if_product_exists(self, test_object):
         testcase_description = "Check for updating quantity if product is already bought"
@@ -487,7 +724,7 @@ class Activity(PostgreSQL):
             return
 
         try:
-            api_url = "http://localhost:8081/api/billing"
+            api_url = f"{self.billing_url}/api/billing"
             headers = {"Content-Type": "application/json"}
             payload = {
                 "cust_id": self.customer_id,
@@ -496,9 +733,11 @@ class Activity(PostgreSQL):
             }
             self.billing_quantity += payload['quantity']
 
-            response = requests.post(api_url, json=payload, headers=headers, timeout=5)
+            self.expect_write()
+            response = self.send_request("POST", api_url, json=payload, headers=headers, timeout=5)
 
             if response.status_code in [200, 201]:
+                self.confirm_write(test_object, testcase_description, "billing", self.billing_id)
                 self.connect_to_db()
                 billings = self.getItemById("billing", self.billing_id)
                 self.disconnect_from_db()
@@ -515,7 +754,7 @@ class Activity(PostgreSQL):
             test_object.update_result(
                 0, expected_result, actual, testcase_description, "N/A", marks, marks_obtained
             )
-            test_object.eval_message["testcase_name"] = str(e)
+            test_object.update_error(self.current_testcase or testcase_description, str(e))
 
     def testcase_check_for_retrieving_all_billings_by_customer_id(self, test_object):
         testcase_description = "Check for retrieving all billings by customer id"
@@ -534,13 +773,14 @@ class Activity(PostgreSQL):
             return
 
         try:
-            api_url = f"http://localhost:8081/api/billing/{self.customer_id}"
+            api_url = f"{self.billing_url}/api/billing/{self.customer_id}"
             headers = {"Content-Type": "application/json"}
 
-            response = requests.get(api_url, headers=headers, timeout=5)
-            json_data = response.json()
+            response = self.send_request("GET", api_url, headers=headers, timeout=5)
+            json_data, errors = decode_response(response, "billing_list")
+            actual = describe_errors(actual, errors)
 
-            if response.status_code == 200 and len(json_data) > 0:
+            if response.status_code == 200 and not errors and len(json_data) > 0:
                 billing_ids = [b['id'] for b in json_data]
                 if self.billing_id in billing_ids:
                     marks_obtained = marks
@@ -554,43 +794,480 @@ class Activity(PostgreSQL):
             test_object.update_result(
                 0, expected_result, actual, testcase_description, "N/A", marks, marks_obtained
             )
-            test_object.eval_message["testcase_name"] = str(e)
-
-def start_tests(args):
+            test_object.update_error(self.current_testcase or testcase_description, str(e))
+
+TESTCASES = [
+    "testcase_check_for_successful_product_creation",
+    "testcase_check_for_successful_product_retrieval_by_id",
+    "testcase_check_for_update_product",
+    "testcase_check_for_delete_product",
+    "testcase_check_for_successful_customer_creation",
+    "testcase_check_get_all_customers",
+    "testcase_check_for_create_billing",
+    "testcase_check_for_quantity_update_if_product_exists",
+    "testcase_check_for_retrieving_all_billings_by_customer_id",
+]
+
+TESTCASE_INFO = {
+    "testcase_check_for_successful_product_creation": {
+        "description": "Check for successful product creation",
+        "expected": "product created successfully!",
+        "marks": 10,
+        "tags": ["product", "create"],
+        "depends_on": [],
+    },
+    "testcase_check_for_successful_product_retrieval_by_id": {
+        "description": "Check for successful product retrieval by id",
+        "expected": "product retrieved successfully!",
+        "marks": 10,
+        "tags": ["product", "read"],
+        "depends_on": [],
+        "fixtures": {"product": "shared"},
+    },
+    "testcase_check_for_update_product": {
+        "description": "Check for updating a product",
+        "expected": "product updated successfully!",
+        "marks": 10,
+        "tags": ["product", "write"],
+        "depends_on": [],
+        "fixtures": {"product": "exclusive"},
+    },
+    "testcase_check_for_delete_product": {
+        "description": "Check for deleting a product",
+        "expected": "product deleted successfully!",
+        "marks": 10,
+        "tags": ["product", "write"],
+        "depends_on": [],
+        "fixtures": {"product": "exclusive"},
+    },
+    "testcase_check_for_successful_customer_creation": {
+        "description": "Check for successful customer creation",
+        "expected": "customer created successfully!",
+        "marks": 10,
+        "tags": ["customer", "create"],
+        "depends_on": [],
+    },
+    "testcase_check_get_all_customers": {
+        "description": "Check for retrieving all customers",
+        "expected": "All customers retrieved successfully!",
+        "marks": 10,
+        "tags": ["customer", "read"],
+        "depends_on": [],
+        "fixtures": {"customer": "shared"},
+    },
+    "testcase_check_for_create_billing": {
+        "description": "Check for successful billing creation",
+        "expected": "billing created successfully!",
+        "marks": 10,
+        "tags": ["billing", "create"],
+        "depends_on": [
+            "testcase_check_for_successful_product_creation",
+            "testcase_check_for_successful_customer_creation",
+        ],
+    },
+    "testcase_check_for_quantity_update_if_product_exists": {
+        "description": "Check for updating quantity if product is already bought",
+        "expected": "quantity updated successfully!",
+        "marks": 10,
+        "tags": ["billing", "write"],
+        "depends_on": [
+            "testcase_check_for_create_billing",
+        ],
+    },
+    "testcase_check_for_retrieving_all_billings_by_customer_id": {
+        "description": "Check for retrieving all billings by customer id",
+        "expected": "All billings retrieved successfully!",
+        "marks": 20,
+        "tags": ["billing", "read"],
+        "depends_on": [
+            "testcase_check_for_create_billing",
+        ],
+    },
+}
+
+def testcase_order():
+    return [TESTCASE_INFO[testcase_name]["description"] for testcase_name in TESTCASES]
+
+def testcase_names(value):
+    if value == "all":
+        return value
+    names = [name.strip() for name in value.split(",") if name.strip()]
+    names = [name if name.startswith("testcase_") else "testcase_" + name for name in names]
+    for name in names:
+        if name not in TESTCASE_INFO:
+            raise argparse.ArgumentTypeError(f"no test case is named {name!r}")
+    return names
+
+def testcase_selectors(value):
+    return parse_selectors(value, TESTCASES, TESTCASE_INFO)
+
+def row_counts(value):
+    return [int(float(size)) for size in value.split(",") if size.strip()]
+
+def parse_options(argv):
+    parser = argparse.ArgumentParser(prog="inventory_billing_system_validate.py")
+    parser.add_argument("--select", type=testcase_selectors, default=None,
+                        help="comma separated test case names or tags (product, customer, billing, create, read, write); "
+                             "the test cases they depend on are selected too")
+    parser.add_argument("--shard", type=parse_shard, default=None,
+                        help="run only shard i/N of the selected test cases; dependency chains stay on one shard")
+    parser.add_argument("--shard-durations", default=None,
+                        help="results warehouse or previous result file whose durations balance the shards "
+                             "(use the same file on every machine)")
+    parser.add_argument("--result-file", default=None,
+                        help="also write the result JSON to this file, e.g. per shard for testcase_selection.py merge")
+    parser.add_argument("--profile", type=testcase_names, nargs="?", const="all", default=None,
+                        help="profile all test cases or a comma separated list of testcase_* names")
+    parser.add_argument("--profile-dir", default="/tmp/clv/profiles",
+                        help="directory for the per test case .prof/.tracemalloc stats files")
+    parser.add_argument("--profile-top", type=int, default=10,
+                        help="number of hot functions and allocation sites kept in the result")
+    parser.add_argument("--warm-up", type=int, default=0, metavar="ROUNDS",
+                        help="rounds of ungraded requests to every endpoint before the test cases; "
+                             "reports cold and steady-state latency per endpoint")
+    parser.add_argument("--deadline", type=float, default=None,
+                        help="overall time budget in seconds; each test case gets an equal share of what is left")
+    parser.add_argument("--warehouse", nargs="?", const=DEFAULT_WAREHOUSE, default=None,
+                        help="append the run to this SQLite results history (see results_warehouse.py for trends)")
+    parser.add_argument("--metrics-textfile", default=None,
+                        help="write Prometheus metrics for the run to this textfile-collector file")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="serve Prometheus/OpenMetrics metrics on this local port while the run is in progress")
+    parser.add_argument("--trace-file", default=None,
+                        help="write test case, HTTP and DB spans to this Trace Event JSON file")
+    parser.add_argument("--record-traffic", nargs="?", const=DEFAULT_CAPTURE, default=None,
+                        help="write every HTTP exchange to this JSON lines capture (replaced each run) for traffic_capture.py replay")
+    parser.add_argument("--targets", type=parse_targets, default=None,
+                        help="product,billing service base URL pairs separated by ';' (e.g. "
+                             "localhost:8080,localhost:8081;localhost:9080,localhost:9081); the graded run uses "
+                             "the first pair, then the suite and the load mix run against all pairs at once")
+    parser.add_argument("--replica-iterations", type=int, default=1,
+                        help="suite passes per replica in the multi-replica run")
+    parser.add_argument("--fault-scenarios", nargs="?", const=",".join(SCENARIOS), default=None,
+                        help="run the test cases through a fault-injecting proxy under these comma separated scenarios "
+                             f"({', '.join(SCENARIOS)}) and report how pass rate and tail latency degrade; only the harness's "
+                             "requests are degraded, not service-to-service or database traffic")
+    parser.add_argument("--fault-iterations", type=int, default=3, help="suite passes per fault scenario")
+    parser.add_argument("--transport", choices=TRANSPORTS, default="requests",
+                        help="HTTP backend: requests, or multiplex (HTTP/2 where supported, else pipelined HTTP/1.1)")
+    parser.add_argument("--json-decoder", choices=sorted(JSON_DECODERS), default=None,
+                        help="JSON decoder used for service responses (defaults to the fastest installed)")
+    parser.add_argument("--load-rate", type=float, default=None,
+                        help="after the checks, drive the product/customer/billing mix open-loop at this many requests/s")
+    parser.add_argument("--load-duration", type=float, default=30, help="open-loop load duration in seconds")
+    parser.add_argument("--load-arrival", choices=["constant", "poisson"], default="constant",
+                        help="fixed inter-arrival time or Poisson arrivals")
+    parser.add_argument("--load-workers", type=int, default=64, help="maximum requests in flight")
+    parser.add_argument("--capacity", nargs="?", const="all", default=None,
+                        help="step-load each endpoint (or these comma separated 'METHOD /path' endpoints) to find "
+                             "the maximum request rate it sustains within the SLO")
+    parser.add_argument("--capacity-slo-p99", type=float, default=DEFAULT_SLO_P99_MS, help="p99 latency SLO in ms")
+    parser.add_argument("--capacity-max-errors", type=float, default=DEFAULT_MAX_ERROR_RATE,
+                        help="largest error rate (0..1) within the SLO")
+    parser.add_argument("--capacity-step-duration", type=float, default=5, help="seconds per load step")
+    parser.add_argument("--capacity-start-rps", type=float, default=10, help="rate of the first step")
+    parser.add_argument("--capacity-max-rps", type=float, default=5000, help="stop ramping above this rate")
+    parser.add_argument("--soak", type=float, default=None,
+                        help="repeat the test-case mix for this many seconds while tracking connections and service RSS/CPU")
+    parser.add_argument("--soak-interval", type=float, default=30, help="seconds between soak resource samples")
+    parser.add_argument("--soak-pids", type=lambda value: [int(pid) for pid in value.split(",")], default=None,
+                        help="service process ids to sample (defaults to the processes listening on 8080/8081)")
+    parser.add_argument("--scaling", nargs="?", const=DEFAULT_SIZES, type=row_counts, default=None,
+                        help="seed customers/billing at these comma separated row counts (e.g. 1e2,1e3,1e4) "
+                             "and measure how the list endpoints scale")
+    parser.add_argument("--state-diff", action="store_true",
+                        help="snapshot the tables with binary COPY around each test case and report the changed rows")
+    parser.add_argument("--query-plans", action="store_true",
+                        help="EXPLAIN ANALYZE the billing and product lookups and report advisories")
+    parser.add_argument("--statement-stats", action="store_true",
+                        help="attribute pg_stat_statements calls, time and rows to each API call")
+    parser.add_argument("--n-plus-one", nargs="?", const=[10, 100], type=row_counts, default=None,
+                        help="count server statements of the list endpoints at these row counts to detect N+1 queries")
+    options = parser.parse_args(argv)
+    if options.shard_durations and not os.path.isfile(options.shard_durations):
+        parser.error(f"--shard-durations: no such file {options.shard_durations}")
+    return options
+
+def fixture_declarations(testcases):
+    return {name: TESTCASE_INFO[name]["fixtures"] for name in testcases if "fixtures" in TESTCASE_INFO[name]}
+
+def skip_testcase(test_object, testcase_name, reason):
+    info = TESTCASE_INFO[testcase_name]
+    test_object.update_skipped(info["description"], info["expected"], reason, info["marks"])
+
+def run_testcase(challenge_test, test_object, testcase_name, profiler=None, time_limit=None):
+    if time_limit is not None and time_limit <= 0:
+        # the listeners still see the skipped test case start and end
+        challenge_test.current_testcase = testcase_name
+        challenge_test.notify("on_testcase_start", testcase_name)
+        skip_testcase(test_object, testcase_name, "run deadline reached before the test case started")
+        challenge_test.notify("on_testcase_end", testcase_name, 0)
+        challenge_test.current_testcase = None
+        return
+    testcase = getattr(challenge_test, testcase_name)
+    challenge_test.current_testcase = testcase_name
+    if time_limit is not None:
+        challenge_test.deadline = TestcaseDeadline(time_limit, challenge_test)
+        challenge_test.deadline.start()
+    challenge_test.notify("on_testcase_start", testcase_name)
+    started = time.perf_counter()
+    try:
+        if profiler is not None and profiler.wants(testcase_name):
+            summary = profiler.run(testcase_name, testcase, test_object)
+            test_object.update_performance("profiling", testcase_name, summary)
+        else:
+            testcase(test_object)
+    except DeadlineExceeded as e:
+        challenge_test.disconnect_from_db()
+        skip_testcase(test_object, testcase_name, f"cancelled, {e}")
+    finally:
+        if challenge_test.deadline is not None:
+            challenge_test.deadline.stop()
+            challenge_test.deadline = None
+        challenge_test.notify("on_testcase_end", testcase_name, time.perf_counter() - started)
+        challenge_test.current_testcase = None
+
+def run_iteration(args, fixtures=None, transport=None, target=None, listeners=None):
+    '''One quiet pass over the test cases with a fresh activity, used by the repeated modes'''
+    activity = Activity()
+    activity.listeners += listeners or []
+    if target is not None:
+        activity.product_url, activity.billing_url = target
+    if transport is not None:
+        activity.transport = transport
+    test_object = ResultOutput(args, Activity, verbose=False, testcase_order=testcase_order())
+    if fixtures is not None:
+        fixtures.prepare(fixture_declarations(TESTCASES))
+        activity.fixtures = fixtures
+    try:
+        for testcase_name in TESTCASES:
+            run_testcase(activity, test_object, testcase_name)
+    finally:
+        if transport is None:
+            activity.transport.close()
+        test_object.close()
+    return test_object.results
+
+def run_replica_pass(args, target, transport_name="requests"):
+    '''One quiet pass over the test cases against a (product_url, billing_url) target'''
+    activity = Activity()
+    activity.product_url, activity.billing_url = target
+    activity.transport = make_transport(transport_name)
+    test_object = ResultOutput(args, Activity, verbose=False, testcase_order=testcase_order())
+    activity.listeners.append(test_object)
+    try:
+        for testcase_name in TESTCASES:
+            run_testcase(activity, test_object, testcase_name)
+    finally:
+        activity.transport.close()
+        test_object.close()
+    return test_object
+
+def run_graded_testcases(challenge_test, test_object, testcases, deadline=None, profiler=None):
+    '''
+    The graded part of a run, shared by the CLI and the evaluator daemon: write confirmation,
+    the fixtures and the test cases within the run deadline. Returns the fixture cache.
+    '''
+    write_confirmation = WriteConfirmation(challenge_test)
+    try:
+        if write_confirmation.start():
+            challenge_test.write_confirmation = write_confirmation
+        budget = RunBudget(deadline) if deadline else None
+        fixtures = FixtureCache(challenge_test, FIXTURE_KINDS)
+        fixtures.prepare(fixture_declarations(testcases))
+        challenge_test.fixtures = fixtures
+        for index, testcase_name in enumerate(testcases):
+            time_limit = budget.share(len(testcases) - index) if budget is not None else None
+            run_testcase(challenge_test, test_object, testcase_name, profiler, time_limit)
+    finally:
+        write_confirmation.stop()
+        challenge_test.write_confirmation = None
+    return fixtures
+
+def planned_testcases(options):
+    testcases = select_testcases(TESTCASES, TESTCASE_INFO, options.select)
+    if options.shard is not None:
+        durations = load_durations(options.shard_durations, TESTCASE_INFO) if options.shard_durations else None
+        testcases = shard_testcases(testcases, TESTCASE_INFO, options.shard, durations)
+    return testcases
+
+def start_tests(args, options=None):
+    if options is None:
+        options = parse_options([])
+    testcases = planned_testcases(options)
+    if options.json_decoder:
+        set_json_decoder(options.json_decoder)
     args = args.replace("{", "")
     args = args.replace("}", "")
     args = args.split(":")
     args = {"token": args[1]}
     args = json.dumps(args)
 
-    test_object = ResultOutput(args, Activity)
+    test_object = ResultOutput(args, Activity, testcase_order=testcase_order())
     challenge_test = Activity()
-    challenge_test.connect_to_db()
-    challenge_test.clear_tables()
-    challenge_test.disconnect_from_db()
-
-    challenge_test.testcase_check_for_successful_product_creation(test_object)
-    challenge_test.testcase_check_for_successful_product_retrieval_by_id(test_object)
-    challenge_test.testcase_check_for_update_product(test_object)
-    challenge_test.testcase_check_for_delete_product(test_object)
-    challenge_test.testcase_check_for_successful_customer_creation(test_object)
-    challenge_test.testcase_check_get_all_customers(test_object)
-    challenge_test.testcase_check_for_create_billing(test_object)
-    challenge_test.testcase_check_for_quantity_update_if_product_exists(test_object)
-    challenge_test.testcase_check_for_retrieving_all_billings_by_customer_id(test_object)
-
-    challenge_test.connect_to_db()
-    challenge_test.clear_tables()
-    challenge_test.disconnect_from_db()
+    challenge_test.transport = make_transport(options.transport)
+    if options.targets:
+        challenge_test.product_url, challenge_test.billing_url = options.targets[0]
+    challenge_test.listeners.append(test_object)
+
+    tracer = None
+    if options.trace_file:
+        tracer = Tracer()
+        challenge_test.listeners.append(tracer)
+
+    recorder = None
+    if options.record_traffic:
+        recorder = TrafficRecorder(options.record_traffic)
+        recorder.start()
+        challenge_test.listeners.append(recorder)
+
+    exporter = MetricsExporter(test_object)
+    metrics_server = None
+    if options.metrics_port is not None:
+        metrics_server = exporter.serve(options.metrics_port)
+
+    try:
+        challenge_test.connect_to_db()
+        challenge_test.clear_tables()
+        challenge_test.disconnect_from_db()
+
+        statement_stats = None
+        if options.statement_stats:
+            statement_stats = StatementStats(challenge_test)
+            if statement_stats.start():
+                challenge_test.listeners.append(statement_stats)
+            else:
+                test_object.update_advisory("statements_per_request", "info", "pg_stat_statements is not available")
+                statement_stats = None
+
+        state_diff = None
+        if options.state_diff:
+            state_diff = StateDiffRecorder(PostgreSQL(
+                challenge_test.db_url, challenge_test.db_name, challenge_test.db_username, challenge_test.db_password
+            ))
+            if state_diff.start():
+                challenge_test.listeners.append(state_diff)
+            else:
+                test_object.update_advisory("side_effects", "info", "database unavailable, state diff skipped")
+                state_diff = None
+
+        profiler = None
+        if options.profile is not None:
+            profiled = None if options.profile == "all" else options.profile
+            profiler = TestcaseProfiler(options.profile_dir, profiled, options.profile_top)
+
+        if options.warm_up > 0:
+            WarmUp(challenge_test, options.warm_up, challenge_test.product_url, challenge_test.billing_url).run(test_object)
+
+        if options.shard is not None:
+            test_object.update_performance("shard", "plan", {
+                "shard": f"{options.shard[0]}/{options.shard[1]}",
+                "testcases": testcases,
+            })
+        fixtures = run_graded_testcases(challenge_test, test_object, testcases, options.deadline, profiler)
+
+        if state_diff is not None:
+            challenge_test.listeners.remove(state_diff)
+            state_diff.report(test_object)
+            state_diff.stop()
+        if statement_stats is not None:
+            challenge_test.listeners.remove(statement_stats)
+            statement_stats.report(test_object)
+            statement_stats.stop()
+
+        if options.n_plus_one:
+            n_plus_one_stats = StatementStats(challenge_test)
+            if n_plus_one_stats.start():
+                NPlusOneDetector(challenge_test, n_plus_one_stats, options.n_plus_one).run(test_object)
+                n_plus_one_stats.stop()
+            else:
+                test_object.update_advisory("n_plus_one", "info", "pg_stat_statements is not available, N+1 check skipped")
+
+        if options.targets:
+            fanout = ReplicaFanOut(options.targets)
+            test_object.update_performance("replicas", "suite", fanout.suite(
+                lambda target: run_replica_pass(args, target, options.transport), options.replica_iterations
+            ))
+            if options.load_rate:
+                test_object.update_performance("replicas", "load", fanout.load(
+                    options.load_rate, options.load_duration, options.load_arrival, options.load_workers,
+                    lambda: TransportSender(make_transport(options.transport)),
+                    lambda replica: [exporter.listener("replicas", replica)]
+                ))
+        elif options.load_rate:
+            try:
+                context = seed_context(challenge_test.product_url, challenge_test.billing_url)
+                driver = OpenLoopDriver(options.load_rate, options.load_duration, options.load_arrival,
+                                        workers=options.load_workers, sender=TransportSender(challenge_test.transport),
+                                        listeners=[exporter.listener("load")])
+                test_object.update_performance("load", "open_loop", driver.run(context))
+            except Exception as e:
+                test_object.update_performance("load", "open_loop", {"error": str(e)})
+
+        if options.capacity:
+            try:
+                context = seed_context(challenge_test.product_url, challenge_test.billing_url)
+                endpoints = None if options.capacity == "all" else [name.strip() for name in options.capacity.split(",")]
+                CapacitySearch(
+                    options.capacity_slo_p99, options.capacity_max_errors, options.capacity_start_rps, options.capacity_max_rps,
+                    step_duration=options.capacity_step_duration, endpoints=endpoints,
+                    make_sender=lambda: TransportSender(make_transport(options.transport)),
+                    listeners=[exporter.listener("capacity")]
+                ).run(test_object, context)
+            except Exception as e:
+                test_object.update_performance("capacity", "error", {"error": str(e)})
+
+        if options.fault_scenarios:
+            scenarios = [name.strip() for name in options.fault_scenarios.split(",") if name.strip() in SCENARIOS]
+            FaultScenarios((challenge_test.product_url, challenge_test.billing_url), scenarios, options.fault_iterations).run(
+                test_object, lambda target: run_replica_pass(args, target, options.transport)
+            )
 
+        if options.soak:
+            soak = SoakRun(challenge_test, options.soak, options.soak_interval, options.soak_pids)
+            soak.run(test_object, lambda: run_iteration(
+                args, fixtures, challenge_test.transport, (challenge_test.product_url, challenge_test.billing_url),
+                [exporter.listener("soak")]
+            ))
+
+        if options.scaling:
+            ScalingAnalysis(challenge_test, options.scaling).run(test_object)
+        if options.query_plans:
+            QueryPlanDiagnostics(challenge_test).run(test_object)
+
+        challenge_test.connect_to_db()
+        challenge_test.clear_tables()
+        challenge_test.disconnect_from_db()
+        fixtures.clear()
+
+        challenge_test.transport.close()
+        if recorder is not None:
+            recorder.stop()
+        if tracer is not None:
+            tracer.export(options.trace_file)
+        if options.metrics_textfile:
+            exporter.write_textfile(options.metrics_textfile)
+    finally:
+        # the port is released even if the run fails
+        if metrics_server is not None:
+            metrics_server.shutdown()
+            metrics_server.server_close()
+
+    test_object.close()
     result = test_object.result_final()
+    if options.warehouse:
+        warehouse = ResultsWarehouse(options.warehouse)
+        warehouse.add_run(json.loads(result), {info["description"]: name for name, info in TESTCASE_INFO.items()})
+        warehouse.close()
+    if options.result_file:
+        test_object.write_to_file(options.result_file)
     result = json.dumps(json.loads(result), indent=4)
     print(result)
     return result
 
 def main():
     args = sys.argv[2]
-    start_tests(args)
+    start_tests(args, parse_options(sys.argv[3:]))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
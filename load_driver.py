@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+import random
+import string
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from perf_stats import summarize_latencies
+
+PRODUCT_SERVICE_URL = "http://localhost:8080"
+BILLING_SERVICE_URL = "http://localhost:8081"
+
+
+def generate_random_string(length):
+    letters = string.ascii_letters + string.digits
+    return "".join(random.choice(letters) for _ in range(length))
+
+
+# endpoint, weight, request builder(context) -> (method, url, payload)
+DEFAULT_MIX = [
+    ("POST /api/products", 1, lambda context: (
+        "POST", f"{context['product_url']}/api/products",
+        {"name": generate_random_string(10), "price": random.randint(100, 1000), "quantity": random.randint(1, 100)})),
+    ("GET /api/products/{id}", 3, lambda context: (
+        "GET", f"{context['product_url']}/api/products/{context['product_id']}", None)),
+    ("POST /api/customers", 1, lambda context: (
+        "POST", f"{context['product_url']}/api/customers",
+        {"name": generate_random_string(10), "email": generate_random_string(10) + "@gmail.com"})),
+    ("GET /api/customers", 1, lambda context: (
+        "GET", f"{context['product_url']}/api/customers", None)),
+    ("POST /api/billing", 1, lambda context: (
+        "POST", f"{context['billing_url']}/api/billing",
+        {"cust_id": context["customer_id"], "prod_id": context["product_id"], "quantity": random.randint(1, 10)})),
+    ("GET /api/billing/{id}", 2, lambda context: (
+        "GET", f"{context['billing_url']}/api/billing/{context['customer_id']}", None)),
+]
+
+
+class RequestsSender:
+    '''Default sender: one requests.Session per worker thread'''
+
+    def __init__(self):
+        self.local = threading.local()
+
+    def __call__(self, method, url, payload, timeout):
+        if not hasattr(self.local, "session"):
+            self.local.session = requests.Session()
+        response = self.local.session.request(method, url, json=payload, timeout=timeout)
+        return response.status_code
+
+
+class OpenLoopDriver:
+    '''
+    Open-loop load: requests are started at precomputed intended times (fixed rate or Poisson
+    arrivals) whether or not earlier ones finished. Latency is measured from the intended send
+    time, so a server stall shows up in every request that should have been sent during it
+    (no coordinated omission). Service time from the actual send is reported alongside.
+    '''
+
+    def __init__(self, rate, duration, arrival="constant", mix=DEFAULT_MIX, workers=64, timeout=5, seed=None, sender=None,
+                 listeners=None):
+        self.rate = rate
+        self.duration = duration
+        self.arrival = arrival
+        self.mix = mix
+        self.workers = workers
+        self.timeout = timeout
+        self.random = random.Random(seed)
+        self.sender = sender if sender is not None else RequestsSender()
+        # notified with on_load_sample(sample) as each request finishes, e.g. to export live metrics
+        self.listeners = listeners or []
+
+    def schedule(self):
+        '''Intended send offsets in seconds and the endpoint picked for each'''
+        offsets = []
+        offset = 0.0
+        index = 0
+        while True:
+            if self.arrival == "poisson":
+                offset += self.random.expovariate(self.rate)
+            else:
+                offset = index / self.rate
+                index += 1
+            if offset >= self.duration:
+                break
+            offsets.append(offset)
+        weights = [weight for endpoint, weight, builder in self.mix]
+        picks = self.random.choices(range(len(self.mix)), weights=weights, k=len(offsets))
+        return list(zip(offsets, picks))
+
+    def issue(self, intended, pick, context):
+        endpoint, weight, builder = self.mix[pick]
+        method, url, payload = builder(context)
+        sent = time.perf_counter()
+        status = None
+        error = None
+        try:
+            status = self.sender(method, url, payload, self.timeout)
+        except Exception as e:
+            error = str(e)
+        finished = time.perf_counter()
+        sample = {
+            "endpoint": endpoint,
+            "status": status,
+            "error": error,
+            "latency_ms": (finished - intended) * 1000,
+            "service_ms": (finished - sent) * 1000,
+            "send_lag_ms": (sent - intended) * 1000,
+            "finished": finished,
+        }
+        for listener in self.listeners:
+            listener.on_load_sample(sample)
+        return sample
+
+    def run(self, context):
+        '''context: product_url, billing_url and an existing product_id/customer_id'''
+        schedule = self.schedule()
+        futures = []
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            started = time.perf_counter()
+            for offset, pick in schedule:
+                intended = started + offset
+                delay = intended - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                futures.append(pool.submit(self.issue, intended, pick, context))
+            samples = [future.result() for future in futures]
+        elapsed = max([sample["finished"] for sample in samples], default=started) - started
+        return self.report(samples, max(elapsed, self.duration))
+
+    def report(self, samples, elapsed):
+        total_weight = sum(weight for endpoint, weight, builder in self.mix)
+        by_endpoint = {}
+        for sample in samples:
+            by_endpoint.setdefault(sample["endpoint"], []).append(sample)
+        endpoints = {}
+        for endpoint, weight, builder in self.mix:
+            endpoint_samples = by_endpoint.get(endpoint, [])
+            ok = [sample for sample in endpoint_samples if sample["status"] is not None and sample["status"] < 400]
+            endpoints[endpoint] = {
+                "target_rps": round(self.rate * weight / total_weight, 3),
+                "achieved_rps": round(len(ok) / elapsed, 3) if elapsed > 0 else None,
+                "requests": len(endpoint_samples),
+                "errors": len(endpoint_samples) - len(ok),
+                "latency": summarize_latencies([sample["latency_ms"] for sample in endpoint_samples]),
+                "service_time": summarize_latencies([sample["service_ms"] for sample in endpoint_samples]),
+            }
+        ok_total = sum(endpoint["requests"] - endpoint["errors"] for endpoint in endpoints.values())
+        return {
+            "arrival": self.arrival,
+            "target_rps": self.rate,
+            "achieved_rps": round(ok_total / elapsed, 3) if elapsed > 0 else None,
+            "issued": len(samples),
+            "duration_s": round(elapsed, 3),
+            "max_send_lag_ms": round(max([sample["send_lag_ms"] for sample in samples], default=0), 3),
+            "endpoints": endpoints,
+        }
+
+
+def seed_context(product_url=PRODUCT_SERVICE_URL, billing_url=BILLING_SERVICE_URL, timeout=5):
+    '''Create the product and customer the read and billing requests of the mix refer to'''
+    product = requests.post(f"{product_url}/api/products", json={
+        "name": generate_random_string(10), "price": random.randint(100, 1000), "quantity": 1000,
+    }, timeout=timeout)
+    customer = requests.post(f"{product_url}/api/customers", json={
+        "name": generate_random_string(10), "email": generate_random_string(10) + "@gmail.com",
+    }, timeout=timeout)
+    product.raise_for_status()
+    customer.raise_for_status()
+    return {
+        "product_url": product_url,
+        "billing_url": billing_url,
+        "product_id": product.json()["id"],
+        "customer_id": customer.json()["id"],
+    }
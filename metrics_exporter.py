@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label(value)}"' for name, value in labels.items()) + "}"
+
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class PhaseListener:
+    '''
+    Feeds the requests of one phase (load, capacity, soak, ...) into the exporter as they
+    finish, labelled with the replica they went to when the phase fans out over several.
+    '''
+
+    def __init__(self, exporter, phase, replica=None):
+        self.exporter = exporter
+        self.phase = phase
+        self.replica = replica
+
+    def on_load_sample(self, sample):
+        '''Load driver hook: one request of the open-loop mix'''
+        self.exporter.record_sample(self.phase, sample["endpoint"], sample["status"], sample["latency_ms"], self.replica)
+
+    def on_http(self, event):
+        '''Activity listener hook: one request of a repeated test case pass'''
+        self.exporter.record_sample(self.phase, event["endpoint"], event["status"], event["duration_ms"], self.replica)
+
+
+class MetricsExporter:
+    '''
+    Publishes the data collected by a ResultOutput in the Prometheus text format,
+    either as a node_exporter textfile-collector file or from a local scrape endpoint.
+    Load, capacity and soak traffic is counted live through listener(phase), in running
+    counters and histogram buckets rather than per request, so a scrape during a long
+    run sees it as it happens.
+    '''
+
+    def __init__(self, test_object, buckets=LATENCY_BUCKETS):
+        self.test_object = test_object
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.live_counts = {}
+        self.live_latencies = {}
+
+    def listener(self, phase, replica=None):
+        return PhaseListener(self, phase, replica)
+
+    def record_sample(self, phase, endpoint, status, latency_ms, replica=None):
+        seconds = latency_ms / 1000
+        with self.lock:
+            key = (phase, replica, endpoint, status if status is not None else "error")
+            self.live_counts[key] = self.live_counts.get(key, 0) + 1
+            histogram = self.live_latencies.get((phase, replica, endpoint))
+            if histogram is None:
+                histogram = self.live_latencies[(phase, replica, endpoint)] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for index, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram["buckets"][index] += 1
+            histogram["sum"] += seconds
+            histogram["count"] += 1
+
+    def render(self, openmetrics=False):
+        lines = []
+
+        def family(name, metric_type, help_text, samples):
+            type_name = name[:-len("_total")] if openmetrics and metric_type == "counter" else name
+            lines.append(f"# HELP {type_name} {help_text}")
+            lines.append(f"# TYPE {type_name} {metric_type}")
+            for sample_name, labels, value in samples:
+                lines.append(f"{sample_name}{format_labels(labels)} {format_value(value)}")
+
+        token = self.test_object.token
+        results = list(self.test_object.results)
+        performance = self.test_object.performance
+
+        family("clv_run_info", "gauge", "Validation run information.", [
+            ("clv_run_info", {"token": token}, 1),
+        ])
+        family("clv_marks", "gauge", "Total and obtained marks of the run.", [
+            ("clv_marks", {"token": token, "kind": "total"}, self.test_object.total_marks),
+            ("clv_marks", {"token": token, "kind": "obtained"}, self.test_object.obtained_marks),
+        ])
+        passed = sum(1 for result in results if result["status"] == 1)
+        family("clv_testcases", "gauge", "Number of test cases by outcome.", [
+            ("clv_testcases", {"token": token, "status": "pass"}, passed),
+            ("clv_testcases", {"token": token, "status": "fail"}, len(results) - passed),
+        ])
+        family("clv_testcase_passed", "gauge", "1 if the test case passed, 0 otherwise.", [
+            ("clv_testcase_passed", {"token": token, "description": result["description"]}, result["status"])
+            for result in results
+        ])
+        family("clv_testcase_duration_seconds", "gauge", "Wall time of each testcase_* method.", [
+            ("clv_testcase_duration_seconds", {"token": token, "testcase": name}, timing["duration_ms"] / 1000)
+            for name, timing in list(performance.get("testcases", {}).items())
+        ])
+
+        requests_by_endpoint = {}
+        request_counts = {}
+        for request in list(performance.get("requests", [])):
+            requests_by_endpoint.setdefault(request["endpoint"], []).append(request["latency_ms"] / 1000)
+            key = (request["endpoint"], request["status"] if request["status"] is not None else "error")
+            request_counts[key] = request_counts.get(key, 0) + 1
+        family("clv_http_requests_total", "counter", "HTTP requests sent to the services.", [
+            ("clv_http_requests_total", {"token": token, "endpoint": endpoint, "status": status}, count)
+            for (endpoint, status), count in sorted(request_counts.items(), key=str)
+        ])
+        histogram = []
+        for endpoint, latencies in sorted(requests_by_endpoint.items()):
+            labels = {"token": token, "endpoint": endpoint}
+            for bound in self.buckets + [float("inf")]:
+                count = sum(1 for latency in latencies if latency <= bound)
+                histogram.append(("clv_http_request_duration_seconds_bucket", dict(labels, le=format_value(bound)), count))
+            histogram.append(("clv_http_request_duration_seconds_sum", labels, sum(latencies)))
+            histogram.append(("clv_http_request_duration_seconds_count", labels, len(latencies)))
+        family("clv_http_request_duration_seconds", "histogram", "HTTP request latency per endpoint.", histogram)
+
+        with self.lock:
+            live_counts = dict(self.live_counts)
+            live_latencies = {key: dict(value, buckets=list(value["buckets"])) for key, value in self.live_latencies.items()}
+
+        def load_labels(phase, replica, endpoint):
+            labels = {"token": token, "phase": phase}
+            if replica is not None:
+                labels["replica"] = replica
+            labels["endpoint"] = endpoint
+            return labels
+
+        family("clv_load_requests_total", "counter", "Requests sent by the load, capacity and soak phases so far.", [
+            ("clv_load_requests_total", dict(load_labels(phase, replica, endpoint), status=status), count)
+            for (phase, replica, endpoint, status), count in sorted(live_counts.items(), key=str)
+        ])
+        histogram = []
+        for (phase, replica, endpoint), latencies in sorted(live_latencies.items(), key=str):
+            labels = load_labels(phase, replica, endpoint)
+            for bound, count in zip(self.buckets + [float("inf")], latencies["buckets"] + [latencies["count"]]):
+                histogram.append(("clv_load_request_duration_seconds_bucket", dict(labels, le=format_value(bound)), count))
+            histogram.append(("clv_load_request_duration_seconds_sum", labels, latencies["sum"]))
+            histogram.append(("clv_load_request_duration_seconds_count", labels, latencies["count"]))
+        family("clv_load_request_duration_seconds", "histogram",
+               "Latency of the load, capacity and soak requests per phase and endpoint.", histogram)
+
+        db_queries = []
+        db_seconds = []
+        for testcase, queries in list(performance.get("db", {}).items()):
+            for key, query in list(queries.items()):
+                statement, table = key.split(" ", 1)
+                labels = {"token": token, "testcase": testcase, "table": table, "statement": statement}
+                db_queries.append(("clv_db_queries_total", labels, query["count"]))
+                db_seconds.append(("clv_db_query_seconds_total", labels, query["total_ms"] / 1000))
+        family("clv_db_queries_total", "counter", "Statements executed by the harness.", db_queries)
+        family("clv_db_query_seconds_total", "counter", "Time spent in statements executed by the harness.", db_seconds)
+
+        if openmetrics:
+            lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, filepath):
+        '''Atomically replace the textfile-collector file'''
+        try:
+            os.makedirs(os.path.dirname(filepath) or ".", exist_ok=True)
+            temp_path = f"{filepath}.{os.getpid()}.tmp"
+            with open(temp_path, 'w') as f:
+                f.write(self.render())
+            os.replace(temp_path, filepath)
+        except Exception as e:
+            print(f"Error writing metrics: {e}")
+
+    def serve(self, port, host="127.0.0.1"):
+        '''
+        Serve /metrics from a background thread; returns the server so the caller can shut it
+        down, or None (with a warning) if the port cannot be bound
+        '''
+        exporter = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                openmetrics = "application/openmetrics-text" in self.headers.get("Accept", "")
+                body = exporter.render(openmetrics).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", OPENMETRICS_CONTENT_TYPE if openmetrics else PROMETHEUS_CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            server = ThreadingHTTPServer((host, port), MetricsHandler)
+        except OSError as e:
+            print(f"Warning: not serving metrics on {host}:{port}: {e}", file=sys.stderr)
+            return None
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+from perf_stats import linear_fit
+from response_schemas import decode_response
+
+DEFAULT_SIZES = [10, 100]
+# extra statements per extra returned item
+N_PLUS_ONE_SLOPE = 0.5
+GROWTH_SLOPE = 0.05
+
+
+class NPlusOneDetector:
+    '''
+    Calls the list endpoints at two or more data sizes and counts the statements the
+    service runs per request. A count that grows with the result size means related
+    rows are fetched one by one.
+    '''
+
+    def __init__(self, activity, statement_stats, sizes=DEFAULT_SIZES):
+        self.activity = activity
+        self.statement_stats = statement_stats
+        self.sizes = sorted(sizes)
+
+    def measure(self, api_url, schema_name):
+        response, statements = self.statement_stats.measure(
+            lambda: self.activity.send_request("GET", api_url, headers={"Content-Type": "application/json"}, timeout=30)
+        )
+        data, errors = decode_response(response, schema_name)
+        statements = statements or []
+        return {
+            "status": response.status_code,
+            "items": len(data) if isinstance(data, list) else 0,
+            "statements": sum(statement["calls"] for statement in statements),
+            "observed": [{"query": statement["query"], "calls": statement["calls"]} for statement in statements],
+        }
+
+    def run(self, test_object):
+        activity = self.activity
+        activity.current_testcase = "n_plus_one"
+        steps = {"GET /api/customers": [], "GET /api/billing/{id}": []}
+        error = None
+        activity.connect_to_db()
+        try:
+            customer_id = activity.create_document_customer("nplus1_owner", "nplus1_owner@example.com")
+            if customer_id is None:
+                error = "could not create the billing customer"
+            seeded = 0
+            for size in self.sizes if error is None else []:
+                if size > seeded:
+                    inserted = [
+                        activity.seed_customers(seeded + 1, size, "nplus1"),
+                        activity.seed_products(seeded + 1, size, "nplus1"),
+                        activity.seed_billing(customer_id, size - seeded, "nplus1"),
+                    ]
+                    if None in inserted:
+                        error = f"seeding {size} rows failed"
+                        break
+                    seeded = size
+                try:
+                    steps["GET /api/customers"].append(
+                        self.measure(f"{activity.product_url}/api/customers", "customer_list"))
+                    steps["GET /api/billing/{id}"].append(
+                        self.measure(f"{activity.billing_url}/api/billing/{customer_id}", "billing_list"))
+                except Exception as e:
+                    error = f"request at {size} rows failed: {e}"
+                    break
+        finally:
+            activity.disconnect_from_db()
+            activity.current_testcase = None
+
+        for endpoint, endpoint_steps in steps.items():
+            report = self.analyze(test_object, endpoint, endpoint_steps)
+            if error is not None:
+                report["error"] = error
+            test_object.update_performance("n_plus_one", endpoint, report)
+
+    def analyze(self, test_object, endpoint, steps):
+        measured = [step for step in steps if step["status"] == 200]
+        report = {"steps": steps, "statements_per_item": None, "verdict": "insufficient data"}
+        if len(measured) < 2 or measured[-1]["items"] == measured[0]["items"]:
+            return report
+
+        slope, intercept, r2 = linear_fit([step["items"] for step in measured], [step["statements"] for step in measured])
+        report["statements_per_item"] = round(slope, 3)
+        details = {
+            "endpoint": endpoint,
+            "items": [step["items"] for step in measured],
+            "statements": [step["statements"] for step in measured],
+            "observed": measured[-1]["observed"],
+        }
+        if slope >= N_PLUS_ONE_SLOPE:
+            report["verdict"] = "n+1"
+            test_object.update_advisory(
+                "n_plus_one", "error",
+                f"{endpoint}: N+1 queries, about {round(slope, 2)} extra statements per returned item",
+                details
+            )
+        elif slope >= GROWTH_SLOPE:
+            report["verdict"] = "growing"
+            test_object.update_advisory(
+                "n_plus_one", "warning",
+                f"{endpoint}: statement count grows with the result size ({round(slope, 3)} per item)",
+                details
+            )
+        else:
+            report["verdict"] = "constant"
+        return report
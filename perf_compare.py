@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import math
+import sys
+from perf_stats import hodges_lehmann, mann_whitney_u, percentile
+
+DEFAULT_ALPHA = 0.05
+DEFAULT_THRESHOLD_PCT = 5.0
+DEFAULT_CONFIDENCE = 0.95
+
+
+def load_result(filepath):
+    with open(filepath) as f:
+        return json.load(f)
+
+
+def latency_groups(results):
+    '''
+    Latencies of performance.requests grouped per endpoint and per test case, pooled over
+    the given results. A graded run has only one or two requests per group, so several
+    runs of each build are needed for a comparison to reach significance.
+    '''
+    if isinstance(results, dict):
+        results = [results]
+    groups = {"endpoint": {}, "testcase": {}}
+    for result in results:
+        for request in result.get("performance", {}).get("requests", []):
+            if request["status"] is None:
+                continue
+            groups["endpoint"].setdefault(request["endpoint"], []).append(request["latency_ms"])
+            groups["testcase"].setdefault(request["testcase"] or "none", []).append(request["latency_ms"])
+    return groups
+
+
+def smallest_p_value(n1, n2):
+    '''Lowest two-sided exact Mann-Whitney p value samples of these sizes can reach'''
+    return min(2 / math.comb(n1 + n2, n1), 1.0)
+
+
+def compare_samples(baseline, current, alpha=DEFAULT_ALPHA, threshold_pct=DEFAULT_THRESHOLD_PCT, confidence=DEFAULT_CONFIDENCE):
+    '''
+    Shift of the current latencies against the baseline with a Hodges-Lehmann confidence
+    interval and a Mann-Whitney U p value. A regression has to be significant, have the whole
+    interval above zero and a shift of at least threshold_pct of the baseline median.
+    '''
+    baseline_median = percentile(sorted(baseline), 0.5)
+    current_median = percentile(sorted(current), 0.5)
+    comparison = {
+        "baseline_count": len(baseline),
+        "current_count": len(current),
+        "baseline_p50_ms": round(baseline_median, 3) if baseline_median is not None else None,
+        "current_p50_ms": round(current_median, 3) if current_median is not None else None,
+        "verdict": "insufficient data",
+    }
+    if len(baseline) < 2 or len(current) < 2 or smallest_p_value(len(baseline), len(current)) >= alpha:
+        # even a complete separation of the samples could not be significant
+        return comparison
+    u, p_value = mann_whitney_u(baseline, current)
+    shift, low, high = hodges_lehmann(baseline, current, confidence)
+    shift_pct = shift / baseline_median * 100 if baseline_median else None
+    comparison.update({
+        "u": u,
+        "p_value": round(p_value, 6),
+        "shift_ms": round(shift, 3),
+        "shift_pct": round(shift_pct, 2) if shift_pct is not None else None,
+        "ci_ms": [round(low, 3), round(high, 3)] if low is not None else None,
+        "confidence": confidence,
+    })
+    significant = p_value < alpha and low is not None
+    if significant and low > 0 and shift_pct is not None and shift_pct >= threshold_pct:
+        comparison["verdict"] = "regression"
+    elif significant and high < 0 and shift_pct is not None and shift_pct <= -threshold_pct:
+        comparison["verdict"] = "improvement"
+    else:
+        comparison["verdict"] = "no significant change"
+    return comparison
+
+
+def compare_results(baseline, current, alpha=DEFAULT_ALPHA, threshold_pct=DEFAULT_THRESHOLD_PCT, confidence=DEFAULT_CONFIDENCE):
+    '''baseline and current: a result dict or a list of result dicts of repeated runs'''
+    baseline_groups = latency_groups(baseline)
+    current_groups = latency_groups(current)
+    report = {}
+    for kind in ("endpoint", "testcase"):
+        names = sorted(set(baseline_groups[kind]) | set(current_groups[kind]))
+        report[kind] = {
+            name: compare_samples(baseline_groups[kind].get(name, []), current_groups[kind].get(name, []),
+                                  alpha, threshold_pct, confidence)
+            for name in names
+        }
+    report["regressions"] = [
+        f"{kind} {name}" for kind in ("endpoint", "testcase")
+        for name, comparison in report[kind].items() if comparison["verdict"] == "regression"
+    ]
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="perf_compare.py",
+        description="Compare the request latencies of two builds; exits 1 on a significant regression"
+    )
+    parser.add_argument("files", nargs="*", help="BASELINE CURRENT: one result JSON per build")
+    parser.add_argument("--baseline", nargs="+", default=[],
+                        help="result JSON files of repeated runs of the baseline build, pooled")
+    parser.add_argument("--current", nargs="+", default=[],
+                        help="result JSON files of repeated runs of the build under test, pooled")
+    parser.add_argument("--alpha", type=float, default=DEFAULT_ALPHA, help="significance level of the Mann-Whitney U test")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD_PCT,
+                        help="smallest slowdown in percent of the baseline median that counts as a regression")
+    parser.add_argument("--confidence", type=float, default=DEFAULT_CONFIDENCE, help="confidence level of the shift interval")
+    options = parser.parse_args(argv)
+    baseline, current = list(options.baseline), list(options.current)
+    if options.files:
+        if len(options.files) != 2 or baseline or current:
+            parser.error("pass either BASELINE CURRENT or --baseline FILE... --current FILE...")
+        baseline, current = [options.files[0]], [options.files[1]]
+    if not baseline or not current:
+        parser.error("both a baseline and a current result file are needed")
+
+    report = compare_results([load_result(filepath) for filepath in baseline], [load_result(filepath) for filepath in current],
+                             options.alpha, options.threshold, options.confidence)
+    print(json.dumps(report, indent=4))
+    return 1 if report["regressions"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
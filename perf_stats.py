@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+import math
+
+
+def linear_fit(xs, ys):
+    '''Ordinary least squares y = intercept + slope * x; returns (slope, intercept, r2)'''
+    n = len(xs)
+    if n < 2:
+        return 0.0, (ys[0] if ys else 0.0), 0.0
+    mean_x = sum(xs) / n
+    mean_y = sum(ys) / n
+    sxx = sum((x - mean_x) ** 2 for x in xs)
+    sxy = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys))
+    syy = sum((y - mean_y) ** 2 for y in ys)
+    if sxx == 0:
+        return 0.0, mean_y, 0.0
+    slope = sxy / sxx
+    intercept = mean_y - slope * mean_x
+    r2 = (sxy * sxy) / (sxx * syy) if syy > 0 else 1.0
+    return slope, intercept, r2
+
+
+def fit_power_law(sizes, values):
+    '''
+    Fit values = coefficient * size ** exponent on log-log axes.
+    An exponent near 0 is constant, near 1 linear, clearly above 1 super-linear.
+    '''
+    points = [(math.log(size), math.log(value)) for size, value in zip(sizes, values) if size > 0 and value > 0]
+    if len(points) < 2:
+        return {"exponent": None, "coefficient": None, "r2": None}
+    exponent, intercept, r2 = linear_fit([x for x, y in points], [y for x, y in points])
+    return {"exponent": round(exponent, 3), "coefficient": round(math.exp(intercept), 6), "r2": round(r2, 3)}
+
+
+def percentile(sorted_values, fraction):
+    '''Linear interpolation percentile of an already sorted list (fraction in 0..1)'''
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * fraction
+    lower = math.floor(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def summarize_latencies(latencies_ms):
+    '''count, mean and the usual percentiles of a list of latencies in ms'''
+    values = sorted(latencies_ms)
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean_ms": round(sum(values) / len(values), 3),
+        "p50_ms": round(percentile(values, 0.50), 3),
+        "p90_ms": round(percentile(values, 0.90), 3),
+        "p95_ms": round(percentile(values, 0.95), 3),
+        "p99_ms": round(percentile(values, 0.99), 3),
+        "p999_ms": round(percentile(values, 0.999), 3),
+        "max_ms": round(values[-1], 3),
+    }
+
+
+def normal_cdf(x):
+    return 0.5 * (1 + math.erf(x / math.sqrt(2)))
+
+
+def normal_quantile(p):
+    '''Inverse of normal_cdf by bisection; plenty accurate for confidence levels'''
+    low, high = -10.0, 10.0
+    for _ in range(100):
+        middle = (low + high) / 2
+        if normal_cdf(middle) < p:
+            low = middle
+        else:
+            high = middle
+    return (low + high) / 2
+
+
+def rank(values):
+    '''Average ranks (1 based) with ties sharing the mean of their positions'''
+    order = sorted(range(len(values)), key=lambda index: values[index])
+    ranks = [0.0] * len(values)
+    i = 0
+    while i < len(order):
+        j = i
+        while j + 1 < len(order) and values[order[j + 1]] == values[order[i]]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[order[k]] = (i + j) / 2 + 1
+        i = j + 1
+    return ranks
+
+
+def exact_u_distribution(n1, n2):
+    '''Counts of each U value for samples of n1 and n2 without ties'''
+    # counts[i][j][u]: arrangements of i values of the first and j of the second sample with statistic u
+    counts = [[None] * (n2 + 1) for _ in range(n1 + 1)]
+    for i in range(n1 + 1):
+        for j in range(n2 + 1):
+            if i == 0 or j == 0:
+                counts[i][j] = [1]
+                continue
+            # the largest value is from the first sample (beats all j) or from the second one
+            first, second = counts[i - 1][j], counts[i][j - 1]
+            size = i * j + 1
+            row = [0] * size
+            for u, count in enumerate(first):
+                row[u + j] += count
+            for u, count in enumerate(second):
+                row[u] += count
+            counts[i][j] = row
+    return counts[n1][n2]
+
+
+def mann_whitney_u(a, b):
+    '''
+    Two-sided Mann-Whitney U test of samples a and b. Exact p value for small samples
+    without ties, otherwise the normal approximation with tie and continuity correction.
+    Returns (U of a, p value).
+    '''
+    n1, n2 = len(a), len(b)
+    if n1 == 0 or n2 == 0:
+        return None, None
+    ranks = rank(list(a) + list(b))
+    u1 = sum(ranks[:n1]) - n1 * (n1 + 1) / 2
+    tied = len(set(a) | set(b)) < n1 + n2
+    if n1 + n2 <= 30 and not tied:
+        distribution = exact_u_distribution(n1, n2)
+        total = sum(distribution)
+        low = min(u1, n1 * n2 - u1)
+        p = 2 * sum(distribution[:int(low) + 1]) / total
+        return u1, min(p, 1.0)
+    counts = {}
+    for value in list(a) + list(b):
+        counts[value] = counts.get(value, 0) + 1
+    n = n1 + n2
+    tie_term = sum(t ** 3 - t for t in counts.values()) / (n * (n - 1))
+    sigma = math.sqrt(n1 * n2 / 12 * ((n + 1) - tie_term))
+    if sigma == 0:
+        return u1, 1.0
+    z = (abs(u1 - n1 * n2 / 2) - 0.5) / sigma
+    return u1, min(2 * (1 - normal_cdf(max(z, 0))), 1.0)
+
+
+def hodges_lehmann(a, b, confidence=0.95, max_pairs=1000000):
+    '''
+    Hodges-Lehmann estimate of the shift b - a (median of the pairwise differences) and its
+    distribution-free confidence interval from the order statistics of those differences.
+    Large samples are thinned to about max_pairs differences.
+    '''
+    n1, n2 = len(a), len(b)
+    if n1 == 0 or n2 == 0:
+        return None, None, None
+    step = max(1, math.ceil(math.sqrt(n1 * n2 / max_pairs)))
+    a, b = sorted(a)[::step], sorted(b)[::step]
+    n1, n2 = len(a), len(b)
+    differences = sorted(y - x for x in a for y in b)
+    estimate = percentile(differences, 0.5)
+    z = normal_quantile(1 - (1 - confidence) / 2)
+    k = math.floor(n1 * n2 / 2 - z * math.sqrt(n1 * n2 * (n1 + n2 + 1) / 12))
+    if k < 1:
+        return estimate, None, None
+    return estimate, differences[k - 1], differences[len(differences) - k]
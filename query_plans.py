@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+
+ESTIMATE_ERROR_FACTOR = 10
+ESTIMATE_ERROR_MIN_ROWS = 100
+SEQ_SCAN_MIN_ROWS = 1000
+
+# name, table, query, index columns the lookup needs, row fields used as parameters
+REPRESENTATIVE_QUERIES = [
+    {
+        "name": "billing by cust_id",
+        "table": "billing",
+        "query": "SELECT * FROM billing WHERE cust_id = %s",
+        "columns": ["cust_id"],
+        "source": ("billing", [1]),
+    },
+    {
+        "name": "billing by cust_id and prod_id",
+        "table": "billing",
+        "query": "SELECT * FROM billing WHERE cust_id = %s AND prod_id = %s",
+        "columns": ["cust_id", "prod_id"],
+        "source": ("billing", [1, 2]),
+    },
+    {
+        "name": "product by id",
+        "table": "products",
+        "query": "SELECT * FROM products WHERE id = %s",
+        "columns": ["id"],
+        "source": ("products", [0]),
+    },
+]
+
+
+def plan_nodes(plan):
+    '''Flatten an EXPLAIN (FORMAT JSON) plan tree'''
+    nodes = [plan]
+    for child in plan.get("Plans", []):
+        nodes.extend(plan_nodes(child))
+    return nodes
+
+
+def estimate_error(node):
+    if "Actual Rows" not in node:
+        return None
+    estimated = node.get("Plan Rows", 0)
+    actual = node["Actual Rows"] * max(node.get("Actual Loops", 1), 1)
+    estimated = estimated * max(node.get("Actual Loops", 1), 1)
+    if max(estimated, actual) < ESTIMATE_ERROR_MIN_ROWS:
+        return None
+    return max(estimated, actual) / max(min(estimated, actual), 1)
+
+
+class QueryPlanDiagnostics:
+    '''
+    Runs EXPLAIN (ANALYZE, BUFFERS) on the lookups the services need and reports
+    sequential scans, missing indexes and bad row estimates as advisories.
+    A second plan with enable_seqscan=off tells "no index exists" apart from
+    "the planner preferred a seq scan on a small table".
+    '''
+
+    def __init__(self, activity, queries=REPRESENTATIVE_QUERIES):
+        self.activity = activity
+        self.queries = queries
+
+    def run(self, test_object):
+        activity = self.activity
+        activity.current_testcase = "query_plans"
+        activity.connect_to_db()
+        try:
+            for query in self.queries:
+                self.inspect(test_object, query)
+        finally:
+            activity.disconnect_from_db()
+            activity.current_testcase = None
+
+    def inspect(self, test_object, query):
+        table_name, fields = query["source"]
+        row = self.activity.get_first_record(table_name)
+        if row is None:
+            test_object.update_performance("query_plans", query["name"], {"error": f"no rows in {table_name} to explain with"})
+            return
+        params = tuple(row[field] for field in fields)
+        plan = self.activity.explain_query(query["table"], query["query"], params)
+        forced_plan = self.activity.explain_query(query["table"], query["query"], params, enable_seqscan=False)
+        if plan is None:
+            test_object.update_performance("query_plans", query["name"], {"error": "EXPLAIN failed"})
+            return
+
+        nodes = plan_nodes(plan["Plan"])
+        root = plan["Plan"]
+        test_object.update_performance("query_plans", query["name"], {
+            "query": query["query"],
+            "nodes": [
+                {
+                    "node": node["Node Type"],
+                    "relation": node.get("Relation Name"),
+                    "index": node.get("Index Name"),
+                    "plan_rows": node.get("Plan Rows"),
+                    "actual_rows": node.get("Actual Rows"),
+                    "loops": node.get("Actual Loops"),
+                }
+                for node in nodes
+            ],
+            "execution_ms": plan.get("Execution Time"),
+            "planning_ms": plan.get("Planning Time"),
+            "shared_hit_blocks": root.get("Shared Hit Blocks"),
+            "shared_read_blocks": root.get("Shared Read Blocks"),
+        })
+
+        details = {"query": query["query"], "execution_ms": plan.get("Execution Time")}
+        seq_scans = [node for node in nodes if node["Node Type"] == "Seq Scan" and node.get("Relation Name") == query["table"]]
+        forced_seq_scan = forced_plan is not None and any(
+            node["Node Type"] == "Seq Scan" and node.get("Relation Name") == query["table"]
+            for node in plan_nodes(forced_plan["Plan"])
+        )
+        if forced_seq_scan:
+            columns = ", ".join(query["columns"])
+            test_object.update_advisory(
+                "missing_index", "warning",
+                f"{query['name']}: no index on {query['table']}({columns}) can serve this lookup",
+                dict(details, suggestion=f"CREATE INDEX ON {query['table']} ({columns});")
+            )
+        for node in seq_scans:
+            scanned = node.get("Actual Rows", 0) + node.get("Rows Removed by Filter", 0)
+            if scanned >= SEQ_SCAN_MIN_ROWS:
+                test_object.update_advisory(
+                    "seq_scan", "warning",
+                    f"{query['name']}: sequential scan over {scanned} rows of {query['table']}",
+                    details
+                )
+        for node in nodes:
+            error = estimate_error(node)
+            if error is not None and error >= ESTIMATE_ERROR_FACTOR:
+                test_object.update_advisory(
+                    "row_estimate", "info",
+                    f"{query['name']}: {node['Node Type']} row estimate off by {round(error, 1)}x",
+                    dict(details, plan_rows=node.get("Plan Rows"), actual_rows=node.get("Actual Rows"),
+                         suggestion=f"ANALYZE {query['table']};")
+                )
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+import threading
+import time
+from load_driver import OpenLoopDriver, seed_context
+from perf_stats import summarize_latencies
+
+
+def parse_targets(value):
+    '''
+    "product_url,billing_url;product_url,billing_url;..." -> list of (product_url, billing_url).
+    A bare "host:port,host:port" pair gets http:// in front.
+    '''
+    targets = []
+    for pair in value.split(";"):
+        if not pair.strip():
+            continue
+        urls = [url.strip().rstrip("/") for url in pair.split(",")]
+        if len(urls) != 2:
+            raise ValueError(f"target {pair!r} is not a product-service,billing-service pair")
+        targets.append(tuple(url if "://" in url else "http://" + url for url in urls))
+    return targets
+
+
+def target_label(index, target):
+    return f"replica {index + 1} ({target[0]}, {target[1]})"
+
+
+def run_concurrently(targets, work):
+    '''Run work(target) for every target in its own thread; returns the results in target order'''
+    results = [None] * len(targets)
+
+    def run(index, target):
+        try:
+            results[index] = work(target)
+        except Exception as e:
+            results[index] = {"error": str(e)}
+
+    threads = [threading.Thread(target=run, args=(index, target), daemon=True) for index, target in enumerate(targets)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+class ReplicaFanOut:
+    '''
+    Runs the test-case suite or the open-loop load mix against several product/billing
+    service pairs at the same time and reports per replica throughput and latency side by
+    side, plus the totals, to compare a submission behind different instance counts.
+    '''
+
+    def __init__(self, targets):
+        self.targets = targets
+
+    def suite(self, run_pass, iterations=1):
+        '''run_pass(target) runs the test cases once against the target and returns its ResultOutput'''
+        def work(target):
+            started = time.perf_counter()
+            results = []
+            requests = []
+            for _ in range(iterations):
+                test_object = run_pass(target)
+                results += test_object.results
+                requests += test_object.performance.get("requests", [])
+            return self.replica_report(results, requests, time.perf_counter() - started)
+
+        return self.side_by_side("suite", run_concurrently(self.targets, work))
+
+    def replica_report(self, results, requests, elapsed):
+        by_endpoint = {}
+        for request in requests:
+            by_endpoint.setdefault(request["endpoint"], []).append(request["latency_ms"])
+        passed = sum(1 for result in results if result["status"] == 1)
+        return {
+            "testcases": len(results),
+            "passed": passed,
+            "pass_rate": round(passed / len(results), 4) if results else None,
+            "requests": len(requests),
+            "errors": sum(1 for request in requests if request["status"] is None or request["status"] >= 400),
+            "duration_s": round(elapsed, 3),
+            "throughput_rps": round(len(requests) / elapsed, 2) if elapsed > 0 else None,
+            "latency": summarize_latencies([request["latency_ms"] for request in requests]),
+            "endpoints": {endpoint: summarize_latencies(latencies) for endpoint, latencies in sorted(by_endpoint.items())},
+        }
+
+    def load(self, rate, duration, arrival="constant", workers=64, make_sender=None, make_listeners=None):
+        '''
+        The open-loop mix at `rate` requests/s against every replica at once. make_listeners(replica)
+        returns the listeners notified of the requests to replica number 1, 2, ...
+        '''
+        def work(replica):
+            index, target = replica
+            context = seed_context(target[0], target[1])
+            sender = make_sender() if make_sender is not None else None
+            listeners = make_listeners(str(index + 1)) if make_listeners is not None else None
+            try:
+                report = OpenLoopDriver(rate, duration, arrival, workers=workers, sender=sender, listeners=listeners).run(context)
+            finally:
+                if sender is not None:
+                    sender.close()
+            issued = report["issued"]
+            errors = sum(endpoint["errors"] for endpoint in report["endpoints"].values())
+            latencies = {endpoint: stats["latency"] for endpoint, stats in report["endpoints"].items()}
+            return {
+                "requests": issued,
+                "errors": errors,
+                "duration_s": report["duration_s"],
+                "throughput_rps": report["achieved_rps"],
+                "max_send_lag_ms": report["max_send_lag_ms"],
+                "endpoints": latencies,
+            }
+
+        return self.side_by_side("load", run_concurrently(list(enumerate(self.targets)), work))
+
+    def side_by_side(self, mode, reports):
+        replicas = {target_label(index, target): report for index, (target, report) in enumerate(zip(self.targets, reports))}
+        measured = [report for report in reports if report.get("throughput_rps") is not None]
+        throughputs = [report["throughput_rps"] for report in measured]
+        return {
+            "mode": mode,
+            "replicas": replicas,
+            "total": {
+                "replicas": len(self.targets),
+                "requests": sum(report.get("requests", 0) for report in measured),
+                "errors": sum(report.get("errors", 0) for report in measured),
+                "throughput_rps": round(sum(throughputs), 2),
+                "throughput_spread": round(max(throughputs) / min(throughputs), 3) if throughputs and min(throughputs) > 0 else None,
+            },
+        }
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+JSON_DECODERS = {"json": json.loads}
+if ujson is not None:
+    JSON_DECODERS["ujson"] = ujson.loads
+if orjson is not None:
+    JSON_DECODERS["orjson"] = orjson.loads
+
+json_decoder = JSON_DECODERS.get("orjson") or JSON_DECODERS.get("ujson") or json.loads
+
+MAX_ERRORS = 10
+
+INTEGER = (int,)
+NUMBER = (int, float)
+STRING = (str,)
+
+# field: (accepted types, required). Optional fields may be absent or null.
+SCHEMAS = {
+    "product": {
+        "id": (INTEGER, True),
+        "name": (STRING, False),
+        "price": (NUMBER, False),
+        "quantity": (INTEGER, False),
+    },
+    "customer": {
+        "id": (INTEGER, True),
+        "name": (STRING, False),
+        "email": (STRING, False),
+    },
+    "billing": {
+        "id": (INTEGER, True),
+        "cust_id": (INTEGER, False),
+        "prod_id": (INTEGER, False),
+        "quantity": (INTEGER, False),
+    },
+}
+
+TYPE_NAMES = {int: "integer", float: "number", str: "string", bool: "boolean", list: "array", dict: "object", type(None): "null"}
+
+
+def set_json_decoder(name):
+    '''Select the decoder used by decode_response: json, ujson or orjson (if installed)'''
+    global json_decoder
+    if name not in JSON_DECODERS:
+        raise ValueError(f"JSON decoder {name} is not available, choose from {sorted(JSON_DECODERS)}")
+    json_decoder = JSON_DECODERS[name]
+
+
+def type_name(value):
+    return TYPE_NAMES.get(type(value), type(value).__name__)
+
+
+def compile_object_validator(name, fields):
+    '''
+    Generate the source of a validator for one object schema and compile it.
+    Exact type checks keep bool out of integer fields and avoid isinstance chains.
+    '''
+    lines = [
+        f"def validate_{name}(data):",
+        "    if type(data) is not dict:",
+        "        return ['$: expected object, got ' + type_name(data)]",
+        "    errors = None",
+    ]
+    namespace = {"type_name": type_name, "MISSING": object()}
+    for index, (field, (types, required)) in enumerate(fields.items()):
+        namespace[f"types_{index}"] = types
+        expected = "number" if types == NUMBER else " or ".join(TYPE_NAMES[t] for t in types)
+        lines.append(f"    value = data.get({field!r}, MISSING)")
+        if required:
+            lines.append("    if value is MISSING or value is None:")
+            lines.append(f"        errors = (errors or []) + ['$.{field}: missing']")
+            lines.append(f"    elif type(value) not in types_{index}:")
+        else:
+            lines.append(f"    if value is not MISSING and value is not None and type(value) not in types_{index}:")
+        lines.append(f"        errors = (errors or []) + ['$.{field}: expected {expected}, got ' + type_name(value)]")
+    lines.append("    return errors or []")
+    exec("\n".join(lines), namespace)
+    return namespace[f"validate_{name}"]
+
+
+def compile_list_validator(item_validator):
+    def validate_list(data):
+        if type(data) is not list:
+            return ["$: expected array, got " + type_name(data)]
+        errors = []
+        for index, item in enumerate(data):
+            item_errors = item_validator(item)
+            if item_errors:
+                errors.extend(f"$[{index}]" + error[1:] for error in item_errors)
+                if len(errors) >= MAX_ERRORS:
+                    break
+        return errors
+    return validate_list
+
+
+VALIDATORS = {}
+for schema_name, schema_fields in SCHEMAS.items():
+    VALIDATORS[schema_name] = compile_object_validator(schema_name, schema_fields)
+    VALIDATORS[f"{schema_name}_list"] = compile_list_validator(VALIDATORS[schema_name])
+
+
+def decode_response(response, schema_name):
+    '''Decode a response body and validate it; returns (data, errors)'''
+    try:
+        data = json_decoder(response.content)
+    except ValueError as e:
+        return None, [f"$: invalid JSON ({e})"]
+    errors = VALIDATORS[schema_name](data)
+    return data, errors[:MAX_ERRORS]
+
+
+def describe_errors(actual, errors):
+    '''Append the field level errors to a result message'''
+    if not errors:
+        return actual
+    return f"{actual} ({'; '.join(errors)})"
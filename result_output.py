@@ -1,30 +1,120 @@
 #!/usr/bin/env python3
+import itertools
 import json
 import os
+import queue
+import sys
+import threading
 from datetime import datetime
 
 class ResultOutput:
-    def __init__(self, args, activity_class):
-        self.results = []
-        self.eval_message = {}
-        self.total_marks = 0
-        self.obtained_marks = 0
+    '''
+    Collects results, errors and performance data from any number of threads. Every update
+    is put on a queue and applied by a single writer thread, which also does the printing;
+    the read accessors flush the queue first. Results are reported in testcase_order
+    (descriptions), then in arrival order.
+    '''
+
+    def __init__(self, args, activity_class, verbose=True, testcase_order=None):
+        self.verbose = verbose
+        self.testcase_order = {description: index for index, description in enumerate(testcase_order or [])}
+        self.collected = []
+        self.errors = {}
+        self.collected_performance = {}
+        self.collected_advisories = []
+        self.sequence = itertools.count()
+        self.queue = queue.SimpleQueue()
+        self.writer = threading.Thread(target=self.write_loop, daemon=True)
+        self.writer.start()
         try:
             args_dict = json.loads(args)
             self.token = args_dict.get('token', 'default')
         except:
             self.token = 'default'
 
+    def write_loop(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            apply, args = item
+            try:
+                apply(*args)
+            except Exception as e:
+                # one failed update (e.g. printing to a closed pipe) must not stop the writer
+                try:
+                    print(f"Error applying result update: {e!r}", file=sys.stderr)
+                except Exception:
+                    pass
+
+    def submit(self, apply, *args):
+        self.queue.put((apply, args))
+
+    def flush(self):
+        '''Wait until every update queued so far has been applied'''
+        if not self.writer.is_alive():
+            return
+        applied = threading.Event()
+        self.submit(applied.set)
+        while not applied.wait(0.1):
+            if not self.writer.is_alive():
+                return
+
+    def close(self):
+        '''Apply the queued updates and stop the writer thread; the results stay readable'''
+        if self.writer.is_alive():
+            self.queue.put(None)
+            self.writer.join()
+
+    @property
+    def results(self):
+        self.flush()
+        order = len(self.testcase_order)
+        return [
+            result for _, _, result in sorted(
+                (self.testcase_order.get(result["description"], order), sequence, result)
+                for sequence, result in self.collected
+            )
+        ]
+
+    @property
+    def performance(self):
+        self.flush()
+        return self.collected_performance
+
+    @property
+    def advisories(self):
+        self.flush()
+        return self.collected_advisories
+
+    @property
+    def eval_message(self):
+        self.flush()
+        return {testcase_name: self.errors[testcase_name] for testcase_name in sorted(self.errors)}
+
+    @property
+    def total_marks(self):
+        return sum(result["marks"] for result in self.results)
+
+    @property
+    def obtained_marks(self):
+        return sum(result["marks_obtained"] for result in self.results)
+
     def update_pre_result(self, description, expected):
         '''Called before test execution'''
         pass
 
-    def update_result(self, status, expected, actual, description, reference, marks=10, marks_obtained=0):
+    def update_result(self, status, expected, actual, description, reference, marks=10, marks_obtained=0, status_text=None):
         '''
         Update test result
         status: 1 for pass, 0 for fail
         '''
-        result = {
+        return self.add_result(self.make_result(status, expected, actual, description, reference, marks, marks_obtained, status_text))
+
+    def make_result(self, status, expected, actual, description, reference, marks=10, marks_obtained=0, status_text=None):
+        if status_text is None:
+            status_text = "PASS" if status == 1 else "FAIL"
+        return {
             "status": status,
             "description": description,
             "expected": expected,
@@ -32,35 +122,101 @@ class ResultOutput:
             "reference": reference,
             "marks": marks,
             "marks_obtained": marks_obtained,
-            "statusText": "PASS" if status == 1 else "FAIL"
+            "statusText": status_text
         }
-        self.results.append(result)
-        self.total_marks += marks
-        self.obtained_marks += marks_obtained
 
-        status_text = "PASS" if status == 1 else "FAIL"
-        print(f"[{status_text}] {description} - Marks: {marks_obtained}/{marks}")
+    def add_result(self, result):
+        self.submit(self.apply_result, next(self.sequence), result)
         return result
 
+    def apply_result(self, sequence, result):
+        self.collected.append((sequence, result))
+        if self.verbose:
+            print(f"[{result['statusText']}] {result['description']} - Marks: {result['marks_obtained']}/{result['marks']}")
+
+    def update_error(self, testcase_name, message):
+        '''Record the exception that ended a test case, keyed by the test case'''
+        self.submit(self.errors.__setitem__, testcase_name, message)
+
+    def update_performance(self, section, key, value):
+        '''Attach a performance measurement to the final result under performance[section][key]'''
+        self.submit(self.apply_performance, section, key, value)
+
+    def apply_performance(self, section, key, value):
+        self.collected_performance.setdefault(section, {})[key] = value
+
+    def update_skipped(self, description, expected, reason, marks=10):
+        '''Record a test case that was skipped or cancelled; it counts with 0 marks obtained'''
+        result = self.make_result(0, expected, f"skipped: {reason}", description, "N/A", marks, 0, "SKIPPED")
+        result["skip_reason"] = reason
+        return self.add_result(result)
+
+    def update_advisory(self, category, severity, message, details=None):
+        '''Record a non-graded performance advisory (severity: info, warning or error)'''
+        self.submit(self.collected_advisories.append, {
+            "category": category,
+            "severity": severity,
+            "message": message,
+            "details": details if details is not None else {},
+        })
+
+    def on_testcase_end(self, testcase_name, duration):
+        '''Listener hook: wall time of a testcase_* method'''
+        self.update_performance("testcases", testcase_name, {"duration_ms": round(duration * 1000, 3)})
+
+    def on_http(self, event):
+        '''Listener hook: one HTTP exchange made by the activity'''
+        self.submit(self.apply_request, {
+            "testcase": event["testcase"],
+            "endpoint": event["endpoint"],
+            "status": event["status"],
+            "bytes": event["bytes"],
+            "latency_ms": round(event["duration_ms"], 3),
+        })
+
+    def apply_request(self, request):
+        self.collected_performance.setdefault("requests", []).append(request)
+
+    def on_db(self, event):
+        '''Listener hook: one statement executed by the activity'''
+        self.submit(self.apply_db, event["testcase"], event["statement"], event["table"], event["rows"], event["duration_ms"])
+
+    def apply_db(self, testcase_name, statement, table_name, rows, duration_ms):
+        queries = self.collected_performance.setdefault("db", {}).setdefault(testcase_name or "setup", {})
+        key = f"{statement} {table_name}"
+        query = queries.setdefault(key, {"count": 0, "rows": 0, "total_ms": 0})
+        query["count"] += 1
+        query["rows"] += max(rows, 0)
+        query["total_ms"] = round(query["total_ms"] + duration_ms, 3)
+
     def result_final(self):
         '''Generate final JSON result'''
+        results = self.results
+        total_marks = sum(result["marks"] for result in results)
+        obtained_marks = sum(result["marks_obtained"] for result in results)
         final_result = {
             "token": self.token,
             "timestamp": datetime.now().isoformat(),
-            "total_marks": self.total_marks,
-            "obtained_marks": self.obtained_marks,
-            "percentage": round((self.obtained_marks / self.total_marks * 100), 2) if self.total_marks > 0 else 0,
-            "testcases": self.results,
+            "total_marks": total_marks,
+            "obtained_marks": obtained_marks,
+            "percentage": round((obtained_marks / total_marks * 100), 2) if total_marks > 0 else 0,
+            "testcases": results,
             "errors": self.eval_message
         }
+        if self.collected_performance:
+            final_result["performance"] = self.collected_performance
+        if self.collected_advisories:
+            final_result["advisories"] = self.collected_advisories
         return json.dumps(final_result)
 
     def write_to_file(self, filepath="/tmp/clv/concept-eval.json"):
         '''Write results to file'''
         try:
-            os.makedirs(os.path.dirname(filepath), exist_ok=True)
+            if os.path.dirname(filepath):
+                os.makedirs(os.path.dirname(filepath), exist_ok=True)
             with open(filepath, 'w') as f:
                 f.write(self.result_final())
-            print(f"Results written to: {filepath}")
+            # stderr, so the JSON report on stdout stays machine-readable
+            print(f"Results written to: {filepath}", file=sys.stderr)
         except Exception as e:
-            print(f"Error writing results: {e}")
+            print(f"Error writing results: {e}", file=sys.stderr)
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+from perf_stats import summarize_latencies
+
+DEFAULT_WAREHOUSE = "/tmp/clv/results.sqlite3"
+BUCKETS = {"hour": 3600, "day": 86400, "week": 7 * 86400}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    token TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    total_marks INTEGER,
+    obtained_marks INTEGER,
+    percentage REAL
+);
+CREATE TABLE IF NOT EXISTS testcase_results (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    token TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    testcase TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    status_text TEXT,
+    marks INTEGER,
+    marks_obtained INTEGER,
+    duration_ms REAL
+);
+CREATE TABLE IF NOT EXISTS endpoint_latencies (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    started_at REAL NOT NULL,
+    endpoint TEXT NOT NULL,
+    requests INTEGER NOT NULL,
+    errors INTEGER NOT NULL,
+    total_ms REAL NOT NULL,
+    p50_ms REAL,
+    p95_ms REAL,
+    max_ms REAL
+);
+CREATE INDEX IF NOT EXISTS runs_token_time ON runs (token, started_at);
+CREATE INDEX IF NOT EXISTS runs_time ON runs (started_at);
+CREATE INDEX IF NOT EXISTS testcase_results_testcase_time ON testcase_results (testcase, started_at, status);
+CREATE INDEX IF NOT EXISTS testcase_results_token_time ON testcase_results (token, started_at, status);
+CREATE INDEX IF NOT EXISTS testcase_results_time ON testcase_results (started_at, status);
+CREATE INDEX IF NOT EXISTS testcase_results_run ON testcase_results (run_id);
+CREATE INDEX IF NOT EXISTS endpoint_latencies_endpoint_time ON endpoint_latencies (endpoint, started_at, requests, total_ms, p95_ms);
+CREATE INDEX IF NOT EXISTS endpoint_latencies_run ON endpoint_latencies (run_id);
+"""
+
+
+def run_timestamp(result):
+    try:
+        return datetime.fromisoformat(result["timestamp"]).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return time.time()
+
+
+def endpoint_rows(result):
+    '''One aggregate row per endpoint from performance.requests, instead of one row per request'''
+    by_endpoint = {}
+    for request in result.get("performance", {}).get("requests", []):
+        by_endpoint.setdefault(request["endpoint"], []).append(request)
+    rows = []
+    for endpoint, requests in sorted(by_endpoint.items()):
+        latencies = [request["latency_ms"] for request in requests]
+        stats = summarize_latencies(latencies)
+        errors = sum(1 for request in requests if request["status"] is None or request["status"] >= 400)
+        rows.append((endpoint, len(requests), errors, sum(latencies), stats["p50_ms"], stats["p95_ms"], stats["max_ms"]))
+    return rows
+
+
+class ResultsWarehouse:
+    '''
+    SQLite history of runs: one row per run, per test case result and per endpoint
+    latency aggregate. Test case and endpoint rows repeat the token and start time so
+    the trend queries are answered from the (key, time) indexes without joins.
+    '''
+
+    def __init__(self, filepath=DEFAULT_WAREHOUSE):
+        self.filepath = filepath
+        if os.path.dirname(filepath):
+            os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        self.connection = sqlite3.connect(filepath)
+        self.connection.execute("PRAGMA journal_mode=WAL;")
+        self.connection.execute("PRAGMA synchronous=NORMAL;")
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def insert_run(self, result, testcase_names=None):
+        '''
+        Insert one result_final() dict without committing. testcase_names maps a result
+        description to its testcase_* name, used to look up the duration of the test case.
+        '''
+        token = result.get("token", "default")
+        started_at = run_timestamp(result)
+        cursor = self.connection.execute(
+            "INSERT INTO runs (token, started_at, total_marks, obtained_marks, percentage) VALUES (?, ?, ?, ?, ?);",
+            (token, started_at, result.get("total_marks"), result.get("obtained_marks"), result.get("percentage"))
+        )
+        run_id = cursor.lastrowid
+        durations = result.get("performance", {}).get("testcases", {})
+        testcase_names = testcase_names or {}
+        self.connection.executemany(
+            "INSERT INTO testcase_results (run_id, token, started_at, testcase, status, status_text, marks, "
+            "marks_obtained, duration_ms) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?);",
+            [
+                (run_id, token, started_at, testcase["description"], testcase["status"], testcase.get("statusText"),
+                 testcase.get("marks"), testcase.get("marks_obtained"),
+                 durations.get(testcase_names.get(testcase["description"]), {}).get("duration_ms"))
+                for testcase in result.get("testcases", [])
+            ]
+        )
+        self.connection.executemany(
+            "INSERT INTO endpoint_latencies (run_id, started_at, endpoint, requests, errors, total_ms, p50_ms, p95_ms, max_ms) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?);",
+            [(run_id, started_at) + row for row in endpoint_rows(result)]
+        )
+        return run_id
+
+    def add_run(self, result, testcase_names=None):
+        with self.connection:
+            return self.insert_run(result, testcase_names)
+
+    def add_runs(self, results, testcase_names=None):
+        '''Bulk insert the results of a batch of runs in a single transaction'''
+        with self.connection:
+            return [self.insert_run(result, testcase_names) for result in results]
+
+    def bucket_clause(self, bucket):
+        return f"CAST(started_at / {BUCKETS[bucket]} AS INTEGER) * {BUCKETS[bucket]}"
+
+    def pass_rate(self, testcase=None, token=None, since=None, bucket="day"):
+        '''Pass rate per time bucket, optionally of one test case (description) and/or token'''
+        conditions = ["started_at >= ?"]
+        params = [since if since is not None else 0]
+        if testcase is not None:
+            conditions.append("testcase = ?")
+            params.append(testcase)
+        if token is not None:
+            conditions.append("token = ?")
+            params.append(token)
+        rows = self.connection.execute(
+            f"SELECT {self.bucket_clause(bucket)} AS bucket, count(*), sum(status = 1) FROM testcase_results "
+            f"WHERE {' AND '.join(conditions)} GROUP BY bucket ORDER BY bucket;",
+            params
+        ).fetchall()
+        return [
+            {"bucket": datetime.fromtimestamp(start).isoformat(), "results": total, "passed": passed,
+             "pass_rate": round(passed / total, 4) if total else None}
+            for start, total, passed in rows
+        ]
+
+    def endpoint_latency(self, endpoint, since=None, bucket="day"):
+        '''Request-weighted mean latency and worst per-run p95 of an endpoint per time bucket'''
+        rows = self.connection.execute(
+            f"SELECT {self.bucket_clause(bucket)} AS bucket, count(*), sum(requests), sum(errors), sum(total_ms), max(p95_ms) "
+            f"FROM endpoint_latencies WHERE endpoint = ? AND started_at >= ? GROUP BY bucket ORDER BY bucket;",
+            (endpoint, since if since is not None else 0)
+        ).fetchall()
+        return [
+            {"bucket": datetime.fromtimestamp(start).isoformat(), "runs": runs, "requests": requests, "errors": errors,
+             "mean_ms": round(total_ms / requests, 3) if requests else None, "max_p95_ms": p95_ms}
+            for start, runs, requests, errors, total_ms, p95_ms in rows
+        ]
+
+    def endpoints(self):
+        return [row[0] for row in self.connection.execute("SELECT DISTINCT endpoint FROM endpoint_latencies ORDER BY endpoint;")]
+
+    def average_durations(self, since=None):
+        '''Mean duration in ms per test case (description) over the stored runs'''
+        rows = self.connection.execute(
+            "SELECT testcase, avg(duration_ms) FROM testcase_results "
+            "WHERE started_at >= ? AND duration_ms IS NOT NULL GROUP BY testcase;",
+            (since if since is not None else 0,)
+        ).fetchall()
+        return {testcase: round(duration_ms, 3) for testcase, duration_ms in rows}
+
+    def recent_runs(self, token=None, limit=20):
+        query = "SELECT id, token, started_at, obtained_marks, total_marks, percentage FROM runs"
+        params = []
+        if token is not None:
+            query += " WHERE token = ?"
+            params.append(token)
+        rows = self.connection.execute(query + " ORDER BY started_at DESC LIMIT ?;", params + [limit]).fetchall()
+        return [
+            {"run_id": run_id, "token": run_token, "timestamp": datetime.fromtimestamp(started_at).isoformat(),
+             "obtained_marks": obtained, "total_marks": total, "percentage": percentage}
+            for run_id, run_token, started_at, obtained, total, percentage in rows
+        ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="results_warehouse.py", description="Query and load the local results history")
+    parser.add_argument("--db", default=DEFAULT_WAREHOUSE)
+    commands = parser.add_subparsers(dest="command", required=True)
+    import_parser = commands.add_parser("import", help="bulk insert result_final() JSON files")
+    import_parser.add_argument("files", nargs="+")
+    runs_parser = commands.add_parser("runs", help="most recent runs")
+    runs_parser.add_argument("--token", default=None)
+    runs_parser.add_argument("--limit", type=int, default=20)
+    pass_parser = commands.add_parser("pass-rate", help="pass rate per time bucket")
+    pass_parser.add_argument("--testcase", default=None, help="test case description")
+    pass_parser.add_argument("--token", default=None)
+    pass_parser.add_argument("--days", type=float, default=None, help="only the last N days")
+    pass_parser.add_argument("--bucket", choices=sorted(BUCKETS), default="day")
+    latency_parser = commands.add_parser("latency", help="latency of the endpoints per time bucket")
+    latency_parser.add_argument("--endpoint", default=None, help="e.g. 'GET /api/products/{id}' (default: all)")
+    latency_parser.add_argument("--days", type=float, default=None, help="only the last N days")
+    latency_parser.add_argument("--bucket", choices=sorted(BUCKETS), default="day")
+    options = parser.parse_args(argv)
+
+    warehouse = ResultsWarehouse(options.db)
+    since = time.time() - options.days * 86400 if getattr(options, "days", None) else None
+    if options.command == "import":
+        # imported late: the evaluator itself imports this module
+        from inventory_billing_system_validate import TESTCASE_INFO
+        results = []
+        for filepath in options.files:
+            with open(filepath) as f:
+                results.append(json.load(f))
+        testcase_names = {info["description"]: name for name, info in TESTCASE_INFO.items()}
+        report = {"imported": len(warehouse.add_runs(results, testcase_names))}
+    elif options.command == "runs":
+        report = warehouse.recent_runs(options.token, options.limit)
+    elif options.command == "pass-rate":
+        report = warehouse.pass_rate(options.testcase, options.token, since, options.bucket)
+    else:
+        endpoints = [options.endpoint] if options.endpoint else warehouse.endpoints()
+        report = {endpoint: warehouse.endpoint_latency(endpoint, since, options.bucket) for endpoint in endpoints}
+    warehouse.close()
+    print(json.dumps(report, indent=4))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+import threading
+import time
+
+
+class DeadlineExceeded(BaseException):
+    '''
+    Cancels the running test case. Like asyncio.CancelledError it derives from BaseException
+    so the `except Exception` blocks inside the test cases do not turn it into a plain failure.
+    '''
+
+
+class RunBudget:
+    '''Run-level deadline; each test case gets an equal share of what is left'''
+
+    def __init__(self, seconds):
+        self.expires = time.monotonic() + seconds
+
+    def remaining(self):
+        return self.expires - time.monotonic()
+
+    def share(self, testcases_left):
+        return self.remaining() / max(testcases_left, 1)
+
+
+class TestcaseDeadline:
+    '''
+    Deadline of one test case. HTTP and DB calls check it before starting and shorten their
+    timeouts to what is left; a watchdog cancels a DB statement still running when it expires.
+    '''
+
+    def __init__(self, seconds, activity):
+        self.seconds = seconds
+        self.expires = time.monotonic() + seconds
+        self.activity = activity
+        self.watchdog = None
+
+    def remaining(self):
+        return self.expires - time.monotonic()
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def check(self):
+        if self.expired():
+            raise DeadlineExceeded(f"test case time share of {round(self.seconds, 2)}s used up")
+
+    def limit(self, timeout):
+        '''Raise if the deadline passed, otherwise cap the timeout to the remaining time'''
+        self.check()
+        return self.remaining() if timeout is None else min(timeout, self.remaining())
+
+    def cancel_running_statement(self):
+        connection = self.activity.connection
+        if connection is None:
+            return
+        try:
+            if not connection.closed:
+                connection.cancel()
+        except Exception:
+            pass
+
+    def start(self):
+        self.watchdog = threading.Timer(max(self.seconds, 0), self.cancel_running_statement)
+        self.watchdog.daemon = True
+        self.watchdog.start()
+
+    def stop(self):
+        if self.watchdog is not None:
+            self.watchdog.cancel()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+import math
+import statistics
+import time
+from perf_stats import fit_power_law
+from response_schemas import decode_response
+
+DEFAULT_SIZES = [100, 1000, 10000, 100000]
+SUPER_LINEAR_EXPONENT = 1.15
+SUPER_LINEAR_TAIL_EXPONENT = 1.5
+
+
+class ScalingAnalysis:
+    '''
+    Seeds customers and billing rows at increasing sizes directly through PostgreSQL and
+    measures how the latency and payload of the list endpoints grow with the data.
+    '''
+
+    def __init__(self, activity, sizes=DEFAULT_SIZES, samples=3, timeout=60):
+        self.activity = activity
+        self.sizes = sorted(sizes)
+        self.samples = samples
+        self.timeout = timeout
+
+    def measure(self, api_url, schema_name):
+        latencies = []
+        response = None
+        for _ in range(self.samples):
+            started = time.perf_counter()
+            response = self.activity.send_request("GET", api_url, headers={"Content-Type": "application/json"}, timeout=self.timeout)
+            latencies.append((time.perf_counter() - started) * 1000)
+        data, errors = decode_response(response, schema_name)
+        return {
+            "status": response.status_code,
+            "latency_ms": round(statistics.median(latencies), 3),
+            "bytes": len(response.content),
+            "items": len(data) if isinstance(data, list) else None,
+        }
+
+    def run(self, test_object):
+        activity = self.activity
+        activity.current_testcase = "scaling_analysis"
+        steps = {"GET /api/customers": [], "GET /api/billing/{id}": []}
+        error = None
+        activity.connect_to_db()
+        try:
+            customer_id = activity.create_document_customer("scale_owner", "scale_owner@example.com")
+            if customer_id is None:
+                error = "could not create the scaling customer"
+            customers_seeded = products_seeded = billed = 0
+            for size in self.sizes if error is None else []:
+                seeded = [
+                    activity.seed_customers(customers_seeded + 1, size) if size > customers_seeded else 0,
+                    activity.seed_products(products_seeded + 1, size) if size > products_seeded else 0,
+                ]
+                customers_seeded = products_seeded = size
+                seeded.append(activity.seed_billing(customer_id, size - billed) if size > billed else 0)
+                if None in seeded:
+                    error = f"seeding {size} rows failed"
+                    break
+                billed = size
+
+                try:
+                    customers_step = self.measure(f"{activity.product_url}/api/customers", "customer_list")
+                    customers_step["rows"] = activity.count_rows("customers")
+                    steps["GET /api/customers"].append(customers_step)
+                    billing_step = self.measure(f"{activity.billing_url}/api/billing/{customer_id}", "billing_list")
+                    billing_step["rows"] = billed
+                    steps["GET /api/billing/{id}"].append(billing_step)
+                except Exception as e:
+                    error = f"request at {size} rows failed: {e}"
+                    break
+        finally:
+            activity.disconnect_from_db()
+            activity.current_testcase = None
+
+        for endpoint, endpoint_steps in steps.items():
+            report = self.analyze(endpoint_steps)
+            if error is not None:
+                report["error"] = error
+            test_object.update_performance("scaling", endpoint, report)
+
+    def analyze(self, steps):
+        '''Fit latency and payload growth and flag super-linear or unpaginated endpoints'''
+        measured = [step for step in steps if step["status"] == 200 and step["rows"]]
+        rows = [step["rows"] for step in measured]
+        latency_fit = fit_power_law(rows, [step["latency_ms"] for step in measured])
+        bytes_fit = fit_power_law(rows, [step["bytes"] for step in measured])
+
+        tail_exponent = None
+        if len(measured) >= 2 and measured[-1]["rows"] > measured[-2]["rows"] and measured[-2]["latency_ms"] > 0:
+            tail_exponent = round(
+                math.log(measured[-1]["latency_ms"] / measured[-2]["latency_ms"])
+                / math.log(measured[-1]["rows"] / measured[-2]["rows"]), 3
+            )
+
+        flags = []
+        if latency_fit["exponent"] is not None and latency_fit["exponent"] > SUPER_LINEAR_EXPONENT:
+            flags.append(f"super-linear latency growth (exponent {latency_fit['exponent']})")
+        elif tail_exponent is not None and tail_exponent > SUPER_LINEAR_TAIL_EXPONENT:
+            flags.append(f"super-linear latency growth at the largest size (exponent {tail_exponent})")
+        if measured and all(step["items"] is not None and step["items"] >= step["rows"] for step in measured):
+            flags.append(f"no pagination: all {measured[-1]['rows']} rows returned in a single response")
+
+        return {
+            "steps": steps,
+            "latency_fit": latency_fit,
+            "latency_tail_exponent": tail_exponent,
+            "bytes_fit": bytes_fit,
+            "flags": flags,
+        }
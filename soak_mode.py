@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+import os
+import threading
+import time
+from psycopg2 import Error
+from perf_stats import linear_fit
+
+SERVICE_PORTS = [8080, 8081]
+# a trend is reported as a leak when the fitted growth over the run exceeds both limits
+LEAK_MIN_R2 = 0.6
+CONNECTION_LEAK_MIN_GROWTH = 3
+RSS_LEAK_MIN_GROWTH_PCT = 20
+FD_LEAK_MIN_GROWTH = 20
+
+
+def listening_inodes(ports):
+    '''Socket inodes of the sockets listening on the given local ports'''
+    inodes = {}
+    for table in ("/proc/net/tcp", "/proc/net/tcp6"):
+        try:
+            with open(table) as f:
+                lines = f.readlines()[1:]
+        except OSError:
+            continue
+        for line in lines:
+            fields = line.split()
+            port = int(fields[1].rsplit(":", 1)[1], 16)
+            if fields[3] == "0A" and port in ports:
+                inodes[fields[9]] = port
+    return inodes
+
+
+def service_pids(ports=SERVICE_PORTS):
+    '''Map port -> pid of the local processes listening on the service ports'''
+    inodes = listening_inodes(ports)
+    pids = {}
+    for pid in filter(str.isdigit, os.listdir("/proc")):
+        try:
+            for fd in os.listdir(f"/proc/{pid}/fd"):
+                target = os.readlink(f"/proc/{pid}/fd/{fd}")
+                if target.startswith("socket:[") and target[8:-1] in inodes:
+                    pids[inodes[target[8:-1]]] = int(pid)
+        except OSError:
+            continue
+    return pids
+
+
+def process_sample(pid):
+    '''RSS, cumulative CPU seconds, threads and open descriptors of a process from /proc'''
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        cpu_seconds = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+        rss_kb = threads = None
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    rss_kb = int(line.split()[1])
+                elif line.startswith("Threads:"):
+                    threads = int(line.split()[1])
+        return {"rss_kb": rss_kb, "cpu_seconds": cpu_seconds, "threads": threads, "fds": len(os.listdir(f"/proc/{pid}/fd"))}
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def trend(times, values, min_growth, relative=False):
+    '''Per hour slope of a series and whether it looks like a leak'''
+    points = [(t, v) for t, v in zip(times, values) if v is not None]
+    if len(points) < 3:
+        return {"slope_per_hour": None, "leak": False}
+    slope, intercept, r2 = linear_fit([t for t, v in points], [v for t, v in points])
+    span = points[-1][0] - points[0][0]
+    growth = slope * span
+    if relative:
+        growth = growth / max(intercept, 1) * 100
+    return {
+        "first": points[0][1],
+        "last": points[-1][1],
+        "slope_per_hour": round(slope * 3600, 3),
+        "r2": round(r2, 3),
+        "leak": slope > 0 and r2 >= LEAK_MIN_R2 and growth >= min_growth,
+    }
+
+
+class SoakRun:
+    '''
+    Repeats the test-case mix for a long time while sampling pg_stat_activity connections
+    per application and the service processes' RSS/CPU/threads/fds from /proc, then fits
+    per-hour trends to spot connection and memory leaks.
+    '''
+
+    def __init__(self, database, duration, interval=30, pids=None, ports=SERVICE_PORTS):
+        self.database = database
+        self.duration = duration
+        self.interval = interval
+        self.pids = pids
+        self.ports = ports
+        self.samples = []
+        self.stopped = threading.Event()
+
+    def connection_counts(self, connection):
+        '''Connections to the database per application, leaving out the harness's own'''
+        cursor = connection.cursor()
+        cursor.execute(
+            "SELECT coalesce(nullif(application_name, ''), client_addr::text, 'unknown'), count(*) "
+            "FROM pg_stat_activity WHERE datname = current_database() AND application_name <> %s "
+            "GROUP BY 1;",
+            (self.database.application_name,)
+        )
+        counts = dict(cursor.fetchall())
+        cursor.close()
+        return counts
+
+    def sample(self, connection, started, pids):
+        sample = {"t": time.time() - started, "connections": {}, "processes": {}}
+        if connection is not None:
+            try:
+                sample["connections"] = self.connection_counts(connection)
+            except (Exception, Error) as error:
+                pass
+        for name, pid in pids.items():
+            sample["processes"][str(name)] = process_sample(pid)
+        self.samples.append(sample)
+
+    def sampler(self, started, pids):
+        connection = None
+        try:
+            connection = self.database.open_connection()
+            connection.autocommit = True
+        except (Exception, Error) as error:
+            connection = None
+        while True:
+            self.sample(connection, started, pids)
+            if self.stopped.wait(self.interval):
+                break
+        self.sample(connection, started, pids)
+        if connection is not None:
+            connection.close()
+
+    def run(self, test_object, run_iteration):
+        '''run_iteration() runs the test-case mix once and returns its results list'''
+        pids = {pid: pid for pid in self.pids} if self.pids else service_pids(self.ports)
+        started = time.time()
+        thread = threading.Thread(target=self.sampler, args=(started, pids), daemon=True)
+        thread.start()
+
+        iterations = 0
+        outcomes = {}
+        try:
+            while time.time() - started < self.duration:
+                for result in run_iteration():
+                    outcome = outcomes.setdefault(result["description"], {"pass": 0, "fail": 0})
+                    outcome["pass" if result["status"] == 1 else "fail"] += 1
+                iterations += 1
+        finally:
+            self.stopped.set()
+            thread.join()
+
+        report = {
+            "duration_s": round(time.time() - started, 1),
+            "iterations": iterations,
+            "outcomes": outcomes,
+            "processes": pids,
+            "trends": self.trends(),
+            "samples": len(self.samples),
+        }
+        test_object.update_performance("soak", "summary", report)
+        for key, series in report["trends"].items():
+            for metric, metric_trend in series.items():
+                if metric_trend["leak"]:
+                    test_object.update_advisory(
+                        "leak", "warning",
+                        f"{key}: {metric} grows by {metric_trend['slope_per_hour']} per hour during the soak",
+                        metric_trend
+                    )
+
+    def trends(self):
+        times = [sample["t"] for sample in self.samples]
+        trends = {}
+        applications = sorted({name for sample in self.samples for name in sample["connections"]})
+        for application in applications:
+            counts = [sample["connections"].get(application, 0) for sample in self.samples]
+            trends[f"connections {application}"] = {"connections": trend(times, counts, CONNECTION_LEAK_MIN_GROWTH)}
+        processes = sorted({name for sample in self.samples for name in sample["processes"]})
+        for process in processes:
+            stats = [sample["processes"].get(process) or {} for sample in self.samples]
+            cpu = [s.get("cpu_seconds") for s in stats]
+            cpu_percent = [None] + [
+                round((cpu[i] - cpu[i - 1]) / (times[i] - times[i - 1]) * 100, 2)
+                if cpu[i] is not None and cpu[i - 1] is not None and times[i] > times[i - 1] else None
+                for i in range(1, len(cpu))
+            ]
+            cpu_values = [value for value in cpu_percent if value is not None]
+            cpu_trend = trend(times, cpu_percent, float("inf"))
+            cpu_trend["mean"] = round(sum(cpu_values) / len(cpu_values), 2) if cpu_values else None
+            trends[f"process {process}"] = {
+                "rss_kb": trend(times, [s.get("rss_kb") for s in stats], RSS_LEAK_MIN_GROWTH_PCT, relative=True),
+                "fds": trend(times, [s.get("fds") for s in stats], FD_LEAK_MIN_GROWTH),
+                "threads": trend(times, [s.get("threads") for s in stats], FD_LEAK_MIN_GROWTH),
+                "cpu_percent": cpu_trend,
+            }
+        return trends
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+from psycopg2 import Error
+
+STATEMENTS_PER_REQUEST_WARNING = 10
+TOP_STATEMENTS = 5
+
+
+class StatementStats:
+    '''
+    Attributes the statements the services run to the API call that caused them.
+    pg_stat_statements is reset right before each request and read right after it,
+    while the harness itself issues no other queries, so the delta belongs to the endpoint.
+    Needs pg_stat_statements in shared_preload_libraries and a role allowed to reset it.
+    '''
+
+    def __init__(self, database):
+        self.database = database
+        self.connection = None
+        self.time_column = "total_exec_time"
+        self.per_testcase = {}
+
+    def start(self):
+        '''Connect and check that pg_stat_statements is usable; returns False otherwise'''
+        try:
+            self.connection = self.database.open_connection()
+            self.connection.autocommit = True
+            cursor = self.connection.cursor()
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_stat_statements;")
+            cursor.execute(
+                "SELECT column_name FROM information_schema.columns "
+                "WHERE table_name = 'pg_stat_statements' AND column_name IN ('total_exec_time', 'total_time');"
+            )
+            columns = [row[0] for row in cursor.fetchall()]
+            self.time_column = "total_exec_time" if "total_exec_time" in columns else "total_time"
+            cursor.execute("SELECT pg_stat_statements_reset();")
+            cursor.close()
+            return True
+        except (Exception, Error) as error:
+            self.stop()
+            return False
+
+    def stop(self):
+        if self.connection:
+            try:
+                self.connection.close()
+            except (Exception, Error) as error:
+                pass
+        self.connection = None
+
+    def reset(self):
+        if not self.connection:
+            return
+        try:
+            cursor = self.connection.cursor()
+            cursor.execute("SELECT pg_stat_statements_reset();")
+            cursor.close()
+        except (Exception, Error) as error:
+            pass
+
+    def snapshot(self):
+        '''Statements recorded since the last reset, excluding the harness' own bookkeeping'''
+        if not self.connection:
+            return None
+        try:
+            cursor = self.connection.cursor()
+            cursor.execute(
+                f"SELECT query, calls, {self.time_column}, rows FROM pg_stat_statements "
+                f"WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database()) "
+                f"AND query NOT ILIKE '%%pg_stat_statements%%' "
+                f"AND query NOT ILIKE '%%information_schema%%' "
+                f"ORDER BY {self.time_column} DESC;"
+            )
+            statements = [
+                {"query": query, "calls": calls, "total_ms": round(total_ms, 3), "rows": rows}
+                for query, calls, total_ms, rows in cursor.fetchall()
+            ]
+            cursor.close()
+            return statements
+        except (Exception, Error) as error:
+            return None
+
+    def measure(self, action):
+        '''Run action() between a reset and a snapshot; returns (result, statements)'''
+        self.reset()
+        result = action()
+        return result, self.snapshot()
+
+    def on_http_start(self, event, request_kwargs):
+        self.reset()
+
+    def on_http(self, event):
+        statements = self.snapshot()
+        if statements is None:
+            return
+        endpoints = self.per_testcase.setdefault(event["testcase"] or "setup", {})
+        endpoint = endpoints.setdefault(event["endpoint"], {
+            "requests": 0, "calls": 0, "total_ms": 0, "rows": 0, "statements": {},
+        })
+        endpoint["requests"] += 1
+        for statement in statements:
+            endpoint["calls"] += statement["calls"]
+            endpoint["total_ms"] = round(endpoint["total_ms"] + statement["total_ms"], 3)
+            endpoint["rows"] += statement["rows"]
+            seen = endpoint["statements"].setdefault(statement["query"], {"calls": 0, "total_ms": 0, "rows": 0})
+            seen["calls"] += statement["calls"]
+            seen["total_ms"] = round(seen["total_ms"] + statement["total_ms"], 3)
+            seen["rows"] += statement["rows"]
+
+    def report(self, test_object):
+        '''Attach the per test case, per endpoint attribution to the result'''
+        for testcase, endpoints in self.per_testcase.items():
+            report = {}
+            for endpoint_name, endpoint in endpoints.items():
+                top = sorted(endpoint["statements"].items(), key=lambda item: item[1]["total_ms"], reverse=True)
+                calls_per_request = endpoint["calls"] / endpoint["requests"]
+                report[endpoint_name] = {
+                    "requests": endpoint["requests"],
+                    "distinct_statements": len(endpoint["statements"]),
+                    "calls": endpoint["calls"],
+                    "calls_per_request": round(calls_per_request, 2),
+                    "total_ms": endpoint["total_ms"],
+                    "rows": endpoint["rows"],
+                    "top_statements": [dict(stats, query=query) for query, stats in top[:TOP_STATEMENTS]],
+                }
+                if calls_per_request > STATEMENTS_PER_REQUEST_WARNING:
+                    test_object.update_advisory(
+                        "statements_per_request", "warning",
+                        f"{endpoint_name} issued {round(calls_per_request, 1)} statements per request in {testcase}",
+                        {"testcase": testcase, "endpoint": endpoint_name, "calls": endpoint["calls"]}
+                    )
+            test_object.update_performance("db_statements", testcase, report)
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+import hashlib
+import struct
+from decimal import Decimal
+
+TABLES = ["products", "customers", "billing"]
+COPY_SIGNATURE = b"PGCOPY\n\xff\r\n\x00"
+# above this many rows only an 8 byte digest per row is kept instead of the column values
+DIGEST_THRESHOLD = 10000
+# rows listed per table and change kind in a diff; the counts are always complete
+MAX_LISTED_ROWS = 50
+
+
+class CopyParser:
+    '''
+    File-like sink for copy_expert that parses a COPY ... (FORMAT binary) stream as it
+    arrives and calls on_row with a tuple of raw field bytes (None for NULL) for every
+    complete row. Only the bytes of an unfinished row are buffered.
+    '''
+
+    def __init__(self, on_row):
+        self.on_row = on_row
+        self.buffer = bytearray()
+        self.header_read = False
+        self.done = False
+
+    def write(self, data):
+        self.buffer += data
+        offset = 0
+        if not self.header_read:
+            offset = self.read_header()
+            if offset is None:
+                return len(data)
+            self.header_read = True
+        while not self.done:
+            end = self.read_row(offset)
+            if end is None:
+                break
+            offset = end
+        del self.buffer[:offset]
+        return len(data)
+
+    def read_header(self):
+        if len(self.buffer) < 11:
+            return None
+        if bytes(self.buffer[:11]) != COPY_SIGNATURE:
+            raise ValueError("not a binary COPY stream")
+        if len(self.buffer) < 19:
+            return None
+        end = 19 + struct.unpack_from(">I", self.buffer, 15)[0]
+        return end if len(self.buffer) >= end else None
+
+    def read_row(self, offset):
+        '''Parse the row at offset and return the offset after it, or None if it is not complete yet'''
+        buffer = self.buffer
+        if len(buffer) < offset + 2:
+            return None
+        field_count = struct.unpack_from(">h", buffer, offset)[0]
+        offset += 2
+        if field_count == -1:
+            self.done = True
+            return offset
+        fields = []
+        for _ in range(field_count):
+            if len(buffer) < offset + 4:
+                return None
+            length = struct.unpack_from(">i", buffer, offset)[0]
+            offset += 4
+            if length == -1:
+                fields.append(None)
+            elif len(buffer) < offset + length:
+                return None
+            else:
+                fields.append(bytes(buffer[offset:offset + length]))
+                offset += length
+        self.on_row(tuple(fields))
+        return offset
+
+    def close(self):
+        if not self.done:
+            raise ValueError("truncated binary COPY stream")
+
+
+def parse_binary_copy(data):
+    '''Rows of a complete COPY ... (FORMAT binary) stream as tuples of raw field bytes (None for NULL)'''
+    rows = []
+    parser = CopyParser(rows.append)
+    parser.write(data)
+    parser.close()
+    return rows
+
+
+def decode_numeric(raw):
+    ndigits, weight, sign, dscale = struct.unpack_from(">hhHh", raw)
+    if sign == 0xC000:
+        return "NaN"
+    value = Decimal(0)
+    for index, digit in enumerate(struct.unpack_from(f">{ndigits}H", raw, 8)):
+        value += Decimal(digit).scaleb(4 * (weight - index))
+    if sign == 0x4000:
+        value = -value
+    return str(value.quantize(Decimal(1).scaleb(-dscale)))
+
+
+DECODERS = {
+    16: lambda raw: raw != b"\x00",
+    20: lambda raw: int.from_bytes(raw, "big", signed=True),
+    21: lambda raw: int.from_bytes(raw, "big", signed=True),
+    23: lambda raw: int.from_bytes(raw, "big", signed=True),
+    700: lambda raw: struct.unpack(">f", raw)[0],
+    701: lambda raw: struct.unpack(">d", raw)[0],
+    1700: decode_numeric,
+    19: bytes.decode,
+    25: bytes.decode,
+    1042: bytes.decode,
+    1043: bytes.decode,
+}
+
+
+def decode_value(type_oid, raw):
+    if raw is None:
+        return None
+    decoder = DECODERS.get(type_oid)
+    return decoder(raw) if decoder is not None else raw.hex()
+
+
+def row_digest(row):
+    encoded = b"".join(struct.pack(">i", -1) if field is None else struct.pack(">i", len(field)) + field for field in row)
+    return hashlib.blake2b(encoded, digest_size=8).digest()
+
+
+class TableSnapshot:
+    '''
+    Rows of one table ordered by id: the ids plus either one list of raw values per column
+    or, for tables above DIGEST_THRESHOLD rows, one short digest per row.
+    '''
+
+    def __init__(self, table_name, columns, type_oids, rows=(), digest_threshold=DIGEST_THRESHOLD):
+        self.table_name = table_name
+        self.columns = columns
+        self.type_oids = type_oids
+        self.digest_threshold = digest_threshold
+        self.id_index = columns.index("id")
+        self.ids = []
+        self.digested = False
+        self.values = [[] for _ in columns]
+        self.digests = None
+        for row in rows:
+            self.add(row)
+
+    def add(self, row):
+        '''Append the next row; past digest_threshold rows the values kept so far are folded into digests'''
+        self.ids.append(decode_value(self.type_oids[self.id_index], row[self.id_index]))
+        if self.digested:
+            self.digests.append(row_digest(row))
+            return
+        for column, field in zip(self.values, row):
+            column.append(field)
+        if len(self.ids) > self.digest_threshold:
+            self.digests = [row_digest(row) for row in zip(*self.values)]
+            self.values = None
+            self.digested = True
+
+    def __len__(self):
+        return len(self.ids)
+
+    def row_key(self, index):
+        if self.digested:
+            return self.digests[index]
+        return tuple(column[index] for column in self.values)
+
+    def row(self, index):
+        if self.digested:
+            return {"id": self.ids[index]}
+        return {
+            column: decode_value(type_oid, values[index])
+            for column, type_oid, values in zip(self.columns, self.type_oids, self.values)
+        }
+
+
+def diff_snapshots(before, after):
+    '''Rows inserted, updated and deleted between two snapshots of a table (merge over the sorted ids)'''
+    inserted, updated, deleted = [], [], []
+    i = j = 0
+    while i < len(before) or j < len(after):
+        before_id = before.ids[i] if i < len(before) else None
+        after_id = after.ids[j] if j < len(after) else None
+        if after_id is None or (before_id is not None and before_id < after_id):
+            deleted.append(i)
+            i += 1
+        elif before_id is None or after_id < before_id:
+            inserted.append(j)
+            j += 1
+        else:
+            if before.row_key(i) != after.row_key(j):
+                updated.append((i, j))
+            i += 1
+            j += 1
+
+    def changed_columns(i, j):
+        if before.digested or after.digested:
+            return {"id": after.ids[j]}
+        old, new = before.row(i), after.row(j)
+        return {"id": after.ids[j], "changed": {column: [old[column], new[column]] for column in new if old.get(column) != new[column]}}
+
+    return {
+        "inserted": len(inserted),
+        "updated": len(updated),
+        "deleted": len(deleted),
+        "inserted_rows": [after.row(j) for j in inserted[:MAX_LISTED_ROWS]],
+        "updated_rows": [changed_columns(i, j) for i, j in updated[:MAX_LISTED_ROWS]],
+        "deleted_rows": [before.row(i) for i in deleted[:MAX_LISTED_ROWS]],
+    }
+
+
+def read_snapshot(cursor, table_name, digest_threshold=DIGEST_THRESHOLD):
+    '''Stream a table with binary COPY into a TableSnapshot, one row at a time'''
+    cursor.execute(f"SELECT * FROM {table_name} LIMIT 0;")
+    columns = [column.name for column in cursor.description]
+    type_oids = [column.type_code for column in cursor.description]
+    snapshot = TableSnapshot(table_name, columns, type_oids, digest_threshold=digest_threshold)
+    parser = CopyParser(snapshot.add)
+    cursor.copy_expert(f"COPY (SELECT * FROM {table_name} ORDER BY id) TO STDOUT WITH (FORMAT binary)", parser)
+    parser.close()
+    return snapshot
+
+
+class StateDiffRecorder:
+    '''
+    Listener that snapshots the tables around every test case and records which rows it
+    inserted, updated or deleted. A test case that only sent GET requests but changed rows
+    gets an advisory, since a read must not have side effects.
+    '''
+
+    def __init__(self, database, tables=TABLES):
+        self.database = database
+        self.tables = tables
+        self.before = {}
+        self.methods = set()
+        self.diffs = {}
+
+    def start(self):
+        '''Open the recorder's own connection; returns False if the database is unavailable'''
+        self.database.connect_to_db()
+        return self.database.cursor is not None
+
+    def stop(self):
+        self.database.disconnect_from_db()
+
+    def snapshot(self):
+        snapshots = {}
+        for table_name in self.tables:
+            snapshot = self.database.snapshot_table(table_name)
+            if snapshot is not None:
+                snapshots[table_name] = snapshot
+        return snapshots
+
+    def on_testcase_start(self, testcase_name):
+        self.methods = set()
+        self.before = self.snapshot()
+
+    def on_http(self, event):
+        self.methods.add(event["method"])
+
+    def on_testcase_end(self, testcase_name, duration):
+        after = self.snapshot()
+        diff = {}
+        for table_name, before in self.before.items():
+            if table_name in after:
+                table_diff = diff_snapshots(before, after[table_name])
+                if table_diff["inserted"] or table_diff["updated"] or table_diff["deleted"]:
+                    diff[table_name] = table_diff
+        self.diffs[testcase_name] = {"tables": diff, "methods": sorted(self.methods)}
+        self.before = {}
+
+    def report(self, test_object):
+        for testcase_name, diff in self.diffs.items():
+            test_object.update_performance("state_diff", testcase_name, diff["tables"])
+            if diff["tables"] and diff["methods"] == ["GET"]:
+                changes = {
+                    table_name: {kind: table_diff[kind] for kind in ("inserted", "updated", "deleted")}
+                    for table_name, table_diff in diff["tables"].items()
+                }
+                test_object.update_advisory(
+                    "side_effects", "warning",
+                    f"{testcase_name}: rows changed although the test case only sent GET requests",
+                    changes
+                )
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+import cProfile
+import os
+import pstats
+import tracemalloc
+
+
+class TestcaseProfiler:
+    '''
+    CPU (cProfile) and allocation (tracemalloc) profiling of single testcase_* methods.
+    Only the selected test cases are wrapped, the rest run untouched.
+    '''
+
+    def __init__(self, output_dir="/tmp/clv/profiles", testcases=None, top=10, frames=10):
+        self.output_dir = output_dir
+        self.testcases = None if testcases is None else set(testcases)
+        self.top = top
+        self.frames = frames
+
+    def wants(self, testcase_name):
+        return self.testcases is None or testcase_name in self.testcases
+
+    def run(self, testcase_name, testcase, *args):
+        '''Run testcase(*args) under both profilers, write the stats files and return the summary'''
+        tracemalloc.start(self.frames)
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            testcase(*args)
+        finally:
+            profiler.disable()
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        snapshot = snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ))
+
+        summary = {
+            "cpu_stats_file": None,
+            "allocation_stats_file": None,
+            "hot_functions": self.hot_functions(profiler),
+            "peak_allocated_kb": round(peak / 1024, 2),
+            "top_allocations": self.top_allocations(snapshot),
+        }
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            cpu_stats_file = os.path.join(self.output_dir, f"{testcase_name}.prof")
+            allocation_stats_file = os.path.join(self.output_dir, f"{testcase_name}.tracemalloc")
+            profiler.dump_stats(cpu_stats_file)
+            snapshot.dump(allocation_stats_file)
+            summary["cpu_stats_file"] = cpu_stats_file
+            summary["allocation_stats_file"] = allocation_stats_file
+        except Exception as e:
+            summary["error"] = f"Error writing profile stats: {e}"
+        return summary
+
+    def hot_functions(self, profiler):
+        stats = pstats.Stats(profiler).stats
+        ranked = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)
+        hot = []
+        for (filename, line, function), (primitive_calls, calls, total_time, cumulative_time, callers) in ranked[:self.top]:
+            hot.append({
+                "function": f"{filename}:{line}({function})",
+                "calls": calls,
+                "total_ms": round(total_time * 1000, 3),
+                "cumulative_ms": round(cumulative_time * 1000, 3),
+            })
+        return hot
+
+    def top_allocations(self, snapshot):
+        allocations = []
+        for statistic in snapshot.statistics("lineno")[:self.top]:
+            frame = statistic.traceback[0]
+            allocations.append({
+                "location": f"{frame.filename}:{frame.lineno}",
+                "size_kb": round(statistic.size / 1024, 2),
+                "count": statistic.count,
+            })
+        return allocations
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import sys
+from datetime import datetime
+from results_warehouse import ResultsWarehouse
+
+SQLITE_HEADER = b"SQLite format 3\x00"
+
+
+def parse_shard(value):
+    '''"i/N" with 1 <= i <= N; an argparse type, so a bad value is a usage error'''
+    index, _, count = value.partition("/")
+    try:
+        index, count = int(index), int(count)
+    except ValueError:
+        index, count = 0, 0
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"shard {value!r} is not of the form i/N with 1 <= i <= N")
+    return index, count
+
+
+def matching_testcases(testcases, testcase_info, selector):
+    '''Test cases named (with or without the testcase_ prefix) or tagged `selector`'''
+    return [
+        name for name in testcases
+        if selector in (name, name[len("testcase_"):]) or selector in testcase_info[name].get("tags", [])
+    ]
+
+
+def parse_selectors(value, testcases, testcase_info):
+    '''Comma separated selectors, each of which must match a test case'''
+    selectors = [selector.strip() for selector in value.split(",") if selector.strip()]
+    for selector in selectors:
+        if not matching_testcases(testcases, testcase_info, selector):
+            raise argparse.ArgumentTypeError(f"no test case is named or tagged {selector!r}")
+    return selectors
+
+
+def select_testcases(testcases, testcase_info, selectors=None):
+    '''
+    Test cases matching any selector (testcase_* name, name without the prefix, or tag)
+    plus everything they depend on, in suite order. No selectors selects the whole suite.
+    '''
+    if not selectors:
+        return list(testcases)
+    selected = set()
+    for selector in selectors:
+        matches = matching_testcases(testcases, testcase_info, selector)
+        if not matches:
+            raise ValueError(f"no test case is named or tagged {selector!r}")
+        selected.update(matches)
+    pending = list(selected)
+    while pending:
+        for dependency in testcase_info[pending.pop()].get("depends_on", []):
+            if dependency not in selected:
+                selected.add(dependency)
+                pending.append(dependency)
+    return [name for name in testcases if name in selected]
+
+
+def dependency_groups(testcases, testcase_info):
+    '''Connected components of the dependency graph; a chain shares Activity state so it stays on one machine'''
+    group_of = {name: {name} for name in testcases}
+    for name in testcases:
+        for dependency in testcase_info[name].get("depends_on", []):
+            if dependency in group_of and group_of[dependency] is not group_of[name]:
+                merged = group_of[dependency] | group_of[name]
+                for member in merged:
+                    group_of[member] = merged
+    groups = []
+    for name in testcases:
+        if not any(group_of[name] is group for group in groups):
+            groups.append(group_of[name])
+    return [[name for name in testcases if name in group] for group in groups]
+
+
+def shard_testcases(testcases, testcase_info, shard, durations=None):
+    '''
+    Test cases of shard (i, N). Dependency groups are assigned longest first to the shard
+    with the least estimated time (historical duration in ms, 1000 if unknown); ties go to
+    the group earlier in the suite and to the lower shard, so every machine computes the
+    same partition from the same history.
+    '''
+    index, count = shard
+    durations = durations or {}
+    groups = dependency_groups(testcases, testcase_info)
+    weighted = sorted(
+        ((sum(durations.get(name, 1000) for name in group), testcases.index(group[0]), group) for group in groups),
+        key=lambda item: (-item[0], item[1])
+    )
+    loads = [0] * count
+    assigned = [[] for _ in range(count)]
+    for weight, position, group in weighted:
+        target = min(range(count), key=lambda shard_index: (loads[shard_index], shard_index))
+        loads[target] += weight
+        assigned[target] += group
+    return [name for name in testcases if name in assigned[index - 1]]
+
+
+def load_durations(filepath, testcase_info):
+    '''
+    Historical duration in ms per test case name, from a results warehouse (average over
+    the stored runs) or from a previous result file (performance.testcases).
+    '''
+    with open(filepath, "rb") as f:
+        header = f.read(len(SQLITE_HEADER))
+    if header == SQLITE_HEADER:
+        warehouse = ResultsWarehouse(filepath)
+        by_description = warehouse.average_durations()
+        warehouse.close()
+        return {
+            name: by_description[info["description"]]
+            for name, info in testcase_info.items() if info["description"] in by_description
+        }
+    with open(filepath) as f:
+        result = json.load(f)
+    return {
+        name: timing["duration_ms"]
+        for name, timing in result.get("performance", {}).get("testcases", {}).items() if "duration_ms" in timing
+    }
+
+
+def merge_results(results, testcase_order=None):
+    '''Combine the result files of the shards of one grading run into a single result'''
+    order = {description: index for index, description in enumerate(testcase_order or [])}
+    testcases = []
+    errors = {}
+    performance = {}
+    advisories = []
+    for result in results:
+        testcases += result.get("testcases", [])
+        errors.update(result.get("errors", {}))
+        advisories += result.get("advisories", [])
+        for section, values in result.get("performance", {}).items():
+            if isinstance(values, list):
+                performance.setdefault(section, []).extend(values)
+            elif section == "shard":
+                performance.setdefault("shards", []).append(values)
+            else:
+                performance.setdefault(section, {}).update(values)
+    testcases = [
+        testcase for position, testcase in sorted(
+            enumerate(testcases), key=lambda item: (order.get(item[1]["description"], len(order)), item[0])
+        )
+    ]
+    total_marks = sum(testcase["marks"] for testcase in testcases)
+    obtained_marks = sum(testcase["marks_obtained"] for testcase in testcases)
+    merged = {
+        "token": results[0].get("token", "default") if results else "default",
+        "timestamp": max((result.get("timestamp", "") for result in results), default=datetime.now().isoformat()),
+        "total_marks": total_marks,
+        "obtained_marks": obtained_marks,
+        "percentage": round((obtained_marks / total_marks * 100), 2) if total_marks > 0 else 0,
+        "testcases": testcases,
+        "errors": {name: errors[name] for name in sorted(errors)},
+    }
+    if performance:
+        merged["performance"] = performance
+    if advisories:
+        merged["advisories"] = advisories
+    return merged
+
+
+def main(argv=None):
+    from inventory_billing_system_validate import TESTCASES, TESTCASE_INFO, testcase_order
+
+    parser = argparse.ArgumentParser(prog="testcase_selection.py", description="Plan test case shards and merge shard results")
+    commands = parser.add_subparsers(dest="command", required=True)
+    plan_parser = commands.add_parser("plan", help="show the test cases of every shard")
+    plan_parser.add_argument("shards", type=int)
+    plan_parser.add_argument("--select", type=lambda value: parse_selectors(value, TESTCASES, TESTCASE_INFO), default=None,
+                             help="comma separated test case names or tags")
+    plan_parser.add_argument("--durations", default=None, help="results warehouse or previous result file")
+    merge_parser = commands.add_parser("merge", help="merge the result files of the shards")
+    merge_parser.add_argument("files", nargs="+")
+    merge_parser.add_argument("--output", default=None, help="write the merged result here instead of stdout")
+    options = parser.parse_args(argv)
+
+    if options.command == "plan":
+        if options.shards < 1:
+            parser.error("the number of shards must be at least 1")
+        selected = select_testcases(TESTCASES, TESTCASE_INFO, options.select)
+        durations = load_durations(options.durations, TESTCASE_INFO) if options.durations else None
+        report = {
+            f"{index}/{options.shards}": shard_testcases(selected, TESTCASE_INFO, (index, options.shards), durations)
+            for index in range(1, options.shards + 1)
+        }
+    else:
+        results = []
+        for filepath in options.files:
+            with open(filepath) as f:
+                results.append(json.load(f))
+        report = merge_results(results, testcase_order())
+    output = json.dumps(report, indent=4)
+    if getattr(options, "output", None):
+        with open(options.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
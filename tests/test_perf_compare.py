@@ -0,0 +1,46 @@
+import json
+import random
+from perf_compare import compare_results, compare_samples, main
+from result_output import ResultOutput
+
+ENDPOINTS = ["GET /api/products/{id}", "POST /api/products"]
+
+
+def write_run(path, latency_ms, rng):
+    '''A result file as a graded run writes it: two requests per endpoint'''
+    test_object = ResultOutput(json.dumps({"token": "t"}), None, verbose=False)
+    for endpoint in ENDPOINTS:
+        for _ in range(2):
+            test_object.on_http({
+                "testcase": "testcase_check_for_successful_product_creation",
+                "endpoint": endpoint,
+                "status": 200,
+                "bytes": 10,
+                "duration_ms": rng.gauss(latency_ms, latency_ms * 0.05),
+            })
+    test_object.close()
+    test_object.write_to_file(str(path))
+    return str(path)
+
+
+def test_regression_detected_from_repeated_result_files(tmp_path):
+    rng = random.Random(1)
+    baseline = [write_run(tmp_path / f"baseline{index}.json", 10, rng) for index in range(6)]
+    current = [write_run(tmp_path / f"current{index}.json", 15, rng) for index in range(6)]
+    assert main(["--baseline"] + baseline + ["--current"] + current) == 1
+
+
+def test_no_regression_between_equal_builds(tmp_path):
+    rng = random.Random(2)
+    baseline = [write_run(tmp_path / f"baseline{index}.json", 10, rng) for index in range(6)]
+    current = [write_run(tmp_path / f"current{index}.json", 10, rng) for index in range(6)]
+    assert main(["--baseline"] + baseline + ["--current"] + current) == 0
+
+
+def test_single_result_files_are_insufficient_data(tmp_path):
+    rng = random.Random(3)
+    baseline = json.load(open(write_run(tmp_path / "baseline.json", 10, rng)))
+    current = json.load(open(write_run(tmp_path / "current.json", 100, rng)))
+    report = compare_results(baseline, current)
+    assert {comparison["verdict"] for comparison in report["endpoint"].values()} == {"insufficient data"}
+    assert compare_samples([1.0, 1.1], [10.0, 11.0])["verdict"] == "insufficient data"
@@ -0,0 +1,15 @@
+import json
+from result_output import ResultOutput
+
+
+def test_write_to_file_with_a_bare_filename(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    test_object = ResultOutput(json.dumps({"token": "t"}), None, verbose=False)
+    test_object.update_result(1, "ok", "ok", "Check something", "N/A", 10, 10)
+    test_object.write_to_file("out.json")
+    test_object.close()
+    with open(tmp_path / "out.json") as f:
+        assert json.load(f)["obtained_marks"] == 10
+    captured = capsys.readouterr()
+    assert captured.out == ""
+    assert "out.json" in captured.err
@@ -0,0 +1,29 @@
+import json
+from inventory_billing_system_validate import TESTCASE_INFO
+from result_output import ResultOutput
+from results_warehouse import ResultsWarehouse, main
+
+TESTCASE = "testcase_check_for_successful_product_creation"
+
+
+def write_run(path, duration):
+    '''A result file as a graded run writes it: one passed test case and its wall time'''
+    info = TESTCASE_INFO[TESTCASE]
+    test_object = ResultOutput(json.dumps({"token": "t"}), None, verbose=False)
+    test_object.update_result(1, info["expected"], info["expected"], info["description"], "", info["marks"], info["marks"])
+    test_object.on_testcase_end(TESTCASE, duration)
+    test_object.close()
+    test_object.write_to_file(str(path))
+    return str(path)
+
+
+def test_imported_durations_feed_average_durations(tmp_path, capsys):
+    files = [write_run(tmp_path / "run1.json", 0.1), write_run(tmp_path / "run2.json", 0.3)]
+    db = str(tmp_path / "results.sqlite3")
+    assert main(["--db", db, "import"] + files) == 0
+    assert json.loads(capsys.readouterr().out) == {"imported": 2}
+    warehouse = ResultsWarehouse(db)
+    try:
+        assert warehouse.average_durations() == {TESTCASE_INFO[TESTCASE]["description"]: 200.0}
+    finally:
+        warehouse.close()
@@ -0,0 +1,41 @@
+import struct
+
+from table_snapshots import COPY_SIGNATURE, CopyParser, TableSnapshot, diff_snapshots, row_digest
+
+
+def copy_stream(rows):
+    data = COPY_SIGNATURE + struct.pack(">II", 0, 0)
+    for row in rows:
+        data += struct.pack(">h", len(row))
+        for field in row:
+            data += struct.pack(">i", -1) if field is None else struct.pack(">i", len(field)) + field
+    return data + struct.pack(">h", -1)
+
+
+ROWS = [(struct.pack(">i", index), f"product {index}".encode(), None) for index in range(1, 6)]
+
+
+def test_copy_parser_handles_rows_split_across_writes():
+    rows = []
+    parser = CopyParser(rows.append)
+    data = copy_stream(ROWS)
+    for offset in range(len(data)):
+        parser.write(data[offset:offset + 1])
+    parser.close()
+    assert rows == ROWS
+    assert not parser.buffer
+
+
+def test_snapshot_switches_to_digests_past_the_threshold():
+    columns, type_oids = ["id", "name", "note"], [23, 25, 25]
+    snapshot = TableSnapshot("products", columns, type_oids, digest_threshold=3)
+    parser = CopyParser(snapshot.add)
+    parser.write(copy_stream(ROWS))
+    parser.close()
+    assert snapshot.digested and snapshot.values is None
+    assert snapshot.ids == [1, 2, 3, 4, 5]
+    assert snapshot.digests == [row_digest(row) for row in ROWS]
+
+    changed = ROWS[:2] + [(ROWS[2][0], b"renamed", None)] + ROWS[3:]
+    after = TableSnapshot("products", columns, type_oids, changed, digest_threshold=3)
+    assert diff_snapshots(snapshot, after)["updated_rows"] == [{"id": 3}]
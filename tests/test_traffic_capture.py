@@ -0,0 +1,50 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from traffic_capture import Replayer
+
+
+class ProductService(BaseHTTPRequestHandler):
+    '''Creates are slow; a product is only found once its create returned'''
+    products = set()
+
+    def reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        time.sleep(0.2)
+        self.products.add(100)
+        self.reply(201, {"id": 100})
+
+    def do_GET(self):
+        product_id = int(self.path.rsplit("/", 1)[1])
+        self.reply(200 if product_id in self.products else 404, {"id": product_id})
+
+    def log_message(self, *args):
+        pass
+
+
+def test_dependent_requests_wait_for_the_create(tmp_path):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ProductService)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    capture = [
+        {"offset": 0.0, "method": "POST", "url": base + "/api/products", "endpoint": "POST /api/products",
+         "payload": {"name": "widget"}, "response_id": 1, "latency_ms": 1.0, "status": 201},
+        {"offset": 0.001, "method": "GET", "url": base + "/api/products/1", "endpoint": "GET /api/products/{id}",
+         "payload": None, "response_id": 1, "latency_ms": 1.0, "status": 200},
+    ]
+    try:
+        results, elapsed = Replayer(capture, speed=None, concurrency=4).run()
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert [result["status"] for result in results] == [201, 200]
+    assert results[1]["url"] == base + "/api/products/100"
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+import json
+import os
+import secrets
+import time
+
+
+class Tracer:
+    '''
+    Lightweight span recorder: one span per test case with child spans for every
+    HTTP request and DB statement. The W3C traceparent header is sent with each
+    request so service-side logs can be joined with the harness trace.
+    Spans are exported in the Trace Event format (chrome://tracing, Perfetto, speedscope).
+    '''
+
+    def __init__(self):
+        self.trace_id = secrets.token_hex(16)
+        self.spans = []
+        self.testcase_span = None
+        self.last_http_span_id = None
+
+    def start_span(self, name, category, parent_id, start, attributes):
+        span = {
+            "name": name,
+            "category": category,
+            "span_id": secrets.token_hex(8),
+            "parent_span_id": parent_id,
+            "start": start,
+            "duration": 0,
+            "attributes": attributes,
+        }
+        self.spans.append(span)
+        return span
+
+    def parent_id(self):
+        return self.testcase_span["span_id"] if self.testcase_span else None
+
+    def on_testcase_start(self, testcase_name):
+        self.testcase_span = self.start_span(testcase_name, "testcase", None, time.time(), {})
+        self.last_http_span_id = None
+
+    def on_testcase_end(self, testcase_name, duration):
+        if self.testcase_span is not None:
+            self.testcase_span["duration"] = duration
+        self.testcase_span = None
+        self.last_http_span_id = None
+
+    def on_http_start(self, event, request_kwargs):
+        span = self.start_span(event["endpoint"], "http", self.parent_id(), time.time(), {
+            "http.method": event["method"],
+            "http.url": event["url"],
+        })
+        headers = dict(request_kwargs.get("headers") or {})
+        headers["traceparent"] = f"00-{self.trace_id}-{span['span_id']}-01"
+        request_kwargs["headers"] = headers
+        event["span"] = span
+
+    def on_http(self, event):
+        span = event.get("span")
+        if span is None:
+            return
+        span["start"] = event["start"]
+        span["duration"] = event["duration_ms"] / 1000
+        span["attributes"]["http.status_code"] = event["status"]
+        span["attributes"]["http.response_bytes"] = event["bytes"]
+        if event["error"]:
+            span["attributes"]["error"] = event["error"]
+        self.last_http_span_id = span["span_id"]
+
+    def on_db(self, event):
+        span = self.start_span(f"{event['statement']} {event['table']}", "db", self.parent_id(), event["start"], {
+            "db.table": event["table"],
+            "db.statement": event["statement"],
+            "db.rows": event["rows"],
+        })
+        span["duration"] = event["duration_ms"] / 1000
+        if self.last_http_span_id is not None:
+            span["attributes"]["follows_http_span"] = self.last_http_span_id
+
+    def trace_events(self):
+        events = []
+        for span in self.spans:
+            args = dict(span["attributes"])
+            args["trace_id"] = self.trace_id
+            args["span_id"] = span["span_id"]
+            args["parent_span_id"] = span["parent_span_id"]
+            events.append({
+                "name": span["name"],
+                "cat": span["category"],
+                "ph": "X",
+                "ts": round(span["start"] * 1000000),
+                "dur": round(span["duration"] * 1000000),
+                "pid": os.getpid(),
+                "tid": 1,
+                "args": args,
+            })
+        return events
+
+    def export(self, filepath):
+        '''Write the spans as a Trace Event JSON file'''
+        try:
+            os.makedirs(os.path.dirname(filepath) or ".", exist_ok=True)
+            with open(filepath, 'w') as f:
+                json.dump({
+                    "traceEvents": self.trace_events(),
+                    "displayTimeUnit": "ms",
+                    "otherData": {"trace_id": self.trace_id},
+                }, f)
+            print(f"Trace written to: {filepath}")
+        except Exception as e:
+            print(f"Error writing trace: {e}")
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from perf_stats import summarize_latencies
+
+DEFAULT_CAPTURE = "/tmp/clv/requests.jsonl"
+
+# which table the ids in paths, payload fields and create responses refer to
+PATH_ID_RESOURCES = {"/api/products/": "products", "/api/customers/": "customers", "/api/billing/": "customers"}
+PAYLOAD_ID_RESOURCES = {"cust_id": "customers", "prod_id": "products"}
+CREATED_RESOURCES = {"/api/products": "products", "/api/customers": "customers", "/api/billing": "billing"}
+
+
+def response_id(response):
+    try:
+        data = response.json()
+    except ValueError:
+        return None
+    return data.get("id") if isinstance(data, dict) else None
+
+
+def exchange_record(offset, method, url, endpoint, payload, status, latency_ms, content, error=None, testcase=None, id=None):
+    return {
+        "offset": round(offset, 6),
+        "testcase": testcase,
+        "method": method,
+        "url": url,
+        "endpoint": endpoint,
+        "payload": payload,
+        "status": status,
+        "latency_ms": round(latency_ms, 3),
+        "bytes": len(content) if content is not None else 0,
+        "digest": hashlib.sha256(content).hexdigest() if content is not None else None,
+        "response_id": id,
+        "error": error,
+    }
+
+
+class TrafficRecorder:
+    '''Listener that writes every HTTP exchange of the activity to a JSON lines capture (one run per file)'''
+
+    def __init__(self, filepath=DEFAULT_CAPTURE):
+        self.filepath = filepath
+        self.file = None
+        self.started = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        os.makedirs(os.path.dirname(self.filepath) or ".", exist_ok=True)
+        self.file = open(self.filepath, 'w', buffering=1)
+        self.started = time.time()
+
+    def stop(self):
+        if self.file:
+            self.file.close()
+        self.file = None
+
+    def write(self, record):
+        with self.lock:
+            if self.file:
+                self.file.write(json.dumps(record) + "\n")
+
+    def on_http(self, event):
+        response = event["response"]
+        self.write(exchange_record(
+            event["start"] - self.started, event["method"], event["url"], event["endpoint"], event["payload"],
+            event["status"], event["duration_ms"], response.content if response is not None else None,
+            event["error"], event["testcase"], response_id(response) if response is not None else None,
+        ))
+
+
+def load_capture(filepath):
+    with open(filepath) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def parse_speed(value):
+    '''"max" replays without pauses, otherwise a multiplier such as 1, 1x or 4x'''
+    if value == "max":
+        return None
+    return float(value.rstrip("x"))
+
+
+class Replayer:
+    '''
+    Re-issues a capture against the services. Offsets are divided by `speed` (None: as fast as
+    possible) and up to `concurrency` exchanges are in flight. Ids returned by replayed creates
+    replace the captured ids in later URLs and payloads, so follow-up calls hit the new rows;
+    a call that refers to an id created earlier in the capture waits until that create has
+    been replayed, whatever the concurrency.
+    '''
+
+    def __init__(self, exchanges, speed=1.0, concurrency=4, timeout=5):
+        self.exchanges = sorted(exchanges, key=lambda exchange: exchange["offset"])
+        self.speed = speed
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.id_map = {}
+        self.id_lock = threading.Lock()
+        self.local = threading.local()
+        # (resource, captured id) -> (index of the create in the capture, set once it was replayed)
+        self.creates = {}
+        for index, exchange in enumerate(self.exchanges):
+            key = self.created_key(exchange)
+            if key is not None and key not in self.creates:
+                self.creates[key] = (index, threading.Event())
+
+    def session(self):
+        if not hasattr(self.local, "session"):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def created_key(self, exchange):
+        '''(resource, captured id) of the row a captured create made, None for any other exchange'''
+        resource = CREATED_RESOURCES.get(re.sub(r"^https?://[^/]+", "", exchange["url"]))
+        if exchange["method"] != "POST" or resource is None or exchange.get("response_id") is None:
+            return None
+        return resource, exchange["response_id"]
+
+    def wait_for_create(self, key, index):
+        '''Block until the create of key is replayed, if the capture made it before exchange index'''
+        create = self.creates.get(key)
+        if create is not None and create[0] < index:
+            create[1].wait(self.timeout * 2)
+
+    def remap(self, exchange, index=None):
+        url = exchange["url"]
+        payload = exchange["payload"]
+        match = re.search(r"(/api/\w+/)(\d+)$", url)
+        path_key = None
+        if match and match.group(1) in PATH_ID_RESOURCES:
+            path_key = (PATH_ID_RESOURCES[match.group(1)], int(match.group(2)))
+        payload_keys = []
+        if isinstance(payload, dict):
+            payload_keys = [(PAYLOAD_ID_RESOURCES[key], value) for key, value in payload.items() if key in PAYLOAD_ID_RESOURCES]
+        if index is not None:
+            for key in ([path_key] if path_key else []) + payload_keys:
+                self.wait_for_create(key, index)
+        with self.id_lock:
+            id_map = dict(self.id_map)
+        if path_key is not None:
+            new_id = id_map.get(path_key)
+            if new_id is not None:
+                url = url[:match.start(2)] + str(new_id)
+        if isinstance(payload, dict):
+            payload = {
+                key: id_map.get((PAYLOAD_ID_RESOURCES[key], value), value) if key in PAYLOAD_ID_RESOURCES else value
+                for key, value in payload.items()
+            }
+        return url, payload
+
+    def issue(self, exchange, started, index=None):
+        key = self.created_key(exchange)
+        try:
+            return self.replay(exchange, started, index)
+        finally:
+            # dependents go ahead even if the create failed; they then use the captured id
+            create = self.creates.get(key)
+            if create is not None and create[0] == index:
+                create[1].set()
+
+    def replay(self, exchange, started, index):
+        url, payload = self.remap(exchange, index)
+        sent = time.time()
+        request_started = time.perf_counter()
+        try:
+            response = self.session().request(exchange["method"], url, json=payload, timeout=self.timeout)
+        except requests.RequestException as e:
+            return exchange_record(sent - started, exchange["method"], url, exchange["endpoint"], payload,
+                                   None, (time.perf_counter() - request_started) * 1000, None, str(e), exchange.get("testcase"))
+        latency_ms = (time.perf_counter() - request_started) * 1000
+        new_id = response_id(response)
+        key = self.created_key(exchange)
+        if new_id is not None and key is not None:
+            with self.id_lock:
+                self.id_map[key] = new_id
+        return exchange_record(sent - started, exchange["method"], url, exchange["endpoint"], payload,
+                               response.status_code, latency_ms, response.content, None, exchange.get("testcase"), new_id)
+
+    def run(self):
+        started = time.time()
+        futures = []
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for index, exchange in enumerate(self.exchanges):
+                if self.speed is not None:
+                    delay = started + exchange["offset"] / self.speed - time.time()
+                    if delay > 0:
+                        time.sleep(delay)
+                futures.append(pool.submit(self.issue, exchange, started, index))
+        results = [future.result() for future in futures]
+        elapsed = time.time() - started
+        return results, elapsed
+
+
+def summarize_capture(exchanges):
+    by_endpoint = {}
+    for exchange in exchanges:
+        by_endpoint.setdefault(exchange["endpoint"], []).append(exchange)
+    summary = {}
+    for endpoint, endpoint_exchanges in sorted(by_endpoint.items()):
+        stats = summarize_latencies([exchange["latency_ms"] for exchange in endpoint_exchanges])
+        stats["errors"] = sum(1 for exchange in endpoint_exchanges if exchange["status"] is None or exchange["status"] >= 500)
+        summary[endpoint] = stats
+    return summary
+
+
+def compare_captures(baseline, current):
+    '''Per endpoint latency summary of both captures and the relative change of the percentiles'''
+    baseline_summary = summarize_capture(baseline)
+    current_summary = summarize_capture(current)
+    comparison = {}
+    for endpoint in sorted(set(baseline_summary) | set(current_summary)):
+        before = baseline_summary.get(endpoint, {"count": 0})
+        after = current_summary.get(endpoint, {"count": 0})
+        change = {}
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            if before.get(key) and after.get(key) is not None:
+                change[key.replace("_ms", "_change_pct")] = round((after[key] - before[key]) / before[key] * 100, 2)
+        comparison[endpoint] = {"baseline": before, "current": after, "change": change}
+    return comparison
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="traffic_capture.py", description="Replay and compare HTTP traffic captures")
+    commands = parser.add_subparsers(dest="command", required=True)
+    replay_parser = commands.add_parser("replay", help="re-issue a capture against the services")
+    replay_parser.add_argument("capture")
+    replay_parser.add_argument("--speed", type=parse_speed, default=1.0, help="1x, Nx or max")
+    replay_parser.add_argument("--concurrency", type=int, default=4)
+    replay_parser.add_argument("--timeout", type=float, default=5)
+    replay_parser.add_argument("--record", default=None, help="write the replayed exchanges to this capture")
+    replay_parser.add_argument("--compare", default=None, help="compare latencies with this capture (defaults to the replayed one)")
+    compare_parser = commands.add_parser("compare", help="compare the latencies of two captures")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    options = parser.parse_args(argv)
+
+    if options.command == "compare":
+        report = compare_captures(load_capture(options.baseline), load_capture(options.current))
+    else:
+        captured = load_capture(options.capture)
+        results, elapsed = Replayer(captured, options.speed, options.concurrency, options.timeout).run()
+        if options.record:
+            os.makedirs(os.path.dirname(options.record) or ".", exist_ok=True)
+            with open(options.record, 'w') as f:
+                for record in results:
+                    f.write(json.dumps(record) + "\n")
+        baseline = load_capture(options.compare) if options.compare else captured
+        report = {
+            "exchanges": len(results),
+            "elapsed_s": round(elapsed, 3),
+            "throughput_rps": round(len(results) / elapsed, 2) if elapsed > 0 else None,
+            "comparison": compare_captures(baseline, results),
+        }
+    print(json.dumps(report, indent=4))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from http_transport import MultiplexTransport, PipelinedTransport, RequestsTransport, httpx, h2
+from perf_stats import summarize_latencies
+
+DEFAULT_URLS = ["http://localhost:8080/api/customers"]
+
+
+def backends(names):
+    available = {"requests": RequestsTransport, "pipelined": PipelinedTransport, "multiplex": MultiplexTransport}
+    return [(name, available[name]) for name in names]
+
+
+def benchmark(transport, urls, requests_count, concurrency, timeout=5):
+    '''Issue requests_count GETs round robin over urls from concurrency threads; throughput and latencies'''
+    def one(index):
+        started = time.perf_counter()
+        try:
+            status = transport.request("GET", urls[index % len(urls)], timeout=timeout).status_code
+        except requests.RequestException:
+            status = None
+        return status, (time.perf_counter() - started) * 1000
+
+    # one untimed request per url opens the connections
+    for url in urls:
+        try:
+            transport.request("GET", url, timeout=timeout)
+        except requests.RequestException:
+            pass
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        samples = list(pool.map(one, range(requests_count)))
+    elapsed = time.perf_counter() - started
+    ok = [latency for status, latency in samples if status is not None and status < 400]
+    return {
+        "requests": requests_count,
+        "errors": requests_count - len(ok),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(ok) / elapsed, 2) if elapsed > 0 else None,
+        "latency": summarize_latencies(ok),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="transport_benchmark.py", description="Compare the throughput of the HTTP backends")
+    parser.add_argument("urls", nargs="*", default=DEFAULT_URLS)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--backends", default="requests,pipelined,multiplex", help="comma separated backends to compare")
+    options = parser.parse_args(argv)
+
+    report = {"http2_available": httpx is not None and h2 is not None, "backends": {}}
+    for name, transport_class in backends([name.strip() for name in options.backends.split(",") if name.strip()]):
+        transport = transport_class()
+        try:
+            report["backends"][name] = benchmark(transport, options.urls, options.requests, options.concurrency)
+        finally:
+            transport.close()
+    print(json.dumps(report, indent=4))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
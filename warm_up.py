@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+import random
+import time
+import requests
+from load_driver import BILLING_SERVICE_URL, PRODUCT_SERVICE_URL, generate_random_string
+from perf_stats import summarize_latencies
+
+HEADERS = {"Content-Type": "application/json"}
+
+
+class WarmUp:
+    '''
+    Sends rounds of the test cases' requests (same endpoints and payload shapes) before the
+    graded calls so JIT compilation and connection pools are warm when they run. The requests
+    bypass the activity's listeners, so nothing of the warm-up ends up in the graded results.
+    Per endpoint the very first request is reported as the cold latency and the second half
+    of the rounds as the steady state.
+    '''
+
+    def __init__(self, activity, rounds=20, product_url=PRODUCT_SERVICE_URL, billing_url=BILLING_SERVICE_URL, timeout=5):
+        self.activity = activity
+        self.rounds = rounds
+        self.product_url = product_url
+        self.billing_url = billing_url
+        self.timeout = timeout
+        self.samples = {}
+
+    def call(self, endpoint, method, url, payload=None):
+        started = time.perf_counter()
+        try:
+            response = self.activity.transport.request(method, url, json=payload, headers=HEADERS, timeout=self.timeout)
+        except requests.RequestException:
+            self.samples.setdefault(endpoint, []).append(None)
+            return None
+        self.samples.setdefault(endpoint, []).append((time.perf_counter() - started) * 1000)
+        try:
+            data = response.json()
+        except ValueError:
+            return None
+        return data.get("id") if isinstance(data, dict) and response.status_code < 400 else None
+
+    def round(self):
+        products = f"{self.product_url}/api/products"
+        billed_product_id = self.call("POST /api/products", "POST", products, {
+            "name": generate_random_string(10), "price": random.randint(100, 1000), "quantity": random.randint(1, 100)})
+        product_id = self.call("POST /api/products", "POST", products, {
+            "name": generate_random_string(10), "price": random.randint(100, 1000), "quantity": random.randint(1, 100)})
+        if product_id is not None:
+            self.call("GET /api/products/{id}", "GET", f"{products}/{product_id}")
+            self.call("PUT /api/products/{id}", "PUT", f"{products}/{product_id}", {
+                "name": generate_random_string(10), "price": random.randint(100, 1000), "quantity": random.randint(1, 100)})
+            self.call("DELETE /api/products/{id}", "DELETE", f"{products}/{product_id}")
+        customer_id = self.call("POST /api/customers", "POST", f"{self.product_url}/api/customers", {
+            "name": generate_random_string(10), "email": generate_random_string(10) + "@gmail.com"})
+        self.call("GET /api/customers", "GET", f"{self.product_url}/api/customers")
+        if customer_id is not None and billed_product_id is not None:
+            self.call("POST /api/billing", "POST", f"{self.billing_url}/api/billing", {
+                "cust_id": customer_id, "prod_id": billed_product_id, "quantity": random.randint(1, 10)})
+            self.call("GET /api/billing/{id}", "GET", f"{self.billing_url}/api/billing/{customer_id}")
+
+    def run(self, test_object):
+        started = time.perf_counter()
+        for _ in range(self.rounds):
+            self.round()
+        test_object.update_performance("warm_up", "summary", {
+            "rounds": self.rounds,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+        })
+        for endpoint, samples in self.samples.items():
+            test_object.update_performance("warm_up", endpoint, self.report(samples))
+
+    def report(self, samples):
+        cold_ms = samples[0]
+        steady = [sample for sample in samples[max(len(samples) // 2, 1):] if sample is not None]
+        steady_summary = summarize_latencies(steady)
+        steady_p50 = steady_summary.get("p50_ms")
+        return {
+            "cold_ms": round(cold_ms, 3) if cold_ms is not None else None,
+            "steady": steady_summary,
+            "cold_to_steady": round(cold_ms / steady_p50, 2) if cold_ms is not None and steady_p50 else None,
+            "errors": samples.count(None),
+        }
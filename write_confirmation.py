@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+import json
+import select
+import threading
+import time
+from psycopg2 import Error
+
+CHANNEL = "clv_row_changes"
+TABLES = ["products", "customers", "billing"]
+
+TRIGGER_FUNCTION = f"""
+CREATE OR REPLACE FUNCTION clv_notify_row_change() RETURNS trigger AS $$
+DECLARE
+    row_id text;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        row_id := OLD.id::text;
+    ELSE
+        row_id := NEW.id::text;
+    END IF;
+    PERFORM pg_notify('{CHANNEL}', json_build_object('table', TG_TABLE_NAME, 'op', TG_OP, 'id', row_id)::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+class WriteConfirmation:
+    '''
+    Waits for row changes committed by the services instead of polling the tables.
+    Triggers on the watched tables NOTIFY on every committed insert/update/delete, and a
+    listener thread drains the LISTEN connection and timestamps each notification as it
+    arrives, so a write is confirmed at the moment its transaction became visible to
+    other sessions, even if that was before the API response came back.
+    '''
+
+    def __init__(self, database, timeout=5, poll_interval=0.05):
+        self.database = database
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.connection = None
+        self.pending = []
+        self.write_started = None
+        self.changed = threading.Condition()
+        self.stopped = threading.Event()
+        self.listener = None
+
+    def start(self):
+        '''Install the triggers, LISTEN on the channel and start the listener thread; returns False if unavailable'''
+        try:
+            self.connection = self.database.open_connection()
+            self.connection.autocommit = True
+            cursor = self.connection.cursor()
+            cursor.execute(TRIGGER_FUNCTION)
+            for table in TABLES:
+                cursor.execute(f"DROP TRIGGER IF EXISTS clv_notify_{table} ON {table};")
+                cursor.execute(
+                    f"CREATE TRIGGER clv_notify_{table} AFTER INSERT OR UPDATE OR DELETE ON {table} "
+                    f"FOR EACH ROW EXECUTE PROCEDURE clv_notify_row_change();"
+                )
+            cursor.execute(f"LISTEN {CHANNEL};")
+            cursor.close()
+        except (Exception, Error) as error:
+            self.stop()
+            return False
+        self.stopped.clear()
+        self.listener = threading.Thread(target=self.listen_loop, daemon=True)
+        self.listener.start()
+        return True
+
+    def stop(self):
+        '''Stop the listener, remove the triggers and close the listening connection'''
+        self.stopped.set()
+        if self.listener is not None:
+            self.listener.join()
+            self.listener = None
+        if not self.connection:
+            return
+        try:
+            cursor = self.connection.cursor()
+            cursor.execute(f"UNLISTEN {CHANNEL};")
+            cursor.close()
+        except (Exception, Error) as error:
+            pass
+        if not self.drop_triggers(self.connection):
+            # the listening connection broke (e.g. with the run): drop them over a new one
+            try:
+                connection = self.database.open_connection()
+                connection.autocommit = True
+                self.drop_triggers(connection)
+                connection.close()
+            except (Exception, Error) as error:
+                pass
+        try:
+            self.connection.close()
+        except (Exception, Error) as error:
+            pass
+        self.connection = None
+        with self.changed:
+            self.pending = []
+
+    def drop_triggers(self, connection):
+        try:
+            cursor = connection.cursor()
+            for table in TABLES:
+                cursor.execute(f"DROP TRIGGER IF EXISTS clv_notify_{table} ON {table};")
+            cursor.execute("DROP FUNCTION IF EXISTS clv_notify_row_change();")
+            cursor.close()
+            return True
+        except (Exception, Error) as error:
+            return False
+
+    def listen_loop(self):
+        while not self.stopped.is_set():
+            try:
+                self.collect(self.poll_interval)
+            except (Exception, Error) as error:
+                return
+
+    def collect(self, timeout=0):
+        '''Move delivered notifications into the pending buffer, stamped with their arrival time'''
+        ready = select.select([self.connection], [], [], max(timeout, 0))
+        if ready == ([], [], []):
+            return
+        self.connection.poll()
+        received = time.perf_counter()
+        changes = []
+        while self.connection.notifies:
+            notify = self.connection.notifies.pop(0)
+            try:
+                change = json.loads(notify.payload)
+            except ValueError:
+                continue
+            change["received"] = received
+            changes.append(change)
+        if changes:
+            with self.changed:
+                self.pending += changes
+                self.changed.notify_all()
+
+    def expect(self):
+        '''Called right before an API write: forget older changes and start the clock'''
+        if not self.connection:
+            return
+        with self.changed:
+            self.pending = []
+            self.write_started = time.perf_counter()
+
+    def wait_for(self, table_name, id, op=None, timeout=None):
+        '''
+        Wait until a change of row `id` in `table_name` (optionally a specific
+        INSERT/UPDATE/DELETE) is committed or the deadline passes.
+        total_ms is from expect() to the arrival of the notification. wait_ms is how long
+        this call blocked after the API response: 0 if the change was already committed,
+        which before_response then says.
+        '''
+        waited_from = time.perf_counter()
+        deadline = waited_from + (self.timeout if timeout is None else timeout)
+        confirmation = {"table": table_name, "id": id, "op": op, "confirmed": False}
+        if not self.connection:
+            return confirmation
+
+        with self.changed:
+            while True:
+                for change in self.pending:
+                    if change["table"] == table_name and change["id"] == str(id) and (op is None or change["op"] == op):
+                        started = self.write_started if self.write_started is not None else waited_from
+                        confirmation["op"] = change["op"]
+                        confirmation["confirmed"] = True
+                        confirmation["total_ms"] = round((change["received"] - started) * 1000, 3)
+                        confirmation["wait_ms"] = round(max(change["received"] - waited_from, 0) * 1000, 3)
+                        confirmation["before_response"] = change["received"] <= waited_from
+                        return confirmation
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0 or self.listener is None or not self.listener.is_alive():
+                    break
+                self.changed.wait(min(remaining, self.poll_interval))
+        confirmation["wait_ms"] = round((time.perf_counter() - waited_from) * 1000, 3)
+        return confirmation